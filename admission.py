@@ -0,0 +1,194 @@
+# admission.py
+#
+# Admission control for the render API. Requests are rate limited per client with token
+# buckets (keyed by API key when a configured one is sent, else by IP), and Manim renders share a fixed number
+# of render slots across previews, upgrades, lessons, batches and the self-test, so a burst
+# queues up instead of starting more Manim processes than the machine can hold. The job queues
+# stay bounded; app.py turns a full queue or an empty bucket into a fast 503 or 429 with Retry-After.
+#
+# Waiting work (job queues and render slots) is served shortest job first, by predicted render
+# seconds (cost_model), with aging: sjf_priority() is the arrival time plus SJF_WEIGHT times the
+# prediction, so a long job waits at most that long behind shorter ones that arrived later.
+
+import os
+import math
+import time
+import heapq
+import hashlib
+import itertools
+import threading
+import contextlib
+from collections import OrderedDict
+
+from observability import get_logger, Counter, Gauge
+
+log = get_logger("admission")
+
+MAX_CONCURRENT_RENDERS = int(os.getenv("MAX_CONCURRENT_RENDERS", "2"))
+# Sustained requests per minute and burst size per client; <= 0 disables the limit.
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))
+API_KEY_RATE_LIMIT_PER_MINUTE = float(os.getenv("API_KEY_RATE_LIMIT_PER_MINUTE", "120"))
+API_KEY_RATE_LIMIT_BURST = int(os.getenv("API_KEY_RATE_LIMIT_BURST", "30"))
+# Comma-separated keys that get the API-key limits; any other X-API-Key counts as anonymous.
+API_KEYS = [key.strip() for key in os.getenv("API_KEYS", "").split(",") if key.strip()]
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+# Behind a reverse proxy the client is the first X-Forwarded-For hop, not the proxy.
+TRUST_PROXY_HEADERS = os.getenv("TRUST_PROXY_HEADERS", "0") == "1"
+# Seconds of extra queueing one predicted render-second is worth; 0 makes the queues FIFO.
+SJF_WEIGHT = float(os.getenv("SJF_WEIGHT", "1.0"))
+
+ADMISSION_REJECTIONS = Counter("prompt2motion_admission_rejections_total",
+                               "Requests turned away by admission control.", ["reason"])
+RENDER_SLOT_WAIT_SECONDS = Counter("prompt2motion_render_slot_wait_seconds_total",
+                                   "Time renders spent waiting for a free render slot.")
+
+class TokenBucketLimiter:
+    # One bucket per client: `burst` tokens, refilled at rate_per_minute. Buckets are kept in LRU
+    # order and the least recently seen are dropped past max_clients; a dropped client simply
+    # starts again with a full bucket.
+    def __init__(self, rate_per_minute, burst, max_clients=RATE_LIMIT_MAX_CLIENTS, clock=time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_clients = max_clients
+        self.clock = clock
+        self.allowed = 0
+        self.limited = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, client):
+        # Returns 0 when the request may proceed, else the seconds until the next token.
+        if self.rate <= 0: return 0
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0
+                self.allowed += 1
+            else:
+                retry_after = (1 - tokens) / self.rate
+                self.limited += 1
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > self.max_clients: self._buckets.popitem(last=False)
+        return retry_after
+
+    def stats(self):
+        with self._lock:
+            return {"per_minute": self.rate * 60, "burst": self.burst, "clients": len(self._buckets),
+                    "allowed": self.allowed, "limited": self.limited}
+
+def sjf_priority(estimated_seconds=None):
+    # Lower is served first; see the module comment.
+    return time.monotonic() + SJF_WEIGHT * (estimated_seconds or 0.0)
+
+class SlotRequest:
+    # A claim on a render slot that can still be promoted while it waits: a live request that
+    # joins a render started by background work (cache warm-up) must not wait at background
+    # priority. A background request is only granted while no other render runs or waits.
+    def __init__(self, priority, background=False):
+        self.priority = priority
+        self.background = background
+        self.ticket = None
+
+class RenderSlots:
+    # Caps the Manim renders running at once across every queue in this process. A free slot
+    # goes to the waiter with the lowest priority value, not the longest waiting one.
+    def __init__(self, limit=MAX_CONCURRENT_RENDERS, clock=time.monotonic):
+        self.limit = max(1, limit)
+        self.clock = clock
+        self.in_use = 0
+        self.peak = 0
+        self._waiters = []
+        self._tickets = itertools.count()
+        self._changed = threading.Condition()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def _free_for(self, request):
+        return self.in_use == 0 if request.background else self.in_use < self.limit
+
+    @contextlib.contextmanager
+    def acquire(self, priority=None, on_wait=None):
+        # priority: a number, a SlotRequest, or None for arrival order (sjf_priority() without
+        # an estimate).
+        request = priority if isinstance(priority, SlotRequest) else \
+            SlotRequest(self.clock() if priority is None else priority)
+        with self._changed:
+            if not self._free_for(request) or self._waiters:
+                request.ticket = (request.priority, next(self._tickets))
+                heapq.heappush(self._waiters, request.ticket)
+                if on_wait: on_wait(len(self._waiters))
+                started = self.clock()
+                try:
+                    self._changed.wait_for(lambda: self._free_for(request) and self._waiters[0] == request.ticket)
+                finally:
+                    self._waiters.remove(request.ticket)
+                    request.ticket = None
+                    heapq.heapify(self._waiters)
+                    # The next waiter may fit in a slot that is still free.
+                    self._changed.notify_all()
+                RENDER_SLOT_WAIT_SECONDS.inc(self.clock() - started)
+            self.in_use += 1
+            self.peak = max(self.peak, self.in_use)
+        try:
+            yield
+        finally:
+            with self._changed:
+                self.in_use -= 1
+                self._changed.notify_all()
+
+    def promote(self, request, priority):
+        # Lowers a request's priority (and makes it a live one), whether it already waits or not.
+        with self._changed:
+            request.background = False
+            if priority < request.priority:
+                request.priority = priority
+                if request.ticket is not None:
+                    self._waiters.remove(request.ticket)
+                    request.ticket = (priority, request.ticket[1])
+                    self._waiters.append(request.ticket)
+                    heapq.heapify(self._waiters)
+            self._changed.notify_all()
+
+    def stats(self):
+        with self._changed:
+            return {"limit": self.limit, "in_use": self.in_use, "waiting": self.waiting, "peak": self.peak,
+                    "saturation": (self.in_use + self.waiting) / self.limit}
+
+def _hash_key(api_key):
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+API_KEY_HASHES = frozenset(_hash_key(key) for key in API_KEYS)
+
+def client_key(api_key, remote_addr, forwarded_for=None):
+    # Only a configured key gets a bucket of its own, otherwise rotating made-up keys would
+    # dodge the IP limit. Keys are hashed so the limiter (and anything that dumps it) never
+    # holds them in clear.
+    if api_key and _hash_key(api_key) in API_KEY_HASHES: return "key:" + _hash_key(api_key)[:16]
+    if TRUST_PROXY_HEADERS and forwarded_for: return "ip:" + forwarded_for.split(",")[0].strip()
+    return "ip:" + (remote_addr or "unknown")
+
+def retry_after_seconds(seconds):
+    return max(1, int(math.ceil(seconds)))
+
+ip_limiter = TokenBucketLimiter(RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST)
+api_key_limiter = TokenBucketLimiter(API_KEY_RATE_LIMIT_PER_MINUTE, API_KEY_RATE_LIMIT_BURST)
+render_slots = RenderSlots()
+
+def check_rate_limit(key):
+    # Seconds to wait before retrying, or 0 when the request is admitted.
+    retry_after = (api_key_limiter if key.startswith("key:") else ip_limiter).acquire(key)
+    if retry_after: ADMISSION_REJECTIONS.inc(reason="rate_limited")
+    return retry_after
+
+def stats():
+    return {"render_slots": render_slots.stats(), "rate_limit": {"ip": ip_limiter.stats(), "api_key": api_key_limiter.stats()},
+            "trust_proxy_headers": TRUST_PROXY_HEADERS, "api_keys": len(API_KEY_HASHES), "sjf_weight": SJF_WEIGHT}
+
+Gauge("prompt2motion_render_slots", "Render slot usage.", ["field"],
+      callback=lambda: {(field,): value for field, value in render_slots.stats().items()})
@@ -1,63 +1,505 @@
-from flask import Flask, render_template, send_from_directory, jsonify, request
+from flask import Blueprint, Flask, Response, render_template, abort, jsonify, request, stream_with_context, g
 import os
+import json
+import functools
 import sys
+import time
+import queue
+import threading
 
 BACKEND_DIR = os.path.abspath(os.path.dirname(__file__))
 FRONTEND_DIR = os.path.join(BACKEND_DIR, 'frontend')
 MANIM_OUTPUT_DIR = os.path.join(BACKEND_DIR, 'manim_scenes')
 
 try:
-    from render_manim import render_scene
+    from render_manim import (render_scene_detailed, render_scene_from_spec, render_composition_detailed,
+                              split_multipart_prompt, llm_cache, llm_flight, render_flight, startup_checks, health_status,
+                              MANIM_STARTUP_SELF_TEST, QUALITY_TIERS, PREVIEW_TIER, cost_model, affordable_tier,
+                              estimate_prompts_seconds, COST_POLICY_ACTIONS)
+    from cost_model import spec_features
+    from render_cache import render_cache, partial_movie_cache
+    from janitor import janitor, JANITOR_ENABLED
+    from warmup import warmer, WARMUP_ENABLED
+    from spec_log import spec_log
+    from media_server import send_media, content_version, configure_app as configure_media
+    from scene_spec import SceneSpec
+    from jobs import JobQueue
+    import admission
+    from admission import client_key, check_rate_limit, retry_after_seconds, sjf_priority, ADMISSION_REJECTIONS
+    from server import DRAIN_TIMEOUT_SECONDS, RequestDeadline
+    from manim_workers import render_pool
+    import batch
+    from observability import (get_logger, span, render_metrics, request_id_var, new_request_id,
+                               Counter, Gauge, Histogram)
 except ImportError as e:
     print(f"Error importing render_manim: {e}")
     exit()
 
-app = Flask(__name__,
-            template_folder=FRONTEND_DIR,
-            static_folder=FRONTEND_DIR,
-            static_url_path='')
+log = get_logger("app")
 
-@app.route('/')
+# Routes live on a blueprint; create_app() (used by wsgi.py, server.py and backend/app.py) builds
+# the application around it so every entry point gets the same configuration.
+api = Blueprint('prompt2motion', __name__)
+
+HTTP_REQUESTS = Counter("prompt2motion_http_requests_total", "HTTP requests by endpoint and status.", ["endpoint", "status"])
+HTTP_SECONDS = Histogram("prompt2motion_http_request_seconds", "HTTP request latency by endpoint.", ["endpoint"])
+
+@api.before_app_request
+def assign_request_id():
+    g.request_id = request.headers.get('X-Request-ID') or new_request_id()
+    g.request_id_token = request_id_var.set(g.request_id)
+    g.request_started = time.perf_counter()
+
+@api.after_app_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    HTTP_SECONDS.observe(time.perf_counter() - g.request_started, endpoint=endpoint)
+    response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@api.teardown_app_request
+def clear_request_id(exc):
+    token = g.pop('request_id_token', None)
+    if token is not None: request_id_var.reset(token)
+
+@api.route('/')
 def home():
     return render_template('index.html')
 
-@app.route('/api/generate-animation', methods=['POST'])
+def video_url_for(absolute_video_path):
+    # Versioned by content, so the browser may cache the URL forever (see media_server).
+    relative_to_manim_output_dir = os.path.relpath(absolute_video_path, MANIM_OUTPUT_DIR)
+    return f"/generated_media/{relative_to_manim_output_dir.replace(os.sep, '/')}?v={content_version(absolute_video_path)}"
+
+def run_composition_job(job):
+    log.info("Rendering lesson job %s with %d sections", job.id, len(job.prompt))
+    with span("pipeline", log):
+        render_result = render_composition_detailed(job.prompt, progress=job.emit,
+                                                    save_sections=job.options.get("sections", False))
+    video_path = render_result["video_path"]
+    if not video_path or not os.path.exists(video_path):
+        return {'success': False, 'message': render_result.get("over_budget_message") or render_result.get("resource_limit_message")
+                                             or "Failed to render the composed animation.",
+                'resource_limit': render_result.get("resource_limit"), 'over_budget': render_result.get("over_budget", False),
+                'estimated_seconds': render_result.get("estimated_seconds")}
+    return {'success': True, 'video_url': video_url_for(video_path),
+            'message': f"Lesson with {len(job.prompt)} sections generated successfully!",
+            'sections': [{'name': section['name'], 'duration': section['duration'],
+                          'video_url': video_url_for(section['video_path'])} for section in render_result["sections"]],
+            'llm_cache': render_result["llm_cache"], 'render_cache': render_result["render_cache"],
+            'coalesced': render_result["render_coalesced"], 'coalesced_waiters': render_result["coalesced_waiters"],
+            'estimated_seconds': render_result.get("estimated_seconds")}
+
+def run_render_job(job):
+    if job.options.get("compose"): return run_composition_job(job)
+    log.info("Rendering job %s for prompt: %r", job.id, job.prompt)
+    with span("pipeline", log):
+        render_result = render_scene_detailed(job.prompt, progress=job.emit)
+    absolute_video_path = render_result["video_path"]
+
+    if absolute_video_path and os.path.exists(absolute_video_path):
+        result = {'success': True, 'video_url': video_url_for(absolute_video_path),
+                  'message': 'Animation generated successfully!', 'quality': PREVIEW_TIER,
+                  'parser': render_result["parser"], 'llm_cache': render_result["llm_cache"],
+                  'render_cache': render_result["render_cache"],
+                  'coalesced': render_result["llm_coalesced"] or render_result["render_coalesced"],
+                  'coalesced_waiters': render_result["coalesced_waiters"],
+                  'estimated_seconds': render_result.get("estimated_seconds")}
+        requested_tier = job.options.get("quality", PREVIEW_TIER)
+        if requested_tier != PREVIEW_TIER and render_result["spec"].llm_error is None:
+            # The upgrade renders at the best tier its predicted cost allows, if that is still
+            # better than the preview.
+            features = spec_features(render_result["spec"])
+            tier = affordable_tier(features, requested_tier)
+            if tier in (None, PREVIEW_TIER):
+                COST_POLICY_ACTIONS.inc(action="upgrade_skipped")
+                log.info("Skipping the %s upgrade for job %s: over the render budget.", requested_tier, job.id)
+                result.update(upgrade_skipped='over_budget')
+                return result
+            if tier != requested_tier:
+                COST_POLICY_ACTIONS.inc(action="downgraded")
+                result.update(upgrade_downgraded_from=requested_tier)
+            # The preview is returned now; the requested tier renders in the background and
+            # replaces video_url on this job (and emits "upgraded") once it is ready. It is only
+            # queued after this job has emitted "done", so even a cached upgrade comes after it.
+            estimated = cost_model.predict(features, tier)
+            options = {'parent_job_id': job.id, 'quality': tier, 'spec': render_result["spec"].to_dict(),
+                       'estimated_seconds': round(estimated, 1)}
+            result.update(upgrade_pending=True, upgrade_quality=tier)
+            job.add_done_callback(lambda job: submit_upgrade(job, options, sjf_priority(estimated)))
+        return result
+    log.error("render_scene did not return a valid path or file does not exist.")
+    error_message = "Failed to generate Manim script from prompt or rendering failed." \
+                    if not absolute_video_path \
+                    else "Failed to generate animation video (file not found post-render)."
+    # A refusal or a sandbox breach explains the failure better than the generic message.
+    return {'success': False, 'message': render_result.get("over_budget_message") or render_result.get("resource_limit_message")
+                                         or error_message,
+            'resource_limit': render_result.get("resource_limit"), 'over_budget': render_result.get("over_budget", False),
+            'estimated_seconds': render_result.get("estimated_seconds")}
+
+def submit_upgrade(parent, options, priority):
+    try:
+        upgrade_jobs.submit(parent.prompt, request_id=parent.request_id, options=options, priority=priority)
+    except queue.Full:
+        log.warning("Upgrade queue is full; job %s keeps its preview.", parent.id)
+        parent.result.update(upgrade_pending=False, upgrade_error='Upgrade queue is full.')
+        parent.emit("upgrade_failed", quality=options['quality'], error='Upgrade queue is full.')
+
+def run_upgrade_job(job):
+    parent = render_jobs.get(job.options["parent_job_id"])
+    tier = job.options["quality"]
+    log.info("Rendering %s upgrade for job %s", tier, job.options["parent_job_id"])
+    try:
+        with span("upgrade", log):
+            render_result = render_scene_from_spec(SceneSpec.from_dict(job.options["spec"]), progress=job.emit, tier=tier)
+        video_path = render_result["video_path"]
+        if not video_path or not os.path.exists(video_path):
+            raise RuntimeError(render_result.get("over_budget_message") or render_result.get("resource_limit_message")
+                               or f"{tier} render failed.")
+        tier = render_result["quality"]
+    except Exception as e:
+        if parent is not None:
+            parent.result.update(upgrade_pending=False, upgrade_error=str(e))
+            parent.emit("upgrade_failed", quality=tier, error=str(e))
+        raise
+    video_url = video_url_for(video_path)
+    if parent is not None:
+        parent.result.update(video_url=video_url, quality=tier, upgrade_pending=False)
+        parent.emit("upgraded", quality=tier, video_url=video_url, render_cache=render_result["render_cache"])
+    return {'success': True, 'video_url': video_url, 'quality': tier, 'render_cache': render_result["render_cache"]}
+
+def run_batch_job(job):
+    manifest = batch.run_batch(job.prompt, progress=job.emit)
+    for item in manifest["items"]:
+        video_path = item.pop("video_path")
+        item["video_url"] = video_url_for(video_path) if video_path else None
+    return {'success': True, 'message': f"{manifest['succeeded']} of {manifest['total']} animations generated.",
+            **manifest}
+
+render_jobs = JobQueue(run_render_job)
+# High-quality renders are slow and never block a preview, so they get their own small queue.
+UPGRADE_RENDER_WORKERS = int(os.getenv("UPGRADE_RENDER_WORKERS", "1"))
+upgrade_jobs = JobQueue(run_upgrade_job, num_workers=UPGRADE_RENDER_WORKERS)
+# Batches already fan out internally, so they run one at a time.
+BATCH_QUEUE_MAX = int(os.getenv("BATCH_QUEUE_MAX", "10"))
+batch_jobs = JobQueue(run_batch_job, num_workers=1, max_queued=BATCH_QUEUE_MAX)
+
+def job_media_paths():
+    # Videos the job APIs still hand out must outlive the janitor, however old they are.
+    for job in render_jobs.jobs() + upgrade_jobs.jobs() + batch_jobs.jobs():
+        result = job.result or {}
+        entries = [result] + (result.get('sections') or []) + (result.get('items') or [])
+        for url in (entry.get('video_url') for entry in entries):
+            if url and url.startswith('/generated_media/'):
+                yield os.path.join(MANIM_OUTPUT_DIR, *url[len('/generated_media/'):].split('?')[0].split('/'))
+
+janitor.add_protector(lambda: list(job_media_paths()))
+
+def no_live_jobs():
+    return not any(stats["queue_depth"] or stats["running"]
+                   for stats in (job_queue.stats() for job_queue in (render_jobs, upgrade_jobs, batch_jobs)))
+
+# Cache warm-up renders only while no job is queued or running.
+warmer.add_idle_check(no_live_jobs)
+
+DRAIN_RETRY_AFTER_SECONDS = 30
+draining = threading.Event()
+_services_lock = threading.Lock()
+startup_status = None
+
+def start_services():
+    # Once per process: probe Manim (optionally a self-test render), start the janitor and cache warm-up.
+    global startup_status
+    with _services_lock:
+        if startup_status is not None: return startup_status
+        startup_status = startup_checks()
+        if MANIM_STARTUP_SELF_TEST and not startup_status["self_test"]["ok"]:
+            log.critical("Manim startup self-test render failed; refusing to start.")
+            sys.exit(1)
+        if JANITOR_ENABLED: janitor.start()
+        if WARMUP_ENABLED: warmer.start()
+        return startup_status
+
+def begin_drain():
+    # Readiness turns 503, new jobs are refused and SSE streams close; accepted jobs keep running.
+    if draining.is_set(): return
+    draining.set()
+    warmer.stop()
+    render_jobs.close()
+    batch_jobs.close()
+
+def drain(timeout=DRAIN_TIMEOUT_SECONDS):
+    # Graceful shutdown: refuse new work, let queued and running jobs finish (upgrades and
+    # batches included), then stop the janitor and the warm render workers (cache warm-up stops at
+    # once; an interrupted warm-up render is simply not cached). Returns False when
+    # jobs were still running at the deadline.
+    begin_drain()
+    log.info("Draining: waiting up to %ds for in-flight renders.", timeout)
+    deadline = time.monotonic() + timeout
+    # Previews still hand their upgrades over as they finish, so the upgrade queue closes last.
+    drained = all([job_queue.drain(max(0.0, deadline - time.monotonic()))
+                   for job_queue in (render_jobs, batch_jobs, upgrade_jobs)])
+    if not drained: log.warning("Drain timed out; abandoning unfinished jobs.")
+    janitor.stop()
+    spec_log.flush()
+    render_pool.shutdown()
+    return drained
+
+@api.before_app_request
+def refuse_new_work_while_draining():
+    if draining.is_set() and request.method == 'POST':
+        return jsonify({'success': False, 'message': 'Server is shutting down, please retry shortly.'}), 503, \
+               {'Retry-After': str(DRAIN_RETRY_AFTER_SECONDS)}
+
+# Submissions are refused up front when a job would only start after this long.
+ADMISSION_MAX_WAIT_SECONDS = int(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "300"))
+QUEUE_FULL_RETRY_AFTER_SECONDS = 10
+
+def unavailable(status, message, retry_after):
+    seconds = retry_after_seconds(retry_after)
+    return jsonify({'success': False, 'message': message, 'retry_after': seconds}), status, {'Retry-After': str(seconds)}
+
+def queue_full(job_queue, message):
+    ADMISSION_REJECTIONS.inc(reason="queue_full")
+    return unavailable(503, message, job_queue.estimated_wait_seconds() or QUEUE_FULL_RETRY_AFTER_SECONDS)
+
+def admitted(job_queue):
+    # Per-client token bucket first (429), then a fast 503 while job_queue is too far behind.
+    def decorator(view):
+        @functools.wraps(view)
+        def admit(*args, **kwargs):
+            key = client_key(request.headers.get('X-API-Key'), request.remote_addr, request.headers.get('X-Forwarded-For'))
+            retry_after = check_rate_limit(key)
+            if retry_after:
+                return unavailable(429, f'Rate limit exceeded, retry in {retry_after_seconds(retry_after)}s.', retry_after)
+            wait = job_queue.estimated_wait_seconds()
+            if wait is not None and wait > ADMISSION_MAX_WAIT_SECONDS:
+                ADMISSION_REJECTIONS.inc(reason="overloaded")
+                return unavailable(503, 'Server is at capacity, please retry shortly.', wait - ADMISSION_MAX_WAIT_SECONDS)
+            return view(*args, **kwargs)
+        return admit
+    return decorator
+
+@api.route('/api/generate-animation', methods=['POST'])
+@admitted(render_jobs)
 def generate_animation_api():
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
         prompt_text = data.get('prompt') if data else "a default green circle"
 
         if not prompt_text:
             prompt_text = "a default yellow square"
-            print("Received empty prompt, using default.")
-        
-        print(f"Received prompt for animation: '{prompt_text}'")
+            log.info("Received empty prompt, using default.")
 
-        absolute_video_path = render_scene(prompt_text)
+        quality = (data or {}).get('quality') or PREVIEW_TIER
+        if quality not in QUALITY_TIERS:
+            return jsonify({'success': False,
+                            'message': f"Unknown quality '{quality}'. Valid: {', '.join(QUALITY_TIERS)}."}), 400
+        
+        log.info("Received prompt for animation: %r (quality %s)", prompt_text, quality)
 
-        if absolute_video_path and os.path.exists(absolute_video_path):
-            relative_to_manim_output_dir = os.path.relpath(absolute_video_path, MANIM_OUTPUT_DIR)
-            video_url = f"/generated_media/{relative_to_manim_output_dir.replace(os.sep, '/')}"
+        # Previews run shortest first (see admission.sjf_priority); the upgrade queues on its own.
+        estimated = estimate_prompts_seconds([prompt_text])
+        try:
+            job = render_jobs.submit(prompt_text, request_id=g.request_id, priority=sjf_priority(estimated),
+                                     options={'quality': quality, 'estimated_seconds': round(estimated, 1)})
+        except queue.Full:
+            return queue_full(render_jobs, 'Render queue is full, please retry shortly.')
 
-            return jsonify({'success': True, 'video_url': video_url, 'message': 'Animation generated successfully!'})
-        else:
-            print("render_scene did not return a valid path or file does not exist.")
-            error_message = "Failed to generate Manim script from prompt or rendering failed." \
-                            if not absolute_video_path \
-                            else "Failed to generate animation video (file not found post-render)."
-            return jsonify({'success': False, 'message': error_message}), 500
+        return jsonify({'success': True, 'job_id': job.id, 'status_url': f"/api/jobs/{job.id}",
+                        'events_url': f"/api/jobs/{job.id}/events",
+                        'message': 'Animation job queued.'}), 202
 
     except Exception as e:
-        print(f"Error in generate_animation_api: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("Error in generate_animation_api: %s", e)
         return jsonify({'success': False, 'message': f'An error occurred: {str(e)}'}), 500
 
-@app.route('/generated_media/<path:filename>')
+MAX_LESSON_SECTIONS = int(os.getenv("MAX_LESSON_SECTIONS", "20"))
+
+@api.route('/api/generate-lesson', methods=['POST'])
+@admitted(render_jobs)
+def generate_lesson_api():
+    # {"prompts": [...]} or one multi-part {"prompt": "Scene 1: ... Scene 2: ..."}; "sections": true
+    # additionally writes one video per section next to the combined one.
+    data = request.get_json(silent=True) or {}
+    prompts = data.get('prompts')
+    if prompts is None and isinstance(data.get('prompt'), str):
+        prompts = split_multipart_prompt(data['prompt'])
+    if not isinstance(prompts, list) or not all(isinstance(p, str) for p in prompts):
+        return jsonify({'success': False, 'message': "Expected a 'prompts' list or a multi-part 'prompt' string."}), 400
+    prompts = [p.strip() for p in prompts if p.strip()]
+    if not prompts or len(prompts) > MAX_LESSON_SECTIONS:
+        return jsonify({'success': False, 'message': f'A lesson needs between 1 and {MAX_LESSON_SECTIONS} sections.'}), 400
+
+    estimated = estimate_prompts_seconds(prompts)
+    try:
+        job = render_jobs.submit(prompts, request_id=g.request_id, priority=sjf_priority(estimated),
+                                 options={'compose': True, 'sections': bool(data.get('sections')),
+                                          'estimated_seconds': round(estimated, 1)})
+    except queue.Full:
+        return queue_full(render_jobs, 'Render queue is full, please retry shortly.')
+    return jsonify({'success': True, 'job_id': job.id, 'status_url': f"/api/jobs/{job.id}",
+                    'events_url': f"/api/jobs/{job.id}/events",
+                    'message': f'Lesson with {len(prompts)} sections queued.'}), 202
+
+@api.route('/api/batches', methods=['POST'])
+@admitted(batch_jobs)
+def submit_batch_api():
+    data = request.get_json(silent=True) or {}
+    prompts = data.get('prompts')
+    if not isinstance(prompts, list) or not all(isinstance(p, str) for p in prompts):
+        return jsonify({'success': False, 'message': "Expected a JSON body with a 'prompts' list of strings."}), 400
+    prompts = [p.strip() for p in prompts if p.strip()]
+    if not prompts or len(prompts) > batch.BATCH_MAX_PROMPTS:
+        return jsonify({'success': False,
+                        'message': f'A batch needs between 1 and {batch.BATCH_MAX_PROMPTS} prompts.'}), 400
+
+    log.info("Received batch of %d prompts", len(prompts))
+    try:
+        job = batch_jobs.submit(prompts, request_id=g.request_id)
+    except queue.Full:
+        return queue_full(batch_jobs, 'Batch queue is full, please retry later.')
+    return jsonify({'success': True, 'batch_id': job.id, 'status_url': f"/api/batches/{job.id}",
+                    'events_url': f"/api/batches/{job.id}/events",
+                    'message': f'Batch of {len(prompts)} prompts queued.'}), 202
+
+@api.route('/api/batches/<batch_id>')
+def batch_status_api(batch_id):
+    job = batch_jobs.get(batch_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown batch id.'}), 404
+    return jsonify(job.to_dict())
+
+@api.route('/api/batches/<batch_id>/events')
+def batch_events_api(batch_id):
+    job = batch_jobs.get(batch_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown batch id.'}), 404
+    return job_event_stream(job)
+
+@api.route('/api/jobs/stats')
+def job_stats_api():
+    return jsonify({**render_jobs.stats(), 'batches': batch_jobs.stats(), 'upgrades': upgrade_jobs.stats(),
+                    'render_pool': render_pool.stats(), 'admission': admission_status(),
+                    'singleflight': {'llm': llm_flight.stats(), 'render': render_flight.stats()},
+                    'cost_model': cost_model.stats(), 'warmup': warmer.stats()})
+
+@api.route('/api/jobs/<job_id>')
+def job_status_api(job_id):
+    job = render_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown job id.'}), 404
+    return jsonify(job.to_dict())
+
+SSE_KEEPALIVE_SECONDS = 15
+# Streams end after this long (or when the server drains); EventSource reconnects with Last-Event-ID.
+SSE_MAX_STREAM_SECONDS = int(os.getenv("SSE_MAX_STREAM_SECONDS", "300"))
+
+@api.route('/api/jobs/<job_id>/events')
+def job_events_api(job_id):
+    job = render_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Unknown job id.'}), 404
+    return job_event_stream(job)
+
+def job_event_stream(job):
+    # EventSource resends the last id it saw when it reconnects.
+    next_index = request.headers.get('Last-Event-ID', default=-1, type=int) + 1
+
+    def stream():
+        index = next_index
+        deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+        while True:
+            if draining.is_set() or time.monotonic() >= deadline: return
+            events = job.events_after(index, timeout=SSE_KEEPALIVE_SECONDS)
+            if not events:
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                yield f"id: {event['id']}\nevent: progress\ndata: {json.dumps(event)}\n\n"
+                # A finished preview keeps the stream open until its background upgrade settles.
+                if event['phase'] == 'done' and (event.get('result') or {}).get('upgrade_pending'): continue
+                if event['phase'] in ('done', 'failed', 'upgraded', 'upgrade_failed'): return
+            index += len(events)
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@api.route('/api/health')
+def health_api():
+    status = health_status()
+    healthy = status["manim"]["error"] is None or status["render_pool"]["enabled"]
+    return jsonify({'healthy': healthy, **status, 'admission': admission_status()}), 200 if healthy else 503
+
+def admission_status():
+    queue_stats = render_jobs.stats()
+    return {**admission.stats(), 'max_wait_seconds': ADMISSION_MAX_WAIT_SECONDS,
+            'estimated_wait_seconds': render_jobs.estimated_wait_seconds(),
+            'queue_saturation': queue_stats["queue_depth"] / queue_stats["queue_capacity"]}
+
+@api.route('/api/ready')
+def ready_api():
+    # Readiness, unlike /api/health (liveness): whether a load balancer should send new work here.
+    status = health_status()
+    queue_stats = render_jobs.stats()
+    reasons = []
+    if draining.is_set(): reasons.append('draining')
+    if startup_status is None: reasons.append('starting')
+    if status["manim"]["error"] is not None and not status["render_pool"]["enabled"]: reasons.append('no_render_backend')
+    if queue_stats["queue_depth"] >= queue_stats["queue_capacity"]: reasons.append('render_queue_full')
+    if (render_jobs.estimated_wait_seconds() or 0) > ADMISSION_MAX_WAIT_SECONDS: reasons.append('overloaded')
+    return jsonify({'ready': not reasons, 'reasons': reasons, 'queue_depth': queue_stats["queue_depth"],
+                    'queue_capacity': queue_stats["queue_capacity"], 'running': queue_stats["running"]}), \
+           200 if not reasons else 503
+
+def _job_queue_gauges():
+    stats = render_jobs.stats()
+    return {("queue_depth",): stats["queue_depth"], ("running",): stats["running"], ("workers",): stats["workers"],
+            ("wait_seconds_p95",): stats["wait_seconds_p95"], ("run_seconds_p95",): stats["run_seconds_p95"],
+            ("queue_capacity",): stats["queue_capacity"], ("estimated_wait_seconds",): render_jobs.estimated_wait_seconds()}
+
+def _cache_gauges():
+    render_stats, llm_stats, partial_stats = render_cache.stats(), llm_cache.stats(), partial_movie_cache.stats()
+    return {("render", "entries"): render_stats["entries"], ("render", "bytes"): render_stats["bytes"],
+            ("llm", "entries"): llm_stats["entries"],
+            ("partial_movie", "entries"): partial_stats["segments"], ("partial_movie", "bytes"): partial_stats["bytes"]}
+
+Gauge("prompt2motion_job_queue", "Render job queue state.", ["field"], callback=_job_queue_gauges)
+Gauge("prompt2motion_cache", "Cache sizes.", ["cache", "field"], callback=_cache_gauges)
+Gauge("prompt2motion_singleflight_in_flight", "Coalesced calls currently in flight.", ["stage"],
+      callback=lambda: {("llm",): llm_flight.stats()["in_flight"], ("render",): render_flight.stats()["in_flight"]})
+
+@api.route('/metrics')
+def metrics_api():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/api/cache/stats')
+def cache_stats_api():
+    return jsonify({'llm_cache': llm_cache.stats(), 'render_cache': render_cache.stats(),
+                    'partial_movie_cache': partial_movie_cache.stats(), 'janitor': janitor.stats()})
+
+@api.route('/generated_media/<path:filename>')
 def serve_generated_media(filename):
-    print(f"Attempting to serve generated media: {filename} from {MANIM_OUTPUT_DIR}")
-    return send_from_directory(MANIM_OUTPUT_DIR, filename)
+    # Only rendered media is public; debug scene scripts (MANIM_WRITE_SCENE_FILES) live next to it.
+    if not filename.startswith('media/'): abort(404)
+    return send_media(MANIM_OUTPUT_DIR, filename)
 
-if __name__ == '__main__':
+def create_app():
     os.makedirs(os.path.join(MANIM_OUTPUT_DIR, "media", "videos"), exist_ok=True)
-    app.run(debug=True, use_reloader=False, port=5000)
+    app = Flask(__name__,
+                template_folder=FRONTEND_DIR,
+                static_folder=FRONTEND_DIR,
+                static_url_path='')
+    configure_media(app)
+    app.register_blueprint(api)
+    # Every entry point serves through create_app(), so the deadline holds under either server.
+    app.wsgi_app = RequestDeadline(app.wsgi_app)
+    start_services()
+    return app
+
+if __name__ == '__main__':
+    # Hand over to server.py: this module must not own the job queues as __main__ while wsgi.py
+    # imports it again as `app`.
+    os.execv(sys.executable, [sys.executable, os.path.join(BACKEND_DIR, 'server.py'), *sys.argv[1:]])
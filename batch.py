@@ -0,0 +1,134 @@
+# batch.py
+#
+# Renders a list of prompts in one go: duplicates are collapsed, LLM calls fan out under a
+# rate limit, and renders run on the process's warm Manim workers. Every prompt gets a manifest
+# entry; one prompt failing never stops the rest.
+#
+# Batch renders take render slots like every other render (admission.py), so the render stage
+# runs at most render_slots.limit (MAX_CONCURRENT_RENDERS) renders at once: more threads would
+# only queue for a slot, and a batch must not crowd out interactive renders beyond the cap.
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import render_manim
+from llm_cache import normalize_prompt
+from admission import render_slots
+from observability import get_logger, span
+
+log = get_logger("batch")
+
+BATCH_MAX_PROMPTS = int(os.getenv("BATCH_MAX_PROMPTS", "500"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+BATCH_LLM_REQUESTS_PER_SECOND = float(os.getenv("BATCH_LLM_REQUESTS_PER_SECOND", "5"))
+# Capped at the render slot count, see above.
+BATCH_RENDER_PROCESSES = int(os.getenv("BATCH_RENDER_PROCESSES", str(render_slots.limit)))
+
+class RateLimiter:
+    # Spaces calls at least 1/rate seconds apart across threads; rate <= 0 disables it.
+    def __init__(self, rate_per_second):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval: return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now: time.sleep(slot - now)
+
+def _no_progress(phase, **fields):
+    pass
+
+def dedupe_prompts(prompts):
+    # Returns (unique prompts, index of the unique prompt each input maps to).
+    unique, positions, mapping = [], {}, []
+    for prompt_text in prompts:
+        key = normalize_prompt(prompt_text)
+        if key not in positions:
+            positions[key] = len(unique)
+            unique.append(prompt_text)
+        mapping.append(positions[key])
+    return unique, mapping
+
+def run_batch(prompts, progress=_no_progress, llm_concurrency=BATCH_LLM_CONCURRENCY,
+              llm_requests_per_second=BATCH_LLM_REQUESTS_PER_SECOND, render_processes=BATCH_RENDER_PROCESSES):
+    started = time.time()
+    unique, mapping = dedupe_prompts(prompts)
+    render_processes = max(1, min(render_processes, render_slots.limit))
+    log.info("Batch of %d prompts (%d unique): LLM concurrency %d at %.1f req/s, %d render processes",
+             len(prompts), len(unique), llm_concurrency, llm_requests_per_second, render_processes)
+    outcomes = [{"prompt": prompt_text, "status": "pending", "video_path": None, "error": None,
+                 "llm_cache": None, "render_cache": None} for prompt_text in unique]
+    completed = [0]
+    completed_lock = threading.Lock()
+
+    def finish(index, status, **fields):
+        outcomes[index].update(status=status, **fields)
+        with completed_lock:
+            completed[0] += 1
+            done = completed[0]
+        progress("item_finished", index=index, status=status, completed=done, total=len(unique))
+
+    # Stage 1: prompt -> spec, concurrently but within the Groq rate limit.
+    limiter = RateLimiter(llm_requests_per_second)
+    specs = [None] * len(unique)
+
+    def resolve_spec(index):
+        info = {}
+        llm_data = render_manim.get_animation_params_from_llm(unique[index], info=info, rate_limiter=limiter)
+        specs[index] = render_manim.build_scene_spec(llm_data)
+        outcomes[index]["llm_cache"] = info.get("llm_cache")
+
+    with span("batch_llm", log), ThreadPoolExecutor(max_workers=max(1, llm_concurrency)) as executor:
+        futures = {executor.submit(resolve_spec, index): index for index in range(len(unique))}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                future.result()
+                if specs[index].llm_error: finish(index, "failed", error=specs[index].llm_error)
+            except Exception as e:
+                log.exception("Batch item %d failed before rendering: %s", index, e)
+                finish(index, "failed", error=str(e))
+    progress("llm_finished", total=len(unique), failed=sum(1 for o in outcomes if o["status"] == "failed"))
+
+    # Stage 2: spec -> video on the shared warm Manim workers, which have Manim imported already.
+    # Fallback specs are not rendered: a placeholder circle is no use in a lesson pack, the item
+    # is reported failed.
+    renderable = [index for index, outcome in enumerate(outcomes) if outcome["status"] == "pending"]
+    with span("batch_render", log), ThreadPoolExecutor(max_workers=render_processes) as executor:
+        futures = {executor.submit(render_manim.render_scene_from_spec, specs[index]): index for index in renderable}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                render_result = future.result()
+                if render_result["video_path"]:
+                    finish(index, "done", video_path=render_result["video_path"],
+                           render_cache=render_result["render_cache"])
+                else:
+                    finish(index, "failed", error=render_result.get("over_budget_message") or render_result.get("resource_limit_message")
+                                 or "Rendering failed.",
+                           render_cache=render_result["render_cache"])
+            except Exception as e:
+                log.exception("Batch item %d failed while rendering: %s", index, e)
+                finish(index, "failed", error=str(e))
+
+    items, first_positions = [], {}
+    for position, (prompt_text, unique_index) in enumerate(zip(prompts, mapping)):
+        item = {"index": position, **outcomes[unique_index], "prompt": prompt_text}
+        if unique_index in first_positions: item["duplicate_of"] = first_positions[unique_index]
+        else: first_positions[unique_index] = position
+        items.append(item)
+    succeeded = sum(1 for item in items if item["status"] == "done")
+    return {
+        "total": len(items),
+        "unique": len(unique),
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+        "seconds": time.time() - started,
+        "items": items,
+    }
@@ -0,0 +1,192 @@
+# benchmark.py
+#
+# Offline benchmark for the prompt -> spec -> video pipeline. Groq is replaced by a local stub
+# of the chat-completions endpoint so runs are repeatable and cost nothing.
+#
+#   python benchmark.py --corpus prompts.jsonl --concurrency 4 --repeat 3 --output bench.json
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import threading
+import tempfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PROMPTS = [
+    "A red square appears, then moves up by 2, then turns blue.",
+    "A yellow circle. Rotate it 180 degrees and make it twice as big at the same time.",
+    "Write 'Hello Manim' in green, then make it flash.",
+    "Transform a blue triangle into a red square.",
+    "a purple circle moving up and down",
+    "a line that moves left then right",
+]
+
+STUB_SHAPES = ["circle", "square", "triangle", "rectangle", "line", "dot", "star", "polygon"]
+STUB_COLORS = ["red", "green", "blue", "yellow", "orange", "purple", "pink", "white", "gray"]
+
+# Stage boundaries as (stage, start phase, end phase) over the pipeline's progress events.
+STAGES = [
+    ("llm", "llm_request_sent", "llm_response_received"),
+    ("codegen", "spec_validated", "manim_started"),
+    ("manim_startup", "manim_started", "first_animation"),
+    ("rendering", "first_animation", "encoding"),
+    ("encoding", "encoding", "manim_finished"),
+    ("file_lookup", "manim_finished", "video_located"),
+]
+
+def stub_params_for_prompt(prompt_text):
+    words = prompt_text.lower().replace(",", " ").replace(".", " ").split()
+    shape = next((w for w in words if w in STUB_SHAPES), "circle")
+    color = next((w for w in words if w in STUB_COLORS), "white")
+    animations = [{"type": "Create"}]
+    if "up" in words and "down" in words:
+        animations.append({"type": "Move", "details": {"movement_details": {"direction": "UP_AND_DOWN", "distance": 1}}})
+    elif "left" in words and "right" in words:
+        animations.append({"type": "Move", "details": {"movement_details": {"direction": "LEFT_THEN_RIGHT", "distance": 1}}})
+    if "rotate" in words:
+        animations.append({"type": "Rotate", "details": {"rotation_details": {"angle_degrees": 90}}})
+    return {"shape": shape.capitalize(), "color": color.upper(), "animations": animations}
+
+def start_stub_llm_server(latency_seconds):
+    class StubGroqHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            user_prompt = payload.get("messages", [{}])[-1].get("content", "")
+            time.sleep(latency_seconds)
+            body = json.dumps({"choices": [{"message": {"role": "assistant",
+                                                        "content": json.dumps(stub_params_for_prompt(user_prompt))}}]})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body.encode("utf-8"))
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGroqHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def load_corpus(path):
+    if not path: return list(DEFAULT_PROMPTS)
+    prompts = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            if path.endswith(".jsonl"):
+                record = json.loads(line)
+                # Accept plain {"prompt": ...} records as well as request-style {"title", "body"} ones.
+                prompts.append(record.get("prompt") or record.get("title") or record.get("body"))
+            else:
+                prompts.append(line)
+    return [p for p in prompts if p]
+
+def percentiles(samples):
+    if not samples: return None
+    ordered = sorted(samples)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+    return {"count": len(ordered), "min": ordered[0], "p50": pick(50), "p90": pick(90), "p99": pick(99),
+            "max": ordered[-1], "mean": sum(ordered) / len(ordered)}
+
+def stage_durations(events):
+    marks = {}
+    for phase, timestamp in events:
+        if phase == "animation": phase = "first_animation"
+        marks.setdefault(phase, timestamp)
+    return {stage: marks[end] - marks[start] for stage, start, end in STAGES if start in marks and end in marks}
+
+def peak_rss_mb():
+    try: import resource
+    except ImportError: return None
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {"self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale}
+
+def run_benchmark(prompts, concurrency, render_manim):
+    def run_one(prompt_text):
+        events = []
+        started = time.perf_counter()
+        result = render_manim.render_scene_detailed(prompt_text, progress=lambda phase, **fields: events.append((phase, time.perf_counter())))
+        total = time.perf_counter() - started
+        return {"prompt": prompt_text, "ok": bool(result["video_path"]), "total": total,
+                "stages": stage_durations(events), "parser": result["parser"], "llm_cache": result["llm_cache"],
+                "render_cache": result["render_cache"]}
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        runs = list(executor.map(run_one, prompts))
+    wall_seconds = time.perf_counter() - started
+
+    stage_samples = {stage: [] for stage, _, _ in STAGES}
+    for run in runs:
+        for stage, seconds in run["stages"].items(): stage_samples[stage].append(seconds)
+    return {
+        "requests": len(runs),
+        "succeeded": sum(1 for run in runs if run["ok"]),
+        "concurrency": concurrency,
+        "wall_seconds": wall_seconds,
+        "throughput_rps": len(runs) / wall_seconds if wall_seconds else None,
+        "latency_seconds": {"total": percentiles([run["total"] for run in runs]),
+                            **{stage: percentiles(samples) for stage, samples in stage_samples.items()}},
+        "runs": runs,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Prompt2Motion render pipeline against a stub LLM.")
+    parser.add_argument("--corpus", help="Prompt file: .jsonl with a 'prompt' field per line, or plain text, one prompt per line.")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the corpus this many times.")
+    parser.add_argument("--stub-latency-ms", type=float, default=300.0, help="Simulated Groq response time.")
+    parser.add_argument("--use-caches", action="store_true", help="Keep the LLM and render caches enabled (fresh, per run).")
+    parser.add_argument("--use-parser", action="store_true",
+                        help="Let the rule-based prompt parser skip the LLM for prompts it understands.")
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+
+    server = start_stub_llm_server(args.stub_latency_ms / 1000.0)
+    # render_manim reads its configuration at import time, so point it at the stub first.
+    os.environ["GROQ_API_URL"] = f"http://127.0.0.1:{server.server_address[1]}/openai/v1/chat/completions"
+    os.environ["GROQ_API_KEY"] = "benchmark-stub"
+    # Every cache and learned model lives in a directory of its own for the run, so results do not
+    # depend on earlier runs and the benchmark leaves the server's state alone. It sits under
+    # manim_scenes/media because partial movies are hardlinked into render workspaces.
+    media_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "manim_scenes", "media")
+    os.makedirs(media_dir, exist_ok=True)
+    state_dir = tempfile.mkdtemp(prefix="bench-", dir=media_dir)
+    os.environ["LLM_CACHE_PATH"] = os.path.join(state_dir, "llm_cache.sqlite3")
+    os.environ["RENDER_CACHE_INDEX_PATH"] = os.path.join(state_dir, "render_cache.sqlite3")
+    os.environ["PARTIAL_MOVIE_DIR"] = os.path.join(state_dir, "partial_movie_files")
+    os.environ["COST_MODEL_PATH"] = os.path.join(state_dir, "cost_model.json")
+    os.environ["SPEC_LOG_PATH"] = os.path.join(state_dir, "spec_log.json")
+    os.environ["LLM_CACHE_ENABLED"] = os.environ["RENDER_CACHE_ENABLED"] = "1" if args.use_caches else "0"
+    # The parser answers the corpus's simple prompts without the LLM, which would hide the LLM stage.
+    os.environ["PROMPT_PARSER_ENABLED"] = "1" if args.use_parser else "0"
+    import render_manim
+
+    prompts = load_corpus(args.corpus) * args.repeat
+    print(f"Benchmarking {len(prompts)} prompts at concurrency {args.concurrency}...")
+    report = run_benchmark(prompts, args.concurrency, render_manim)
+    render_manim.render_pool.shutdown()
+    server.shutdown()
+    shutil.rmtree(state_dir, ignore_errors=True)
+
+    report.update(created=time.time(), stub_latency_ms=args.stub_latency_ms, caches_enabled=args.use_caches,
+                  parser_enabled=args.use_parser,
+                  render_pool=render_manim.render_pool.stats(), peak_rss_mb=peak_rss_mb())
+    with open(args.output, "w", encoding="utf-8") as f: json.dump(report, f, indent=2)
+
+    print(f"\n{report['succeeded']}/{report['requests']} succeeded in {report['wall_seconds']:.2f}s "
+          f"({report['throughput_rps']:.2f} req/s)")
+    for stage, stats in report["latency_seconds"].items():
+        if stats: print(f"  {stage:<14} p50 {stats['p50'] * 1000:8.1f} ms   p90 {stats['p90'] * 1000:8.1f} ms   p99 {stats['p99'] * 1000:8.1f} ms")
+    print(f"Peak RSS (MB): {report['peak_rss_mb']}")
+    print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
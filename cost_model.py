@@ -0,0 +1,160 @@
+# cost_model.py
+#
+# Predicts how long a validated spec takes to render at a quality tier, before rendering it.
+# A spec is reduced to three features, mirroring what scene_builder.play_spec plays:
+#   1, the number of play() calls, and the animated seconds weighted by how expensive each
+#   animation is per frame (Transform and Text cost more, waits on a static frame far less).
+# Move distances and scale factors are not features: a step plays for a fixed run time, and
+# SceneSpec keeps them within the frame (MOVE_DISTANCE_LIMITS, SCALE_FACTOR_LIMITS).
+# Each tier has its own linear model over those features, fitted from recorded render timings
+# by ridge regression towards hand-set priors, so a fresh install predicts sensibly and the
+# model follows the machine as timings come in. Statistics decay so old timings fade out, and
+# are saved next to the render cache so calibration survives restarts.
+
+import os
+import json
+import threading
+
+from observability import get_logger
+from scene_spec import THERE_AND_BACK_DIRECTIONS
+
+log = get_logger("cost_model")
+
+BACKEND_DIR = os.path.abspath(os.path.dirname(__file__))
+COST_MODEL_PATH = os.getenv("COST_MODEL_PATH", os.path.join(BACKEND_DIR, "manim_scenes", "media", "cost_model.json"))
+# Weight of the priors, in observations: how much evidence it takes to move away from them.
+COST_MODEL_PRIOR_WEIGHT = float(os.getenv("COST_MODEL_PRIOR_WEIGHT", "5"))
+# Per-observation decay of older timings (0.99: the last ~100 renders dominate).
+COST_MODEL_DECAY = float(os.getenv("COST_MODEL_DECAY", "0.99"))
+
+# Seconds for (per render, per play, per weighted animated second) at the preview tier; other
+# tiers scale by their cost factor (QUALITY_TIERS timeout_factor).
+PRIOR_COEFFICIENTS = (2.0, 0.3, 1.0)
+MANIM_RUN_TIME = 1.0
+THERE_AND_BACK_WAIT = 0.3
+FINAL_WAIT = 1.0
+ERROR_WAIT = 3.0
+# Relative per-frame cost of an animated second; a wait re-encodes a static frame.
+ANIMATION_WEIGHTS = {"TransformShape": 1.5, "Flash": 1.2, "Write": 1.3}
+WAIT_WEIGHT = 0.2
+TEXT_WEIGHT = 1.5
+GROUP_MEMBER_WEIGHT = 0.5
+
+def spec_features(spec):
+    # (1, plays, weighted animated seconds) for one SceneSpec, following play_spec.
+    if spec.llm_error is not None:
+        return [1.0, 1.0, ANIMATION_WEIGHTS["Write"] * MANIM_RUN_TIME + WAIT_WEIGHT * ERROR_WAIT]
+    object_weight = TEXT_WEIGHT if spec.text_content else 1.0
+    plays, weighted_seconds = 0, 0.0
+
+    def play(weight=1.0):
+        nonlocal plays, weighted_seconds
+        plays += 1
+        weighted_seconds += weight * object_weight * MANIM_RUN_TIME
+
+    # The main object always appears exactly once, whether or not the spec says how.
+    play(ANIMATION_WEIGHTS["Write"] if spec.text_content else 1.0)
+    for step in spec.animations:
+        if step.type in ("Create", "FadeIn", "GrowFromCenter", "Write"): continue
+        if step.type == "Move" and step.direction in THERE_AND_BACK_DIRECTIONS:
+            for _ in range(3): play()
+            weighted_seconds += 2 * WAIT_WEIGHT * THERE_AND_BACK_WAIT
+        elif step.type == "AnimationGroup":
+            if step.animations: play(1.0 + GROUP_MEMBER_WEIGHT * (len(step.animations) - 1))
+        else:
+            play(ANIMATION_WEIGHTS.get(step.type, 1.0))
+    weighted_seconds += WAIT_WEIGHT * FINAL_WAIT
+    return [1.0, float(plays), weighted_seconds]
+
+def composition_features(specs):
+    # One render of several sections: one fixed cost, the rest adds up.
+    features = [1.0, 0.0, 0.0]
+    for spec in specs:
+        _, plays, weighted_seconds = spec_features(spec)
+        features[1] += plays
+        features[2] += weighted_seconds
+    return features
+
+def _solve(matrix, vector):
+    # Gaussian elimination with partial pivoting for the 3x3 normal equations.
+    n = len(vector)
+    rows = [list(matrix[i]) + [vector[i]] for i in range(n)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        if abs(rows[col][col]) < 1e-12: return None
+        for r in range(n):
+            if r != col:
+                factor = rows[r][col] / rows[col][col]
+                rows[r] = [a - factor * b for a, b in zip(rows[r], rows[col])]
+    return [rows[i][n] / rows[i][i] for i in range(n)]
+
+class CostModel:
+    def __init__(self, tier_factors, path=COST_MODEL_PATH, prior_weight=COST_MODEL_PRIOR_WEIGHT, decay=COST_MODEL_DECAY):
+        # tier_factors: {tier: relative cost}, scaling the preview priors for each tier.
+        self.priors = {tier: [c * factor for c in PRIOR_COEFFICIENTS] for tier, factor in tier_factors.items()}
+        self.path = path
+        self.prior_weight = prior_weight
+        self.decay = decay
+        self._lock = threading.Lock()
+        # Per tier: decayed X'X, X'y, observation weight and absolute relative error.
+        self._stats = {tier: self._empty() for tier in self.priors}
+        self._coefficients = {tier: list(prior) for tier, prior in self.priors.items()}
+        self._load()
+
+    @staticmethod
+    def _empty():
+        return {"xtx": [[0.0] * 3 for _ in range(3)], "xty": [0.0] * 3, "n": 0.0, "abs_error": 0.0, "observations": 0}
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f: saved = json.load(f)
+        except (IOError, ValueError): return
+        for tier, stats in saved.items():
+            if tier in self._stats:
+                self._stats[tier] = stats
+                self._fit_locked(tier)
+
+    def _save_locked(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f: json.dump(self._stats, f)
+        os.replace(tmp_path, self.path)
+
+    def _fit_locked(self, tier):
+        stats, prior = self._stats[tier], self.priors[tier]
+        matrix = [[stats["xtx"][i][j] + (self.prior_weight if i == j else 0.0) for j in range(3)] for i in range(3)]
+        vector = [stats["xty"][i] + self.prior_weight * prior[i] for i in range(3)]
+        solved = _solve(matrix, vector)
+        # Negative coefficients would let a bigger spec look cheaper; keep the priors instead.
+        if solved and all(c >= 0 for c in solved): self._coefficients[tier] = solved
+
+    def predict(self, features, tier):
+        with self._lock: coefficients = self._coefficients[tier]
+        return max(0.0, sum(c * x for c, x in zip(coefficients, features)))
+
+    def estimate(self, spec, tier):
+        return self.predict(spec_features(spec), tier)
+
+    def observe(self, features, tier, seconds):
+        # Records one render's wall-clock seconds and refits the tier.
+        with self._lock:
+            predicted = sum(c * x for c, x in zip(self._coefficients[tier], features))
+            stats = self._stats[tier]
+            for i in range(3):
+                stats["xty"][i] = stats["xty"][i] * self.decay + features[i] * seconds
+                for j in range(3): stats["xtx"][i][j] = stats["xtx"][i][j] * self.decay + features[i] * features[j]
+            stats["n"] = stats["n"] * self.decay + 1
+            stats["abs_error"] = stats["abs_error"] * self.decay + abs(predicted - seconds) / max(seconds, 1e-3)
+            stats["observations"] += 1
+            self._fit_locked(tier)
+            try: self._save_locked()
+            except OSError as e: log.warning("Could not save the cost model: %s", e)
+
+    def stats(self):
+        with self._lock:
+            return {tier: {"coefficients": dict(zip(("base", "per_play", "per_weighted_second"), self._coefficients[tier])),
+                           "observations": self._stats[tier]["observations"],
+                           "mean_relative_error": (self._stats[tier]["abs_error"] / self._stats[tier]["n"])
+                                                  if self._stats[tier]["n"] else None}
+                    for tier in self.priors}
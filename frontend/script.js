@@ -4,6 +4,112 @@ document.addEventListener('DOMContentLoaded', () => {
   const statusMessage = document.getElementById('status-message');
   const animationVideo = document.getElementById('animation-video');
   const videoPlaceholderMessage = document.getElementById('video-placeholder-message');
+  const qualitySelect = document.getElementById('quality-select');
+
+  const POLL_INTERVAL_MS = 1000;
+
+  async function waitForJob(statusUrl) {
+    while (true) {
+      const response = await fetch(statusUrl);
+      const job = await response.json();
+      if (!response.ok) {
+        throw new Error(job.message || 'Failed to fetch job status.');
+      }
+      if (job.status === 'done' || job.status === 'failed') {
+        return job;
+      }
+      statusMessage.textContent = job.status === 'queued'
+        ? `Queued (waiting ${Math.round(job.wait_seconds)}s)...`
+        : 'Processing... Please wait, this can take a moment.';
+      await new Promise(resolve => setTimeout(resolve, POLL_INTERVAL_MS));
+    }
+  }
+
+  const PHASE_MESSAGES = {
+    queued: 'Queued...',
+    running: 'Starting...',
+    prompt_parsed: 'Understood the prompt without the language model.',
+    llm_request_sent: 'Asking the language model...',
+    llm_response_received: 'Language model replied.',
+    llm_cached: 'Reusing a cached interpretation of this prompt.',
+    spec_validated: 'Animation plan ready.',
+    render_cached: 'Found an identical animation, reusing it.',
+    script_generated: 'Scene script generated.',
+    render_slot_wait: 'Waiting for a free renderer...',
+    quality_downgraded: 'Rendering at a lower quality to keep this animation within the time limit.',
+    over_budget: 'This animation would take too long to render.',
+    manim_started: 'Rendering with Manim...',
+    encoding: 'Encoding video...',
+    manim_finished: 'Finalizing video...',
+    video_located: 'Video ready, loading...',
+  };
+
+  // Swaps in the high-quality render without restarting playback.
+  function showUpgradedVideo(event) {
+    const resumeAt = animationVideo.currentTime;
+    const wasPlaying = !animationVideo.paused;
+    animationVideo.src = event.video_url;
+    animationVideo.addEventListener('loadedmetadata', () => {
+      animationVideo.currentTime = Math.min(resumeAt, animationVideo.duration || resumeAt);
+      if (wasPlaying) animationVideo.play().catch(e => console.warn("Autoplay was prevented:", e));
+    }, { once: true });
+    statusMessage.textContent = `Upgraded to ${event.quality}.`;
+  }
+
+  function describeEvent(event) {
+    if (event.phase === 'animation') {
+      return `Rendering animation ${event.index + 1} (${event.description}): ${event.percent}%`;
+    }
+    return PHASE_MESSAGES[event.phase] || 'Processing... Please wait, this can take a moment.';
+  }
+
+  // Resolves with the final job once the server reports done/failed; falls back to polling
+  // when Server-Sent Events are unavailable or the stream breaks.
+  function waitForJobEvents(eventsUrl, statusUrl) {
+    if (!window.EventSource) {
+      return waitForJob(statusUrl);
+    }
+    return new Promise((resolve, reject) => {
+      const source = new EventSource(eventsUrl);
+      let settled = false;
+      source.addEventListener('progress', (message) => {
+        const event = JSON.parse(message.data);
+        if (event.phase === 'done' || event.phase === 'failed') {
+          // Keep listening while a higher quality render is on its way.
+          if (!(event.result && event.result.upgrade_pending)) source.close();
+          settled = true;
+          resolve({ status: event.phase, result: event.result, error: event.error });
+          return;
+        }
+        if (event.phase === 'upgraded') {
+          source.close();
+          if (settled) {
+            showUpgradedVideo(event);
+          } else {
+            // Joined after "done" had already gone by (e.g. a reconnect): the upgrade is the result.
+            settled = true;
+            resolve({ status: 'done', result: { success: true, video_url: event.video_url, quality: event.quality } });
+          }
+          return;
+        }
+        if (event.phase === 'upgrade_failed') {
+          source.close();
+          if (settled) {
+            statusMessage.textContent = `Showing the preview; the ${event.quality} render failed.`;
+          } else {
+            settled = true;
+            waitForJob(statusUrl).then(resolve, reject);
+          }
+          return;
+        }
+        if (!settled) statusMessage.textContent = describeEvent(event);
+      });
+      source.onerror = () => {
+        source.close();
+        if (!settled) waitForJob(statusUrl).then(resolve, reject);
+      };
+    });
+  }
 
   generateBtn.addEventListener('click', async () => {
     const promptText = promptInput.value.trim();
@@ -26,13 +132,21 @@ document.addEventListener('DOMContentLoaded', () => {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ prompt: promptText })
+        body: JSON.stringify({ prompt: promptText, quality: qualitySelect.value })
       });
 
-      const data = await response.json();
+      const queued = await response.json();
+      if (!response.ok || !queued.success || !queued.job_id) {
+        throw new Error(queued.message || 'Failed to queue animation.');
+      }
+
+      const job = await waitForJobEvents(queued.events_url, queued.status_url);
+      const data = job.result || {};
 
-      if (response.ok && data.success && data.video_url) {
-        statusMessage.textContent = 'Animation generated successfully!';
+      if (job.status === 'done' && data.success && data.video_url) {
+        statusMessage.textContent = data.upgrade_pending
+          ? `Preview ready; rendering ${data.upgrade_quality} in the background...`
+          : 'Animation generated successfully!';
         statusMessage.style.color = 'lightgreen';
         animationVideo.src = data.video_url;
         animationVideo.style.display = 'block';
@@ -40,13 +154,13 @@ document.addEventListener('DOMContentLoaded', () => {
         animationVideo.load();
         animationVideo.play().catch(e => console.warn("Autoplay was prevented:", e));
       } else {
-        statusMessage.textContent = `Error: ${data.message || 'Failed to generate animation.'}`;
+        statusMessage.textContent = `Error: ${job.error || data.message || 'Failed to generate animation.'}`;
         statusMessage.style.color = 'red';
       }
 
     } catch (error) {
       console.error('Error calling API:', error);
-      statusMessage.textContent = 'Error: Could not connect to the server or an unexpected error occurred.';
+      statusMessage.textContent = `Error: ${error.message || 'Could not connect to the server or an unexpected error occurred.'}`;
       statusMessage.style.color = 'red';
     } finally {
       generateBtn.disabled = false;
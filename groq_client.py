@@ -0,0 +1,207 @@
+# groq_client.py
+#
+# Shared keep-alive clients for the Groq chat-completions endpoint. Requests go through a
+# pooled session, transient failures (429/5xx, connection errors) are retried with jittered
+# exponential backoff, and a circuit breaker stops calling Groq for a while after repeated
+# failures so callers can fall back immediately instead of waiting out the timeout.
+
+import os
+import time
+import random
+import asyncio
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from observability import get_logger, Counter
+
+log = get_logger("groq")
+
+GROQ_POOL_CONNECTIONS = int(os.getenv("GROQ_POOL_CONNECTIONS", "4"))
+GROQ_POOL_MAXSIZE = int(os.getenv("GROQ_POOL_MAXSIZE", "16"))
+GROQ_CONNECT_TIMEOUT_SECONDS = float(os.getenv("GROQ_CONNECT_TIMEOUT_SECONDS", "5"))
+GROQ_READ_TIMEOUT_SECONDS = float(os.getenv("GROQ_READ_TIMEOUT_SECONDS", "30"))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "2"))
+GROQ_BACKOFF_BASE_SECONDS = float(os.getenv("GROQ_BACKOFF_BASE_SECONDS", "0.5"))
+GROQ_BACKOFF_MAX_SECONDS = float(os.getenv("GROQ_BACKOFF_MAX_SECONDS", "8"))
+GROQ_BREAKER_FAILURES = int(os.getenv("GROQ_BREAKER_FAILURES", "5"))
+GROQ_BREAKER_RESET_SECONDS = float(os.getenv("GROQ_BREAKER_RESET_SECONDS", "30"))
+
+RETRYABLE_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+LLM_REQUESTS = Counter("prompt2motion_llm_requests_total", "Groq HTTP attempts by outcome.", ["outcome"])
+
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    # closed -> open after `failure_threshold` consecutive failures; after `reset_seconds`
+    # one probe call is let through (half-open) and its outcome closes or re-opens the circuit.
+    def __init__(self, failure_threshold=GROQ_BREAKER_FAILURES, reset_seconds=GROQ_BREAKER_RESET_SECONDS,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed": return True
+            if self.state == "open" and self.clock() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open": log.warning("Groq circuit opened after %d consecutive failures.", self.consecutive_failures)
+                self.state = "open"
+                self.opened_at = self.clock()
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.consecutive_failures, "rejected": self.rejected,
+                    "failure_threshold": self.failure_threshold, "reset_seconds": self.reset_seconds}
+
+def backoff_delay(attempt, retry_after=None, base=GROQ_BACKOFF_BASE_SECONDS, cap=GROQ_BACKOFF_MAX_SECONDS):
+    # Full jitter: uniform in [0, min(cap, base * 2^attempt)]; a server Retry-After wins when given.
+    if retry_after is not None:
+        try: return min(cap, max(0.0, float(retry_after)))
+        except (TypeError, ValueError): pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+class GroqClient:
+    def __init__(self, url, api_key, pool_connections=GROQ_POOL_CONNECTIONS, pool_maxsize=GROQ_POOL_MAXSIZE,
+                 connect_timeout=GROQ_CONNECT_TIMEOUT_SECONDS, read_timeout=GROQ_READ_TIMEOUT_SECONDS,
+                 max_retries=GROQ_MAX_RETRIES, breaker=None, sleep=time.sleep):
+        self.url = url
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+        self.sleep = sleep
+        self.session = requests.Session()
+        # Retries are handled below so they can share the backoff policy and the breaker.
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
+
+    def chat(self, payload):
+        # Returns the decoded response body. Raises CircuitOpenError without touching the network
+        # while the breaker is open, otherwise the last requests exception once retries run out.
+        if not self.breaker.allow(): raise CircuitOpenError("Groq circuit is open; skipping request.")
+        answered = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                retry_after = None
+                try:
+                    response = self.session.post(self.url, json=payload, timeout=self.timeout)
+                    if response.status_code not in RETRYABLE_STATUS_CODES:
+                        # Groq answered, so the service is up even if this request was rejected.
+                        answered = True
+                        self.breaker.record_success()
+                        response.raise_for_status()
+                        LLM_REQUESTS.inc(outcome="ok")
+                        return response.json()
+                    retry_after = response.headers.get("Retry-After")
+                    error = requests.exceptions.HTTPError(f"{response.status_code} from Groq", response=response)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    error = e
+                except requests.exceptions.RequestException:
+                    # Other 4xx responses and broken transfers will not get better by retrying.
+                    LLM_REQUESTS.inc(outcome="client_error" if answered else "error")
+                    raise
+                LLM_REQUESTS.inc(outcome="retryable_error")
+                if attempt == self.max_retries: break
+                delay = backoff_delay(attempt, retry_after)
+                log.warning("Groq request failed (%s); retry %d/%d in %.2fs.", error, attempt + 1, self.max_retries, delay)
+                self.sleep(delay)
+            raise error
+        finally:
+            # Every way out without an answer counts as a failure, so a half-open probe always
+            # settles the breaker one way or the other.
+            if not answered: self.breaker.record_failure()
+
+    def close(self):
+        self.session.close()
+
+class AsyncGroqClient:
+    # asyncio counterpart for async servers. Uses aiohttp's pooled connector when it is installed
+    # and otherwise runs the blocking client in the default executor; both share the breaker.
+    def __init__(self, url, api_key, limit=GROQ_POOL_MAXSIZE, connect_timeout=GROQ_CONNECT_TIMEOUT_SECONDS,
+                 read_timeout=GROQ_READ_TIMEOUT_SECONDS, max_retries=GROQ_MAX_RETRIES, breaker=None, sync_client=None):
+        self.url = url
+        self.api_key = api_key
+        self.limit = limit
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.breaker = breaker or (sync_client.breaker if sync_client else CircuitBreaker())
+        self.sync_client = sync_client
+        self._session = None
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limit, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(connect=self.connect_timeout, sock_read=self.read_timeout),
+                headers={"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"})
+        return self._session
+
+    async def chat(self, payload):
+        if aiohttp is None:
+            if self.sync_client is None:
+                self.sync_client = GroqClient(self.url, self.api_key, max_retries=self.max_retries, breaker=self.breaker)
+            return await asyncio.get_running_loop().run_in_executor(None, self.sync_client.chat, payload)
+
+        if not self.breaker.allow(): raise CircuitOpenError("Groq circuit is open; skipping request.")
+        answered = False
+        try:
+            session = await self._get_session()
+            for attempt in range(self.max_retries + 1):
+                retry_after = None
+                try:
+                    async with session.post(self.url, json=payload) as response:
+                        if response.status not in RETRYABLE_STATUS_CODES:
+                            answered = True
+                            self.breaker.record_success()
+                            if response.status >= 400:
+                                LLM_REQUESTS.inc(outcome="client_error")
+                                response.raise_for_status()
+                            LLM_REQUESTS.inc(outcome="ok")
+                            return await response.json(content_type=None)
+                        retry_after = response.headers.get("Retry-After")
+                        error = requests.exceptions.HTTPError(f"{response.status} from Groq")
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    error = e
+                LLM_REQUESTS.inc(outcome="retryable_error")
+                if attempt == self.max_retries: break
+                delay = backoff_delay(attempt, retry_after)
+                log.warning("Groq request failed (%s); retry %d/%d in %.2fs.", error, attempt + 1, self.max_retries, delay)
+                await asyncio.sleep(delay)
+            raise error
+        finally:
+            if not answered: self.breaker.record_failure()
+
+    async def close(self):
+        if self._session is not None: await self._session.close()
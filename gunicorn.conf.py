@@ -0,0 +1,8 @@
+# gunicorn.conf.py
+#
+# gunicorn -c gunicorn.conf.py wsgi:app -- the same workers, threads, timeouts and drain hooks
+# as `python server.py`; configure with the WEB_* / *_TIMEOUT_SECONDS variables, not here.
+
+from server import gunicorn_options
+
+globals().update(gunicorn_options())
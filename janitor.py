@@ -0,0 +1,243 @@
+# janitor.py
+#
+# Background retention for what renders leave under manim_scenes/: generated scene scripts,
+# per-scene media (media/videos/<scene>, media/images/<scene>) and Manim's Tex/text caches. The
+# shared partial movie store keeps its own budget and is collected on the same schedule. Render
+# workspaces (manim_scenes/work/) left behind by a crashed process are removed like any other
+# expired artifact.
+#
+# Artifacts are removed when older than max_age_seconds, then least recently used first until
+# both max_bytes and max_artifacts are met. Never removed: anything modified within the grace
+# period, scenes with a render in flight, scenes backing a render cache entry, and paths a
+# registered protector (e.g. the job queues) still hands out. Renders in other processes (e.g.
+# other gunicorn workers, each with a janitor of its own) are seen through their flocks (see
+# render_workspace): a locked workspace is live, and the shared Tex/texts caches are only
+# touched while no render holds RENDERS_LOCK. Without flock only this process's renders
+# are known and the grace period, which then has to outlast any render, is the safeguard.
+
+import os
+import time
+import shutil
+import threading
+import contextlib
+import collections
+
+from observability import get_logger, Counter
+from render_cache import MANIM_SCENES_DIR, HAVE_FLOCK, render_cache, partial_movie_cache, try_lock
+from render_workspace import RENDERS_LOCK, WORKSPACE_LOCK
+
+log = get_logger("janitor")
+
+JANITOR_ENABLED = os.getenv("JANITOR_ENABLED", "1") == "1"
+JANITOR_INTERVAL_SECONDS = int(os.getenv("JANITOR_INTERVAL_SECONDS", "600"))
+JANITOR_MAX_AGE_SECONDS = int(os.getenv("JANITOR_MAX_AGE_SECONDS", str(3 * 24 * 3600)))
+JANITOR_MAX_BYTES = int(os.getenv("JANITOR_MAX_BYTES", str(5 * 1024 ** 3)))
+JANITOR_MAX_ARTIFACTS = int(os.getenv("JANITOR_MAX_ARTIFACTS", "5000"))
+# Longer than a 4k render's timeout (2700s).
+JANITOR_GRACE_SECONDS = int(os.getenv("JANITOR_GRACE_SECONDS", "3600"))
+
+# Per-scene media directories, named after the scene module (media/<kind>/<module>/...).
+SCENE_MEDIA_KINDS = ["videos", "images"]
+# Content-addressed caches Manim shares between scenes; any running render may read them.
+SHARED_CACHE_KINDS = ["Tex", "texts"]
+WORK_KIND = "work"
+
+JANITOR_RECLAIMED = Counter("prompt2motion_janitor_reclaimed_bytes_total", "Bytes removed by the janitor.", ["kind"])
+
+def _usage(path):
+    # (bytes, last modification) of a file or a whole directory tree.
+    if not os.path.isdir(path):
+        st = os.stat(path)
+        return st.st_size, st.st_mtime
+    total, last_used = 0, None
+    for root, _, files in os.walk(path):
+        for f_name in files:
+            try: st = os.stat(os.path.join(root, f_name))
+            except OSError: continue
+            total += st.st_size
+            last_used = max(last_used or 0, st.st_mtime)
+    # Directory mtimes change whenever Manim adds a subdirectory, so they only count when empty.
+    return total, last_used if last_used is not None else os.stat(path).st_mtime
+
+def _within(path, parent):
+    return path == parent or path.startswith(parent + os.sep)
+
+class Janitor:
+    def __init__(self, root=MANIM_SCENES_DIR, max_age_seconds=JANITOR_MAX_AGE_SECONDS, max_bytes=JANITOR_MAX_BYTES,
+                 max_artifacts=JANITOR_MAX_ARTIFACTS, grace_seconds=JANITOR_GRACE_SECONDS,
+                 interval_seconds=JANITOR_INTERVAL_SECONDS):
+        self.root = root
+        self.media_dir = os.path.join(root, "media")
+        self.work_dir = os.path.join(root, WORK_KIND)
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        self.max_artifacts = max_artifacts
+        self.grace_seconds = grace_seconds
+        self.interval_seconds = interval_seconds
+        self.runs = 0
+        self.artifacts_removed = 0
+        self.bytes_reclaimed = 0
+        self.last_run = None
+        self.last_report = None
+        self._active = collections.Counter()
+        self._protectors = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @contextlib.contextmanager
+    def rendering(self, scene_class_name):
+        # Marks a scene's script and media as in use for the duration of its render.
+        module_name = scene_class_name.lower()
+        with self._lock: self._active[module_name] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active[module_name] -= 1
+                if self._active[module_name] <= 0: del self._active[module_name]
+
+    def add_protector(self, protector):
+        # protector() returns absolute paths that must survive; a directory containing one is kept.
+        # Render cache eviction respects the same paths.
+        self._protectors.append(protector)
+        render_cache.add_protector(protector)
+
+    def rendering_paths(self):
+        # Published media directories of the scenes this process is rendering.
+        with self._lock: module_names = list(self._active)
+        return [os.path.join(self.media_dir, kind, name) for name in module_names for kind in SCENE_MEDIA_KINDS]
+
+    def _artifacts(self):
+        # (last_used, size, path, scene module or None for shared cache files, kind)
+        found = []
+
+        def add(path, module_name, kind):
+            try: size, last_used = _usage(path)
+            except OSError: return
+            found.append((last_used, size, path, module_name, kind))
+
+        try: script_names = os.listdir(self.root)
+        except OSError: script_names = []
+        for f_name in script_names:
+            if f_name.endswith(".py") and os.path.isfile(os.path.join(self.root, f_name)):
+                add(os.path.join(self.root, f_name), f_name[:-3].lower(), "scripts")
+        for kind in SCENE_MEDIA_KINDS + SHARED_CACHE_KINDS:
+            kind_dir = os.path.join(self.media_dir, kind)
+            try: names = os.listdir(kind_dir)
+            except OSError: continue
+            for name in names:
+                add(os.path.join(kind_dir, name), name.lower() if kind in SCENE_MEDIA_KINDS else None, kind)
+        try: workspace_names = os.listdir(self.work_dir)
+        except OSError: workspace_names = []
+        for name in workspace_names:
+            if name.startswith("."): continue  # lock files
+            add(os.path.join(self.work_dir, name), None, WORK_KIND)
+        return found
+
+    def _protected_paths(self):
+        protected = set(render_cache.scene_dirs())
+        for protector in list(self._protectors):
+            try: protected.update(os.path.abspath(path) for path in protector() if path)
+            except Exception as e: log.warning("Janitor protector failed; skipping this sweep: %s", e); return None
+        return protected
+
+    def _lock_path(self, path, kind):
+        # The flock a live render (in any process) holds on what `path` belongs to.
+        if kind == WORK_KIND: return os.path.join(path, WORKSPACE_LOCK)
+        if kind in SHARED_CACHE_KINDS:
+            os.makedirs(self.work_dir, exist_ok=True)
+            return os.path.join(self.work_dir, RENDERS_LOCK)
+        return None
+
+    def _remove(self, path, module_name, kind):
+        # Checked under the lock that rendering() takes, so a render cannot start on a scene (or,
+        # for shared caches, at all) between the check and the delete; the flock does the same
+        # for renders in other processes.
+        with self._lock:
+            if module_name and self._active[module_name]: return False
+            if (kind in SHARED_CACHE_KINDS or kind == WORK_KIND and not HAVE_FLOCK) and self._active: return False
+            lock_path = self._lock_path(path, kind)
+            with (try_lock(lock_path) if lock_path else contextlib.nullcontext(True)) as unused:
+                if not unused: return False
+                try:
+                    if os.path.isdir(path): shutil.rmtree(path)
+                    else: os.remove(path)
+                except OSError as e:
+                    log.warning("Janitor could not remove %s: %s", path, e)
+                    return False
+        return True
+
+    def sweep(self):
+        started = time.time()
+        protected = self._protected_paths()
+        if protected is None: return None
+        artifacts = self._artifacts()
+        candidates = [artifact for artifact in artifacts
+                      if started - artifact[0] >= self.grace_seconds
+                      and not any(_within(path, artifact[2]) for path in protected)]
+        total_bytes = sum(size for _, size, _, _, _ in artifacts)
+        count = len(artifacts)
+        removed = reclaimed = 0
+        by_kind = collections.Counter()
+        for last_used, size, path, module_name, kind in sorted(candidates):
+            expired = started - last_used > self.max_age_seconds
+            if not expired and total_bytes <= self.max_bytes and count <= self.max_artifacts: break
+            if not self._remove(path, module_name, kind): continue
+            total_bytes -= size
+            count -= 1
+            removed += 1
+            reclaimed += size
+            by_kind[kind] += size
+        for kind, size in by_kind.items(): JANITOR_RECLAIMED.inc(size, kind=kind)
+
+        partial_reclaimed = partial_movie_cache.collect()
+        if partial_reclaimed: JANITOR_RECLAIMED.inc(partial_reclaimed, kind="partial_movie_files")
+        report = {"artifacts_removed": removed, "bytes_reclaimed": reclaimed + partial_reclaimed,
+                  "bytes_reclaimed_by_kind": {**by_kind, "partial_movie_files": partial_reclaimed},
+                  "remaining_artifacts": count, "remaining_bytes": total_bytes, "seconds": time.time() - started}
+        with self._lock:
+            self.runs += 1
+            self.artifacts_removed += removed
+            self.bytes_reclaimed += report["bytes_reclaimed"]
+            self.last_run = started
+            self.last_report = report
+        if removed or partial_reclaimed:
+            log.info("Janitor removed %d artifacts, reclaimed %d bytes (%d left in %d artifacts)",
+                     removed, report["bytes_reclaimed"], total_bytes, count)
+        return report
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try: self.sweep()
+            except Exception as e: log.exception("Janitor sweep failed: %s", e)
+
+    def start(self):
+        if self._thread is not None: return
+        self._thread = threading.Thread(target=self._run, name="media-janitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": JANITOR_ENABLED,
+                "running": self._thread is not None and not self._stop.is_set(),
+                "max_age_seconds": self.max_age_seconds,
+                "max_bytes": self.max_bytes,
+                "max_artifacts": self.max_artifacts,
+                "grace_seconds": self.grace_seconds,
+                "interval_seconds": self.interval_seconds,
+                "renders_in_flight": sum(self._active.values()),
+                "runs": self.runs,
+                "artifacts_removed": self.artifacts_removed,
+                "bytes_reclaimed": self.bytes_reclaimed,
+                "last_run": self.last_run,
+                "last_report": self.last_report,
+            }
+
+janitor = Janitor()
+# A render of an evicted scene publishes into the directory the eviction would delete.
+render_cache.add_protector(janitor.rendering_paths)
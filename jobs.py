@@ -0,0 +1,194 @@
+# jobs.py
+
+import os
+import time
+import uuid
+import queue
+import itertools
+import threading
+from collections import deque
+
+from observability import get_logger, request_context
+
+log = get_logger("jobs")
+
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+RENDER_QUEUE_MAX = int(os.getenv("RENDER_QUEUE_MAX", "100"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+def _percentile(samples, pct):
+    if not samples: return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+class Job:
+    def __init__(self, prompt_text, request_id=None, options=None):
+        self.id = uuid.uuid4().hex
+        self.request_id = request_id or self.id[:16]
+        self.prompt = prompt_text
+        self.options = options or {}
+        self.status = "queued"
+        self.progress = "queued"
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.events = []
+        self._done_callbacks = []
+        self._events_changed = threading.Condition()
+
+    def emit(self, phase, **fields):
+        with self._events_changed:
+            self.events.append({"id": len(self.events), "phase": phase, "time": time.time(), **fields})
+            self.progress = phase
+            self._events_changed.notify_all()
+
+    def add_done_callback(self, callback):
+        # callback(job) runs on the worker thread once the final "done"/"failed" event is out.
+        self._done_callbacks.append(callback)
+
+    def events_after(self, index, timeout):
+        # Blocks until there are events past `index` or the timeout elapses.
+        with self._events_changed:
+            self._events_changed.wait_for(lambda: len(self.events) > index, timeout)
+            return self.events[index:]
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "request_id": self.request_id,
+            "prompt": self.prompt,
+            "options": self.options,
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "wait_seconds": (self.started or time.time()) - self.created,
+            "run_seconds": ((self.finished or time.time()) - self.started) if self.started else None,
+        }
+
+class QueueClosed(queue.Full):
+    # The queue is draining for shutdown; a subclass of queue.Full so callers still answer 503.
+    pass
+
+class JobQueue:
+    def __init__(self, worker_fn, num_workers=RENDER_WORKERS, max_queued=RENDER_QUEUE_MAX,
+                 retention_seconds=JOB_RETENTION_SECONDS):
+        self.worker_fn = worker_fn
+        self.num_workers = num_workers
+        self.retention_seconds = retention_seconds
+        # (priority, submission number, job): lowest priority first, FIFO among equals.
+        self._queue = queue.PriorityQueue(maxsize=max_queued)
+        self._submissions = itertools.count()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._closed = False
+        self._wait_times = deque(maxlen=500)
+        self._run_times = deque(maxlen=500)
+        self._workers = []
+        for i in range(num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"render-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, prompt_text, request_id=None, options=None, priority=None):
+        # Raises queue.Full when the backlog is at capacity (QueueClosed once draining); callers
+        # turn that into a 503. Queued jobs start in priority order (admission.sjf_priority);
+        # without one, in submission order.
+        job = Job(prompt_text, request_id, options)
+        job.emit("queued")
+        with self._lock:
+            if self._closed: raise QueueClosed("Job queue is shutting down.")
+            self._prune_locked()
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait((time.monotonic() if priority is None else priority, next(self._submissions), job))
+        except queue.Full:
+            with self._lock: self._jobs.pop(job.id, None)
+            raise
+        return job
+
+    def get(self, job_id):
+        with self._lock: return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock: return list(self._jobs.values())
+
+    def close(self):
+        # Stops accepting jobs; queued and running ones still complete.
+        with self._lock: self._closed = True
+
+    def drain(self, timeout=None):
+        # Closes the queue and waits for every accepted job to finish. False if the timeout hit first.
+        self.close()
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def estimated_wait_seconds(self):
+        # Rough time before a job submitted now starts: the backlog ahead of it at the median run
+        # time. None until a job has finished.
+        with self._lock:
+            if not self._run_times: return None
+            backlog = self._queue.qsize() + self._running - self.num_workers + 1
+            return max(0, backlog) * _percentile(list(self._run_times), 50) / max(1, self.num_workers)
+
+    def _prune_locked(self):
+        cutoff = time.time() - self.retention_seconds
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.finished < cutoff: del self._jobs[job_id]
+
+    def _worker_loop(self):
+        while True:
+            _, _, job = self._queue.get()
+            with self._lock:
+                job.status = "running"
+                job.started = time.time()
+                self._running += 1
+                self._wait_times.append(job.started - job.created)
+            job.emit("running")
+            try:
+                with request_context(job.request_id):
+                    job.result = self.worker_fn(job)
+                job.status = "done" if job.result and job.result.get("success") else "failed"
+                if job.status == "failed": job.error = (job.result or {}).get("message", "Render failed.")
+            except Exception as e:
+                log.exception("Error in render job %s: %s", job.id, e)
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                with self._lock:
+                    job.finished = time.time()
+                    self._running -= 1
+                    self._run_times.append(job.finished - job.started)
+                    if job.status == "done": self._completed += 1
+                    else: self._failed += 1
+                job.emit(job.status, result=job.result, error=job.error)
+                for callback in job._done_callbacks:
+                    try: callback(job)
+                    except Exception as e: log.exception("Done callback of job %s failed: %s", job.id, e)
+                self._queue.task_done()
+
+    def stats(self):
+        with self._lock:
+            wait_times = list(self._wait_times)
+            run_times = list(self._run_times)
+            return {
+                "workers": self.num_workers,
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "running": self._running,
+                "closed": self._closed,
+                "completed": self._completed,
+                "failed": self._failed,
+                "wait_seconds_p50": _percentile(wait_times, 50),
+                "wait_seconds_p95": _percentile(wait_times, 95),
+                "run_seconds_p50": _percentile(run_times, 50),
+                "run_seconds_p95": _percentile(run_times, 95),
+            }
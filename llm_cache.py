@@ -0,0 +1,107 @@
+# llm_cache.py
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import contextlib
+
+BACKEND_DIR = os.path.abspath(os.path.dirname(__file__))
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(BACKEND_DIR, ".cache", "llm_cache.sqlite3"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+_QUOTED_RE = re.compile(r"(\"[^\"]*\"|'[^']*')")
+# Numbers keep their sign and decimal or thousands separators: "-90" and "90", or "1.5" and
+# "15", ask for different scenes.
+_NUMBER_RE = re.compile(r"(?<![\w.,-])(-?(?:\d+(?:[.,]\d+)*|[.,]\d+))")
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+# Bumped whenever normalize_prompt changes, so keys built the old way are never looked up again.
+NORMALIZATION_VERSION = 2
+
+def _fold(text):
+    folded = []
+    for index, part in enumerate(_NUMBER_RE.split(text.lower())):
+        folded.append(part if index % 2 else _PUNCTUATION_RE.sub(" ", part))
+    return " ".join(folded)
+
+def normalize_prompt(prompt_text):
+    # Quoted text ends up verbatim in a Text mobject, so only the unquoted parts are folded.
+    normalized_parts = []
+    for part in _QUOTED_RE.split(prompt_text or ""):
+        if _QUOTED_RE.fullmatch(part):
+            normalized_parts.append(part)
+        else:
+            normalized_parts.append(_fold(part))
+    return " ".join(" ".join(normalized_parts).split())
+
+def prompt_version(system_prompt, model):
+    return hashlib.sha256(f"{model}\n{NORMALIZATION_VERSION}\n{system_prompt}".encode("utf-8")).hexdigest()[:16]
+
+class LLMCache:
+    def __init__(self, version, db_path=LLM_CACHE_PATH, ttl_seconds=LLM_CACHE_TTL_SECONDS,
+                 max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.version = version
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS llm_responses (
+                prompt_key TEXT PRIMARY KEY, version TEXT NOT NULL, response TEXT NOT NULL,
+                created REAL NOT NULL, last_access REAL NOT NULL)""")
+            # Entries produced under a different system prompt or model can never hit again.
+            conn.execute("DELETE FROM llm_responses WHERE version != ?", (self.version,))
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            with conn: yield conn
+        finally:
+            conn.close()
+
+    def get(self, prompt_text):
+        prompt_key = normalize_prompt(prompt_text)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT response, created FROM llm_responses WHERE prompt_key = ? AND version = ?",
+                               (prompt_key, self.version)).fetchone()
+            if row and now - row[1] <= self.ttl_seconds:
+                conn.execute("UPDATE llm_responses SET last_access = ? WHERE prompt_key = ?", (now, prompt_key))
+                self.hits += 1
+                return json.loads(row[0])
+            if row: conn.execute("DELETE FROM llm_responses WHERE prompt_key = ?", (prompt_key,))
+            self.misses += 1
+            return None
+
+    def put(self, prompt_text, params):
+        prompt_key = normalize_prompt(prompt_text)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO llm_responses VALUES (?, ?, ?, ?, ?)",
+                         (prompt_key, self.version, json.dumps(params), now, now))
+            conn.execute("DELETE FROM llm_responses WHERE created < ?", (now - self.ttl_seconds,))
+            conn.execute("""DELETE FROM llm_responses WHERE prompt_key IN (
+                SELECT prompt_key FROM llm_responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)""",
+                         (self.max_entries,))
+
+    def stats(self):
+        with self._lock, self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
@@ -0,0 +1,274 @@
+# manim_workers.py
+#
+# Long-lived render processes that import Manim once and render scenes in-process, either
+# built straight from a spec or a list of specs (scene_builder) or from generated script source.
+# Each worker speaks JSON lines: one task per line on stdin; on stdout, zero or more
+# {"event": ...} progress lines followed by exactly one reply line per task.
+
+import os
+import sys
+import json
+import atexit
+import time
+import queue
+import threading
+import traceback
+import subprocess
+
+import sandbox
+from observability import get_logger
+
+log = get_logger("manim_workers")
+
+BACKEND_DIR = os.path.abspath(os.path.dirname(__file__))
+
+MANIM_WORKER_PROCESSES = int(os.getenv("MANIM_WORKER_PROCESSES", "2"))
+MANIM_WORKER_MAX_RENDERS = int(os.getenv("MANIM_WORKER_MAX_RENDERS", "50"))
+MANIM_WORKER_MAX_RSS_MB = int(os.getenv("MANIM_WORKER_MAX_RSS_MB", "1024"))
+MANIM_WORKER_START_TIMEOUT_SECONDS = int(os.getenv("MANIM_WORKER_START_TIMEOUT_SECONDS", "60"))
+# After a worker fails to start, renders use the subprocess fallback for this long before the
+# pool tries again, doubling per consecutive failure up to the maximum.
+MANIM_WORKER_RETRY_SECONDS = int(os.getenv("MANIM_WORKER_RETRY_SECONDS", "30"))
+MANIM_WORKER_RETRY_MAX_SECONDS = int(os.getenv("MANIM_WORKER_RETRY_MAX_SECONDS", "900"))
+
+class WorkerUnavailable(Exception):
+    pass
+
+def _max_rss_mb():
+    try: import resource
+    except ImportError: return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux but bytes on macOS.
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+def _with_progress_events(scene_class, emit):
+    class ProgressScene(scene_class):
+        def play(self, *args, **kwargs):
+            index = getattr(self, "_progress_play_index", 0)
+            self._progress_play_index = index + 1
+            description = ", ".join(type(arg).__name__.lstrip("_") for arg in args)
+            emit({"phase": "animation", "index": index, "description": description, "percent": 0})
+            super().play(*args, **kwargs)
+            emit({"phase": "animation", "index": index, "description": description, "percent": 100})
+
+        def tear_down(self):
+            super().tear_down()
+            # Scene.render combines the partial movies right after tear_down.
+            emit({"phase": "encoding"})
+
+    ProgressScene.__name__ = ProgressScene.__qualname__ = scene_class.__name__
+    return ProgressScene
+
+def _render_task(task, emit):
+    from manim import tempconfig
+    if "specs" in task:
+        from scene_builder import build_composed_scene_class
+        scene_class = build_composed_scene_class(task["specs"], task["scene_class_name"])
+    elif "spec" in task:
+        from scene_builder import build_scene_class
+        scene_class = build_scene_class(task["spec"], task["scene_class_name"])
+    else:
+        namespace = {"__name__": task["module_name"]}
+        exec(compile(task["script"], task["script_path"], "exec"), namespace)
+        scene_class = namespace[task["scene_class_name"]]
+    scene_class = _with_progress_events(scene_class, emit)
+    # input_file only names the output directory (media/videos/<module>/<quality>).
+    with tempconfig({"media_dir": task["media_dir"], "quality": task["quality"], "input_file": task["script_path"],
+                     "save_sections": task.get("save_sections", False), **task.get("manim_config", {})}):
+        scene = scene_class()
+        scene.render()
+        return str(scene.renderer.file_writer.movie_file_path)
+
+def worker_main():
+    # Manim logs to stdout, so keep a private handle for replies and point fd 1 at stderr.
+    reply_stream = os.fdopen(os.dup(1), "w", buffering=1, encoding="utf-8")
+    os.dup2(2, 1)
+
+    def reply(message):
+        reply_stream.write(json.dumps(message) + "\n")
+        reply_stream.flush()
+
+    try:
+        import manim  # noqa: F401 - paid once per worker instead of once per render
+    except Exception as e:
+        reply({"ready": False, "error": f"Could not import manim: {e}"})
+        return
+    sandbox.install_worker_handlers()
+    reply({"ready": True, "pid": os.getpid()})
+
+    for line in sys.stdin:
+        if not line.strip(): continue
+        task = json.loads(line)
+        started = time.time()
+        try:
+            try:
+                sandbox.start_cpu_budget()
+                video_path = _render_task(task, lambda event: reply({"event": event}))
+            finally:
+                sandbox.end_cpu_budget()
+            reply({"ok": True, "video_path": video_path, "seconds": time.time() - started, "rss_mb": _max_rss_mb()})
+        except Exception as e:
+            reply({"ok": False, "error": str(e), "traceback": traceback.format_exc(),
+                   "breach": sandbox.breach_from_exception(e), "seconds": time.time() - started, "rss_mb": _max_rss_mb()})
+
+class WarmWorker:
+    def __init__(self, max_renders=MANIM_WORKER_MAX_RENDERS):
+        self.renders = 0
+        # Memory, file size, priority and a lifetime CPU cap hold for the worker's lifetime; CPU is
+        # also budgeted per task.
+        cpu_limit = sandbox.worker_cpu_limit(max_renders)
+        command = sandbox.wrap_command([sys.executable, os.path.abspath(__file__)], cpu_limit, cpu_limit)
+        self.process = subprocess.Popen(command, cwd=BACKEND_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        text=True, bufsize=1, **sandbox.popen_kwargs())
+        self._replies = queue.Queue()
+        threading.Thread(target=self._read_replies, daemon=True).start()
+        hello = self._next_reply(MANIM_WORKER_START_TIMEOUT_SECONDS)
+        if not hello or not hello.get("ready"):
+            self.kill()
+            raise WorkerUnavailable((hello or {}).get("error", "Manim worker did not start."))
+
+    def _read_replies(self):
+        for line in self.process.stdout:
+            try: self._replies.put(json.loads(line))
+            except ValueError: pass
+        self._replies.put(None)
+
+    def _next_reply(self, timeout):
+        try: return self._replies.get(timeout=timeout)
+        except queue.Empty: return None
+
+    def render(self, task, timeout, on_event=None):
+        try:
+            self.process.stdin.write(json.dumps(task) + "\n")
+            self.process.stdin.flush()
+        except OSError as e:
+            # Died while idle, so the task never started; the caller can run it elsewhere.
+            self.kill()
+            raise WorkerUnavailable(f"Manim worker exited before the task was sent: {e}")
+        deadline = time.time() + timeout
+        reply = self._next_reply(timeout)
+        while reply is not None and "event" in reply:
+            if on_event: on_event(reply["event"])
+            reply = self._next_reply(max(0, deadline - time.time()))
+        self.renders += 1
+        if reply is None:
+            timed_out = time.time() >= deadline
+            self.kill()
+            if timed_out: return {"ok": False, "error": "Manim worker timed out.", "timed_out": True, "breach": "timeout"}
+            # Dead before the deadline: killed by the CPU hard limit or the OOM killer, or it crashed.
+            return {"ok": False, "error": f"Manim worker exited (code {self.process.returncode}).", "timed_out": False,
+                    "breach": sandbox.breach_from_returncode(self.process.returncode)}
+        return reply
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def kill(self):
+        # The whole session: the worker and anything its render spawned.
+        sandbox.kill_process_group(self.process)
+        self.process.wait()
+
+    def close(self):
+        if self.alive():
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=5)
+            except Exception:
+                self.kill()
+
+class WarmRenderPool:
+    def __init__(self, size=MANIM_WORKER_PROCESSES, max_renders=MANIM_WORKER_MAX_RENDERS,
+                 max_rss_mb=MANIM_WORKER_MAX_RSS_MB, retry_seconds=MANIM_WORKER_RETRY_SECONDS,
+                 retry_max_seconds=MANIM_WORKER_RETRY_MAX_SECONDS, clock=time.monotonic):
+        self.size = size
+        self.max_renders = max_renders
+        self.max_rss_mb = max_rss_mb
+        self.retry_seconds = retry_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.clock = clock
+        self.recycled = 0
+        self.spawn_failures = 0
+        self.retry_at = None
+        self.unavailable_reason = None if size > 0 else "Disabled (MANIM_WORKER_PROCESSES=0)."
+        self._idle = queue.Queue()
+        self._slots = threading.Semaphore(max(size, 0))
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        # Off while backing off after a failed start; the first render past retry_at tries again.
+        if self.size <= 0: return False
+        with self._lock: return self.retry_at is None or self.clock() >= self.retry_at
+
+    def _acquire_worker(self):
+        while True:
+            try: worker = self._idle.get_nowait()
+            except queue.Empty: return self._spawn_worker()
+            if worker.alive(): return worker
+            # Died while idle (OOM killer, CPU cap): reap it and anything it left running.
+            worker.kill()
+            with self._lock: self.recycled += 1
+
+    def _spawn_worker(self):
+        try:
+            worker = WarmWorker(self.max_renders)
+        except (WorkerUnavailable, OSError) as e:
+            # Often lasting (a missing or broken manim install), but not always (fork or memory
+            # pressure), so renders fall back to subprocesses for a while and then try again.
+            with self._lock:
+                self.spawn_failures += 1
+                delay = min(self.retry_max_seconds, self.retry_seconds * 2 ** (self.spawn_failures - 1))
+                self.retry_at = self.clock() + delay
+                self.unavailable_reason = str(e)
+            log.warning("Manim worker failed to start (%s); retrying in %ds.", e, delay)
+            raise WorkerUnavailable(str(e)) from e
+        with self._lock:
+            if self.spawn_failures: log.info("Manim worker started after %d failed attempts.", self.spawn_failures)
+            self.spawn_failures = 0
+            self.retry_at = None
+            self.unavailable_reason = None
+        return worker
+
+    def render(self, task, timeout, on_event=None):
+        if not self.enabled: raise WorkerUnavailable(self.unavailable_reason)
+        with self._slots:
+            worker = self._acquire_worker()
+            try: reply = worker.render(task, timeout, on_event)
+            except WorkerUnavailable:
+                with self._lock: self.recycled += 1
+                raise
+            rss_mb = reply.get("rss_mb")
+            # A breach may leave Manim half torn down (e.g. after a MemoryError), so start fresh.
+            if not worker.alive() or worker.renders >= self.max_renders or (rss_mb and rss_mb > self.max_rss_mb) \
+                    or reply.get("breach"):
+                worker.close()
+                with self._lock: self.recycled += 1
+            else:
+                self._idle.put(worker)
+            return reply
+
+    def warm(self):
+        # Start every worker up front so the first renders skip the Manim import too.
+        while self.enabled and self._idle.qsize() < self.size:
+            try: self._idle.put(self._spawn_worker())
+            except WorkerUnavailable: break
+
+    def stats(self):
+        enabled = self.enabled
+        with self._lock:
+            return {"size": self.size, "idle": self._idle.qsize(), "recycled": self.recycled,
+                    "max_renders": self.max_renders, "max_rss_mb": self.max_rss_mb,
+                    "enabled": enabled, "unavailable_reason": self.unavailable_reason,
+                    "spawn_failures": self.spawn_failures,
+                    "retry_in_seconds": max(0.0, self.retry_at - self.clock()) if self.retry_at is not None else None}
+
+    def shutdown(self):
+        while True:
+            try: self._idle.get_nowait().close()
+            except queue.Empty: break
+
+render_pool = WarmRenderPool()
+atexit.register(render_pool.shutdown)
+
+if __name__ == "__main__":
+    worker_main()
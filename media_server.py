@@ -0,0 +1,89 @@
+# media_server.py
+#
+# Serves rendered videos. Responses carry a strong ETag derived from the file's content and
+# support Range requests, so players can seek without refetching. URLs handed out by the API
+# include a content version (?v=<hash prefix>); a request whose version matches the file is
+# immutable and cacheable for a year, anything else revalidates. With MEDIA_OFFLOAD set, the
+# front server streams the bytes instead of a Python worker (X-Sendfile or nginx X-Accel-Redirect).
+
+import os
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
+
+from flask import Response, abort, request, send_file
+from werkzeug.security import safe_join
+
+# "" (Flask streams the file, via the server's sendfile when it offers wsgi.file_wrapper),
+# "sendfile" (X-Sendfile for Apache/lighttpd) or "accel" (X-Accel-Redirect for nginx).
+MEDIA_OFFLOAD = os.getenv("MEDIA_OFFLOAD", "").lower()
+# nginx `internal` location that maps onto the media root, e.g. location /internal_media/ { internal; alias ...; }
+MEDIA_ACCEL_PREFIX = os.getenv("MEDIA_ACCEL_PREFIX", "/internal_media/")
+MEDIA_IMMUTABLE_MAX_AGE_SECONDS = int(os.getenv("MEDIA_IMMUTABLE_MAX_AGE_SECONDS", str(365 * 24 * 3600)))
+MEDIA_ETAG_CACHE_ENTRIES = int(os.getenv("MEDIA_ETAG_CACHE_ENTRIES", "4096"))
+VERSION_LENGTH = 16
+HASH_CHUNK_BYTES = 1024 * 1024
+
+_etags = OrderedDict()
+_etags_lock = threading.Lock()
+
+def configure_app(app):
+    app.config["USE_X_SENDFILE"] = MEDIA_OFFLOAD == "sendfile"
+
+def content_etag(path):
+    # sha256 of the file, remembered per (path, size, mtime) so each version is hashed once.
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    with _etags_lock:
+        etag = _etags.get(key)
+        if etag is not None:
+            _etags.move_to_end(key)
+            return etag
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""): digest.update(chunk)
+    etag = digest.hexdigest()
+    with _etags_lock:
+        _etags[key] = etag
+        while len(_etags) > MEDIA_ETAG_CACHE_ENTRIES: _etags.popitem(last=False)
+    return etag
+
+def content_version(path):
+    return content_etag(path)[:VERSION_LENGTH]
+
+def _cache_control(response, immutable):
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = MEDIA_IMMUTABLE_MAX_AGE_SECONDS
+        response.cache_control.immutable = True
+    else:
+        # Unversioned URL: the bytes behind it may be re-rendered, so revalidate (a cheap 304).
+        response.cache_control.no_cache = True
+
+def send_media(root, filename):
+    path = safe_join(root, filename)
+    if path is None or not os.path.isfile(path): abort(404)
+    etag = content_etag(path)
+    version = request.args.get("v")
+    # Only the full-length prefix that content_version() hands out: "?v=a" would match 1 in 16 files.
+    immutable = version is not None and len(version) == VERSION_LENGTH and etag.startswith(version)
+    mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    if MEDIA_OFFLOAD == "accel":
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            # nginx serves the file (and any Range) from its internal location.
+            response = Response(mimetype=mimetype)
+            response.headers["X-Accel-Redirect"] = MEDIA_ACCEL_PREFIX.rstrip("/") + "/" + filename.lstrip("/")
+        response.set_etag(etag)
+        _cache_control(response, immutable)
+        return response
+
+    # send_file answers If-None-Match/If-Range and Range itself; with USE_X_SENDFILE (see
+    # configure_app) it only sets the X-Sendfile header and leaves the body to the front server.
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=etag)
+    _cache_control(response, immutable)
+    return response
@@ -0,0 +1,166 @@
+# observability.py
+#
+# Leveled logging with a per-request id, timing spans and a small Prometheus-style
+# metrics registry rendered by the /metrics endpoint.
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import contextlib
+import contextvars
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+@contextlib.contextmanager
+def request_context(request_id):
+    token = request_id_var.set(request_id)
+    try: yield request_id
+    finally: request_id_var.reset(token)
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"ts": record.created, "level": record.levelname, "logger": record.name,
+                 "request_id": getattr(record, "request_id", "-"), "message": record.getMessage()}
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info: entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+_logging_configured = False
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    global _logging_configured
+    if _logging_configured: return
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestIdFilter())
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+    logger = logging.getLogger("prompt2motion")
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    _logging_configured = True
+
+def get_logger(name):
+    configure_logging()
+    return logging.getLogger(f"prompt2motion.{name}")
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs: return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for labelvalues, value in sorted(self._values.items()):
+                lines.extend(self._render_sample(labelvalues, value))
+        return lines
+
+    def _render_sample(self, labelvalues, value):
+        return [f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock: self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), callback=None):
+        # callback, when given, is called at scrape time and returns {labelvalues tuple: value}.
+        super().__init__(name, help_text, labelnames)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        with self._lock: self._values[self._key(labels)] = value
+
+    def render(self):
+        if self.callback:
+            try: values = self.callback()
+            except Exception: values = {}
+            with self._lock: self._values = {tuple(str(v) for v in k): v2 for k, v2 in values.items() if v2 is not None}
+        return super().render()
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound: counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def _render_sample(self, labelvalues, value):
+        counts, total, count = value
+        lines = [f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, [('le', bound)])} {bucket_count}"
+                 for bound, bucket_count in zip(self.buckets, counts)]
+        lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, [('le', '+Inf')])} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labelvalues)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, labelvalues)} {count}")
+        return lines
+
+REGISTRY = []
+
+STAGE_SECONDS = Histogram("prompt2motion_stage_seconds", "Time spent in each pipeline stage.", ["stage", "outcome"])
+
+@contextlib.contextmanager
+def span(stage, logger=None):
+    # Times a pipeline stage into STAGE_SECONDS; the outcome label separates failures.
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage, outcome=outcome)
+        if logger: logger.debug("stage %s finished in %.3fs (%s)", stage, elapsed, outcome)
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY: lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,226 @@
+# prompt_parser.py
+#
+# Deterministic parser for the simple prompts that make up most traffic ("a purple circle moving
+# up and down", "a red square appears, then moves up by 2, then turns blue"). It produces the same
+# parameter dict the LLM is asked for, plus a confidence: the share of meaningful words the rules
+# understood. Anything it cannot account for (positions, simultaneous actions, several objects)
+# lowers the confidence so the caller can fall through to the LLM; negations ("don't rotate it")
+# always do, since the rules would read them as the action itself.
+
+import re
+
+SHAPE_WORDS = {
+    "circle": "Circle", "square": "Square", "triangle": "Triangle", "rectangle": "Rectangle",
+    "line": "Line", "dot": "Dot", "star": "Star", "polygon": "Polygon",
+}
+COLOR_WORDS = {
+    "red": "RED", "green": "GREEN", "blue": "BLUE", "yellow": "YELLOW", "orange": "ORANGE",
+    "purple": "PURPLE", "pink": "PINK", "white": "WHITE", "black": "BLACK", "violet": "VIOLET",
+    "gray": "GRAY", "grey": "GRAY", "light gray": "LIGHT_GRAY", "light grey": "LIGHT_GRAY",
+    "dark gray": "DARK_GRAY", "dark grey": "DARK_GRAY",
+}
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+                "nine": 9, "ten": 10}
+# Words that carry no meaning for the spec; everything else must be matched by a rule.
+FILLER_WORDS = frozenset([
+    "a", "an", "the", "it", "its", "this", "that", "which", "then", "and", "after", "afterwards",
+    "finally", "first", "also", "please", "now", "is", "are", "be", "by", "unit", "units", "of", "with",
+    "to", "make", "makes", "making", "let", "show", "shows", "showing", "animate", "animation", "animating", "s",
+])
+
+def _alternation(words):
+    # Longest first so "light gray" wins over "gray".
+    return "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+_SHAPE = rf"(?P<shape>{_alternation(SHAPE_WORDS)})s?"
+_COLOR = rf"(?P<color>{_alternation(COLOR_WORDS)})"
+_NUMBER = rf"(?P<number>\d+(?:\.\d+)?|{_alternation(NUMBER_WORDS)})"
+# Angles may be signed: "-90 degrees" turns the other way.
+_SIGNED_NUMBER = rf"(?P<number>[-+]?\d+(?:\.\d+)?|{_alternation(NUMBER_WORDS)})"
+_DIRECTION = r"(?:up|down|left|right|upwards?|downwards?|leftwards?|rightwards?)"
+_ROTATION_SENSE = r"(?P<sense>counter[\s-]?clockwise|anti[\s-]?clockwise|clockwise)"
+# An apostrophe inside a word ("it's") never opens a quote.
+_QUOTED = r"(?P<quoted>\"[^\"]+\"|(?<!\w)'[^']+'(?!\w))"
+
+def _regex(pattern):
+    return re.compile(rf"\b{pattern}(?!\w)", re.IGNORECASE)
+
+def _number(text):
+    text = text.lower()
+    return float(NUMBER_WORDS[text]) if text in NUMBER_WORDS else float(text)
+
+def _direction_name(word):
+    return re.sub(r"wards?$", "", word.lower()).upper()
+
+def _move_direction(match):
+    if match.group("back_and_forth"): return "LEFT_AND_RIGHT"
+    first = _direction_name(match.group("first"))
+    if not match.group("second"): return first
+    second = _direction_name(match.group("second"))
+    if match.group("diagonal") is not None:
+        return f"{first}_{second}" if first in ("UP", "DOWN") and second in ("LEFT", "RIGHT") else None
+    joiner = "THEN" if "then" in match.group("joiner").lower() else "AND"
+    # The spec only has there-and-back moves that start up or left.
+    if (first, second) in (("UP", "DOWN"), ("LEFT", "RIGHT")): return f"{first}_{joiner}_{second}"
+    return None
+
+def _move_step(match):
+    direction = _move_direction(match)
+    if direction is None: return None
+    distance = match.group("number") or match.group("before")
+    return {"type": "Move", "details": {"movement_details": {
+        "direction": direction, "distance": _number(distance) if distance else 1}}}
+
+def _rotate_step(match):
+    fields = match.groupdict()
+    angle = _number(fields["number"]) if fields.get("number") else 90
+    if fields["sense"] and fields["sense"].lower() == "clockwise": angle = -angle
+    return {"type": "Rotate", "details": {"rotation_details": {"angle_degrees": angle}}}
+
+def _scale_step(factor):
+    return lambda match: {"type": "Scale", "details": {"scale_details": {
+        "factor": _number(match.group("number")) if match.groupdict().get("number") else factor}}}
+
+def _color_change_step(match):
+    return {"type": "ChangeColor", "details": {"color_change_details": {
+        "target_color": COLOR_WORDS[match.group("color").lower()]}}}
+
+def _transform_step(match):
+    details = {"target_shape": SHAPE_WORDS[match.group("shape").lower()]}
+    if match.group("color"): details["target_color"] = COLOR_WORDS[match.group("color").lower()]
+    return {"type": "TransformShape", "details": {"transform_details": details}}
+
+def _flash_step(match):
+    step = {"type": "Flash"}
+    if match.group("color"):
+        step["details"] = {"flash_details": {"flash_color": COLOR_WORDS[match.group("color").lower()]}}
+    return step
+
+_MOVE_VERB = r"(?:move[sd]?|moving|slides?|slid|sliding|shift(?:s|ed|ing)?|go(?:es|ing)?|travel(?:s|led|ling)?|bounc(?:es?|ing))"
+_TRANSFORM_VERB = r"(?:transform(?:s|ed|ing)?|morph(?:s|ed|ing)?)"
+_TURN_VERB = r"(?:turn(?:s|ed|ing)?|change(?:s|d)?|changing|become(?:s)?|becoming)"
+
+_WRITE_RE = _regex(rf"(?:write[sd]?|writing|written)(?:\s+(?:the\s+)?(?:text|words?))?\s+{_QUOTED}")
+
+# (pattern, step factory). Applied in order; a match never overlaps text an earlier rule consumed,
+# so the more specific phrasings come first ("grows from the center" before "grows").
+STEP_RULES = [
+    (_regex(r"(?:fade(?:s|d)?|fading)\s+in"), lambda match: {"type": "FadeIn"}),
+    (_regex(r"(?:grow(?:s|n)?|growing)\s+(?:out\s+)?from\s+(?:the\s+)?(?:center|centre|middle)"),
+     lambda match: {"type": "GrowFromCenter"}),
+    (_regex(r"(?:appear(?:s|ed|ing)?|create[sd]?|creating|draw(?:s|n|ing)?)"), lambda match: {"type": "Create"}),
+    (_WRITE_RE, lambda match: {"type": "Write"}),
+    (_regex(rf"(?:(?:{_TRANSFORM_VERB}|{_TURN_VERB})(?:\s+it)?\s+)?into\s+(?:an?\s+)?(?:{_COLOR}\s+)?{_SHAPE}"),
+     _transform_step),
+    (_regex(rf"(?:become(?:s)?|becoming)\s+an?\s+(?:{_COLOR}\s+)?{_SHAPE}"), _transform_step),
+    (_regex(rf"(?:{_TURN_VERB}(?:\s+(?:its\s+)?colou?r)?(?:\s+to)?|recolou?r(?:s|ed)?(?:\s+to)?)\s+{_COLOR}"),
+     _color_change_step),
+    (_regex(rf"{_MOVE_VERB}(?:\s+it)?(?:\s+(?P<before>\d+(?:\.\d+)?)(?:\s+units?)?)?"
+            rf"(?:\s+(?:to\s+the|towards?\s+the|towards?))?\s+(?:(?P<back_and_forth>back\s+and\s+forth)|"
+            rf"(?P<first>{_DIRECTION})(?:(?P<diagonal>[\s-])(?=(?:left|right)\b)|"
+            rf"\s+(?P<joiner>and\s+then|then|and)\s+(?:back\s+)?(?:to\s+the\s+)?)?(?P<second>(?<=[\s-]){_DIRECTION})?)"
+            rf"(?:\s+(?:by\s+)?{_NUMBER}(?:\s+units?)?)?"), _move_step),
+    (_regex(rf"(?:rotat(?:e[sd]?|ing)|spin(?:s|ning)?|spun|{_TURN_VERB})(?:\s+it)?(?:\s+(?:by|through))?"
+            rf"\s+{_SIGNED_NUMBER}\s*(?:degrees?|deg|°)(?:\s+{_ROTATION_SENSE})?"), _rotate_step),
+    (_regex(rf"(?:rotat(?:e[sd]?|ing)|spin(?:s|ning)?|spun)(?:\s+it)?(?:\s+{_ROTATION_SENSE})?"), _rotate_step),
+    (_regex(rf"(?:make[s]?\s+it\s+|becom(?:e|es|ing)\s+|get(?:s|ting)?\s+)?(?:{_NUMBER}\s+times|twice)\s+"
+            r"(?:as\s+(?:big|large)|bigger|larger)"), _scale_step(2)),
+    (_regex(rf"scal(?:e[sd]?|ing)(?:\s+it)?(?:\s+(?:up|down))?\s+by\s+(?:a\s+factor\s+of\s+)?{_NUMBER}"),
+     _scale_step(2)),
+    (_regex(r"(?:make[s]?\s+it\s+|becom(?:e|es|ing)\s+|get(?:s|ting)?\s+)?(?:double[sd]?(?:\s+(?:its|in)\s+size)?|"
+            r"grow(?:s|n|ing)?(?:\s+(?:bigger|larger))?|bigger|larger|enlarge[sd]?|enlarging|scal(?:e[sd]?|ing)\s+up)"),
+     _scale_step(2)),
+    (_regex(r"(?:make[s]?\s+it\s+|becom(?:e|es|ing)\s+|get(?:s|ting)?\s+)?(?:half\s+(?:its\s+|the\s+)?size|halve[sd]?|"
+            r"shrink(?:s|ing)?|shrunk|smaller|scal(?:e[sd]?|ing)\s+down)"), _scale_step(0.5)),
+    (_regex(r"(?:indicat(?:e[sd]?|ing)|highlight(?:s|ed|ing)?|puls(?:e[sd]?|ing))"), lambda match: {"type": "Indicate"}),
+    (_regex(rf"flash(?:es|ed|ing)?(?:\s+{_COLOR})?"), _flash_step),
+]
+# "Transform a blue triangle into a red square": the verb sits before the subject.
+_TRANSFORM_VERB_RE = _regex(_TRANSFORM_VERB)
+_SUBJECT_RE = _regex(rf"(?:(?:an?|the|this|that)\s+)?(?:{_COLOR}\s+)?{_SHAPE}")
+_MENTION_RE = _regex(rf"(?:the|this|that)\s+(?:{_COLOR}\s+)?{_SHAPE}")
+_TARGET_PREFIX_RE = re.compile(r"\b(?:into|becom(?:e|es|ing))\s+(?:an?\s+)?$", re.IGNORECASE)
+_TEXT_RE = re.compile(rf"(?:\b(?:the\s+)?(?:text|words?)\s+)?{_QUOTED}", re.IGNORECASE)
+_TEXT_COLOR_RE = _regex(rf"(?:in|colou?red)\s+{_COLOR}")
+_WORD_RE = re.compile(r"\w+")
+_NEGATION_RE = re.compile(r"\b(?:not|no|never|neither|nor|without|instead|dont|doesnt|didnt|wont|cant|isnt)\b|\w+n[\'’]t\b",
+                          re.IGNORECASE)
+
+def _words(text):
+    return [word for word in _WORD_RE.findall(text.lower()) if word not in FILLER_WORDS]
+
+def _subject(prompt_text, quoted_spans):
+    # The first shape that is not a transform target ("into a square") or quoted text.
+    for match in _SUBJECT_RE.finditer(prompt_text):
+        if any(start <= match.start() < end for start, end in quoted_spans): continue
+        if not _TARGET_PREFIX_RE.search(prompt_text, 0, match.start()): return match
+    return None
+
+def parse_prompt(prompt_text):
+    # Returns (params in the LLM's JSON shape, confidence in [0, 1]); params is None when the
+    # prompt names neither a shape nor quoted text.
+    prompt_text = prompt_text or ""
+    quoted_spans = [match.span() for match in re.finditer(_QUOTED, prompt_text)]
+    params = {}
+    subject_words = 0
+    subject = _subject(prompt_text, quoted_spans)
+    if subject is not None:
+        params["shape"] = SHAPE_WORDS[subject.group("shape").lower()]
+        if subject.group("color"): params["color"] = COLOR_WORDS[subject.group("color").lower()]
+        # The subject and later mentions of it ("then move the circle up") read as "it", so the
+        # rules below only deal with pronouns.
+        mentions = [subject.span()] + [
+            match.span() for match in _MENTION_RE.finditer(prompt_text, subject.end())
+            if SHAPE_WORDS[match.group("shape").lower()] == params["shape"]
+            and (not match.group("color") or COLOR_WORDS[match.group("color").lower()] == params.get("color"))]
+        for start, end in mentions:
+            subject_words += len(_words(prompt_text[start:end]))
+            prompt_text = prompt_text[:start] + "it".ljust(end - start) + prompt_text[end:]
+
+    consumed = []
+
+    def free(match):
+        return all(match.end() <= start or match.start() >= end for start, end in consumed)
+
+    def take(regex, first_only=False):
+        for match in regex.finditer(prompt_text):
+            if not free(match): continue
+            consumed.append(match.span())
+            yield match
+            if first_only: return
+
+    steps = []
+    for regex, make_step in STEP_RULES:
+        for match in take(regex):
+            step = make_step(match)
+            if step is None:
+                consumed.remove(match.span())
+                continue
+            steps.append((match.start(), step))
+    if any(step["type"] == "TransformShape" for _, step in steps): list(take(_TRANSFORM_VERB_RE))
+
+    quoted = (next((match for match in _WRITE_RE.finditer(prompt_text) if match.span() in consumed), None)
+              or next(take(_TEXT_RE, first_only=True), None))
+    if quoted is not None and "shape" not in params:
+        params["text_content"] = quoted.group("quoted")[1:-1]
+    elif quoted is not None:
+        # A shape and a text object: the spec only has one main object.
+        consumed.remove(quoted.span())
+        steps = [(start, step) for start, step in steps if step["type"] != "Write"]
+    if "shape" not in params and "text_content" not in params: return None, 0.0
+    if "color" not in params:
+        for match in take(_TEXT_COLOR_RE, first_only=True): params["color"] = COLOR_WORDS[match.group("color").lower()]
+
+    animations = [step for _, step in sorted(steps, key=lambda item: item[0])]
+    if not animations or animations[0]["type"] not in ("Create", "FadeIn", "GrowFromCenter", "Write"):
+        animations.insert(0, {"type": "Write" if "text_content" in params else "Create"})
+    params.setdefault("color", "WHITE")
+    params["animations"] = animations
+
+    # Confidence: meaningful words inside matched spans over all meaningful words. Quoted text is
+    # taken verbatim and does not count.
+    if _NEGATION_RE.search(re.sub(_QUOTED, " ", prompt_text)): return params, 0.0
+    total = subject_words + len(_words(re.sub(_QUOTED, " ", prompt_text)))
+    recognized = subject_words + sum(len(_words(re.sub(_QUOTED, " ", prompt_text[start:end])))
+                                     for start, end in consumed)
+    return params, (recognized / total if total else 1.0)
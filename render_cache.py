@@ -0,0 +1,346 @@
+# render_cache.py
+
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+HAVE_FLOCK = fcntl is not None
+
+from observability import get_logger
+
+log = get_logger("render_cache")
+
+BACKEND_DIR = os.path.abspath(os.path.dirname(__file__))
+MANIM_SCENES_DIR = os.path.join(BACKEND_DIR, 'manim_scenes')
+MEDIA_VIDEOS_DIR = os.path.join(MANIM_SCENES_DIR, "media", "videos")
+RENDER_CACHE_INDEX_PATH = os.getenv("RENDER_CACHE_INDEX_PATH", os.path.join(MANIM_SCENES_DIR, "media", "render_cache.sqlite3"))
+LEGACY_INDEX_PATH = os.path.join(MANIM_SCENES_DIR, "media", "render_cache.json")
+
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+RENDER_CACHE_MAX_AGE_SECONDS = int(os.getenv("RENDER_CACHE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+RENDER_CACHE_MAX_ENTRIES = int(os.getenv("RENDER_CACHE_MAX_ENTRIES", "1000"))
+
+# Segments shared across renders, one directory per quality (PartialMovieCache).
+PARTIAL_MOVIE_DIR = os.getenv("PARTIAL_MOVIE_DIR", os.path.join(MANIM_SCENES_DIR, "media", "partial_movie_files"))
+PARTIAL_CACHE_MAX_BYTES = int(os.getenv("PARTIAL_CACHE_MAX_BYTES", str(1024 ** 3)))
+PARTIAL_CACHE_GC_INTERVAL_SECONDS = int(os.getenv("PARTIAL_CACHE_GC_INTERVAL_SECONDS", "300"))
+# Manim prunes a render's segment directory by file count; it holds every checked-out segment,
+# so the store's byte budget is the only limit.
+MANIM_MAX_FILES_CACHED = 1000000
+SEGMENT_EXTENSIONS = (".mp4", ".mov", ".webm")
+# Manim's concat list, written next to the segments of a render.
+PARTIAL_MOVIE_LIST = "partial_movie_file_list.txt"
+
+def spec_cache_key(spec, quality):
+    # Canonical JSON (SceneSpec.to_dict, sorted keys, fixed separators) so equal specs hash equally.
+    canonical = json.dumps({"spec": spec, "quality": quality}, sort_keys=True, separators=(",", ":"),
+                           default=lambda value: value.to_dict())
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+@contextlib.contextmanager
+def try_lock(lock_path):
+    # Yields True while this open file holds an exclusive flock on lock_path, False when anyone
+    # else (another process, or another open file in this one) holds a lock on it. Without flock
+    # (non-POSIX) it always yields True and callers rely on their in-process checks alone.
+    if fcntl is None:
+        yield True
+        return
+    try: lock_file = open(lock_path, "a")
+    except OSError:
+        yield False
+        return
+    with lock_file:
+        try: fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError: locked = False
+        else: locked = True
+        yield locked
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for f_name in files:
+            try: total += os.path.getsize(os.path.join(root, f_name))
+            except OSError: pass
+    return total
+
+class RenderCache:
+    # Index of finished renders in SQLite, shared by every process serving manim_scenes/: a hit
+    # updates one row instead of rewriting the index, and workers see (and evict) each other's
+    # entries instead of overwriting them.
+    def __init__(self, index_path=RENDER_CACHE_INDEX_PATH, videos_dir=MEDIA_VIDEOS_DIR,
+                 max_bytes=RENDER_CACHE_MAX_BYTES, max_age_seconds=RENDER_CACHE_MAX_AGE_SECONDS,
+                 max_entries=RENDER_CACHE_MAX_ENTRIES):
+        self.index_path = index_path
+        self.videos_dir = videos_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.deferred = 0
+        self._protectors = []
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS renders (
+                spec_key TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL,
+                created REAL NOT NULL, last_access REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS renders_last_access ON renders (last_access)")
+            self._import_json_index(conn)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=10)
+        try:
+            with conn: yield conn
+        finally:
+            conn.close()
+
+    def _import_json_index(self, conn):
+        # One-off migration from the JSON index earlier versions rewrote on every hit.
+        try:
+            with open(LEGACY_INDEX_PATH, "r", encoding="utf-8") as f: entries = json.load(f)
+        except (IOError, ValueError): return
+        conn.executemany("INSERT OR IGNORE INTO renders VALUES (?, ?, ?, ?, ?, ?)",
+                         [(key, entry["path"], entry["size"], entry["created"], entry["last_access"], entry.get("hits", 0))
+                          for key, entry in entries.items()])
+        try: os.remove(LEGACY_INDEX_PATH)
+        except OSError: pass
+        log.info("Imported %d render cache entries from %s", len(entries), LEGACY_INDEX_PATH)
+
+    def _scene_media_dir(self, video_path):
+        # media/videos/<scene_module>/<quality>/<SceneClass>.mp4 -> media/videos/<scene_module>
+        rel_path = os.path.relpath(video_path, self.videos_dir)
+        if rel_path.startswith(os.pardir): return None
+        return os.path.join(self.videos_dir, rel_path.split(os.sep)[0])
+
+    def add_protector(self, protector):
+        # protector() returns absolute paths still handed out (finished job results, scenes being
+        # rendered), as for Janitor.add_protector. An evicted entry whose media holds one only
+        # leaves the index; its files become ordinary scene media for the janitor to expire.
+        self._protectors.append(protector)
+
+    def _protected_paths(self):
+        protected = set()
+        for protector in list(self._protectors):
+            try: protected.update(os.path.abspath(path) for path in protector() if path)
+            except Exception as e: log.warning("Render cache protector failed; keeping evicted media: %s", e); return None
+        return protected
+
+    def _remove_entry(self, conn, key, path, protected):
+        # protected: _protected_paths(), None when unknown (then no media is removed).
+        conn.execute("DELETE FROM renders WHERE spec_key = ?", (key,))
+        scene_media_dir = self._scene_media_dir(path)
+        if scene_media_dir and os.path.isdir(scene_media_dir):
+            if protected is None or any(p == scene_media_dir or p.startswith(scene_media_dir + os.sep) for p in protected):
+                self.deferred += 1
+            else:
+                try: shutil.rmtree(scene_media_dir)
+                except Exception as e: log.warning("Could not evict cached render %s: %s", scene_media_dir, e)
+        self.evictions += 1
+
+    def _live(self, path, created, now):
+        return os.path.exists(path) and now - created <= self.max_age_seconds
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT path, created FROM renders WHERE spec_key = ?", (key,)).fetchone()
+            if row and self._live(row[0], row[1], now):
+                conn.execute("UPDATE renders SET last_access = ?, hits = hits + 1 WHERE spec_key = ?", (now, key))
+                self.hits += 1
+                return row[0]
+            if row: self._remove_entry(conn, key, row[0], self._protected_paths())
+            self.misses += 1
+            return None
+
+    def contains(self, key):
+        # Like get(), but leaves the hit statistics and recency alone (for cache warm-up).
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT path, created FROM renders WHERE spec_key = ?", (key,)).fetchone()
+        return bool(row and self._live(row[0], row[1], time.time()))
+
+    def put(self, key, video_path):
+        now = time.time()
+        scene_media_dir = self._scene_media_dir(video_path)
+        size = _dir_size(scene_media_dir) if scene_media_dir else os.path.getsize(video_path)
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO renders VALUES (?, ?, ?, ?, ?, 0)", (key, video_path, size, now, now))
+            self._evict_locked(conn)
+
+    def _evict_locked(self, conn):
+        now = time.time()
+        rows = conn.execute("SELECT spec_key, path, size, created FROM renders ORDER BY last_access").fetchall()
+        live, evicted = [], []
+        for key, path, size, created in rows:
+            (live if self._live(path, created, now) else evicted).append((key, path, size))
+        # Least recently used first until both the byte and entry budgets are met.
+        total_bytes = sum(size for _, _, size in live)
+        while live and (total_bytes > self.max_bytes or len(live) > self.max_entries):
+            evicted.append(live.pop(0))
+            total_bytes -= evicted[-1][2]
+        if not evicted: return
+        protected = self._protected_paths()
+        for key, path, _ in evicted: self._remove_entry(conn, key, path, protected)
+
+    def scene_dirs(self):
+        # Media directories backing live entries; other cleanup must leave them alone.
+        with self._lock, self._connect() as conn:
+            paths = [row[0] for row in conn.execute("SELECT path FROM renders")]
+        return [d for d in (self._scene_media_dir(path) for path in paths) if d]
+
+    def evict(self):
+        with self._lock, self._connect() as conn: self._evict_locked(conn)
+
+    def stats(self):
+        with self._lock, self._connect() as conn:
+            entries, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM renders").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": total_bytes,
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries,
+                "max_age_seconds": self.max_age_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "deferred": self.deferred,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+def _is_segment(name):
+    # Manim names reusable segments by the hash of their play call; "uncached_*" ones are not reusable.
+    return name.endswith(SEGMENT_EXTENSIONS) and not name.startswith("uncached_")
+
+class PartialMovieCache:
+    # Bounded store of Manim partial movie files, so any render whose animations match an
+    # already-encoded one reuses it. Every render gets its own partial_movie_dir (its concat list
+    # and new segments never meet another render's): check_out hardlinks the store's segments
+    # into it, check_in links the segments it encoded back. A render holds its own links, so
+    # collection can unlink store entries at any time, from any process, without breaking it.
+    def __init__(self, root=PARTIAL_MOVIE_DIR, max_bytes=PARTIAL_CACHE_MAX_BYTES,
+                 gc_interval_seconds=PARTIAL_CACHE_GC_INTERVAL_SECONDS):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.gc_interval_seconds = gc_interval_seconds
+        self.last_gc = 0.0
+        self.gc_runs = 0
+        self.files_removed = 0
+        self.bytes_reclaimed = 0
+        self.reused = 0
+        self.stored = 0
+        self._lock = threading.Lock()
+
+    def manim_config(self):
+        return {"max_files_cached": MANIM_MAX_FILES_CACHED}
+
+    def check_out(self, quality, partial_dir):
+        # Links the store's segments for `quality` into a render's empty partial_movie_dir.
+        os.makedirs(partial_dir, exist_ok=True)
+        store_dir = os.path.join(self.root, quality)
+        try: names = os.listdir(store_dir)
+        except OSError: return
+        for name in names:
+            if not _is_segment(name): continue
+            # A segment collected in the meantime is simply encoded again.
+            try: os.link(os.path.join(store_dir, name), os.path.join(partial_dir, name))
+            except OSError: pass
+
+    def _used_segments(self, partial_dir):
+        try:
+            with open(os.path.join(partial_dir, PARTIAL_MOVIE_LIST), "r", encoding="utf-8") as f:
+                return {os.path.basename(line.strip().rstrip("'")) for line in f if line.startswith("file ")}
+        except IOError:
+            return set()
+
+    def check_in(self, quality, partial_dir):
+        # Adds the segments a finished render encoded to the store and marks reused ones as recent.
+        store_dir = os.path.join(self.root, quality)
+        os.makedirs(store_dir, exist_ok=True)
+        used = self._used_segments(partial_dir)
+        stored = reused = 0
+        try: names = os.listdir(partial_dir)
+        except OSError: names = []
+        for name in names:
+            if not _is_segment(name): continue
+            path = os.path.join(partial_dir, name)
+            try:
+                if os.stat(path).st_nlink == 1:
+                    # Encoded by this render (or collected since check-out): share it.
+                    os.link(path, os.path.join(store_dir, name))
+                    stored += 1
+                elif name in used:
+                    os.utime(path)
+                    reused += 1
+            except FileExistsError:
+                pass  # a concurrent render encoded the same segment; either copy will do
+            except OSError as e:
+                log.warning("Could not store partial movie %s: %s", path, e)
+        with self._lock:
+            self.stored += stored
+            self.reused += reused
+            due = time.time() - self.last_gc >= self.gc_interval_seconds
+        if due: self.collect()
+
+    def _segments(self):
+        segments = []
+        for root, _, files in os.walk(self.root):
+            for f_name in files:
+                if not _is_segment(f_name): continue
+                path = os.path.join(root, f_name)
+                try: st = os.stat(path)
+                except OSError: continue
+                segments.append((max(st.st_atime, st.st_mtime), st.st_size, path))
+        return segments
+
+    def collect(self):
+        # Drops least recently used segments until the store is back under its byte budget.
+        # Returns the bytes reclaimed; 0 when under budget or another process is collecting.
+        reclaimed = removed = 0
+        os.makedirs(self.root, exist_ok=True)
+        # One collector at a time across processes; the others skip their pass.
+        with try_lock(os.path.join(self.root, ".gc.lock")) as owner:
+            if not owner: return 0
+            segments = self._segments()
+            total_bytes = sum(size for _, size, _ in segments)
+            for _, size, path in sorted(segments):
+                if total_bytes - reclaimed <= self.max_bytes: break
+                try: os.remove(path)
+                except OSError as e: log.warning("Could not remove partial movie %s: %s", path, e); continue
+                reclaimed += size
+                removed += 1
+        with self._lock:
+            self.last_gc = time.time()
+            self.gc_runs += 1
+            self.files_removed += removed
+            self.bytes_reclaimed += reclaimed
+        if removed: log.info("Partial movie cache: removed %d segments, reclaimed %d bytes", removed, reclaimed)
+        return reclaimed
+
+    def stats(self):
+        segments = self._segments()
+        with self._lock:
+            return {
+                "segments": len(segments),
+                "bytes": sum(size for _, size, _ in segments),
+                "max_bytes": self.max_bytes,
+                "stored": self.stored,
+                "reused": self.reused,
+                "gc_runs": self.gc_runs,
+                "files_removed": self.files_removed,
+                "bytes_reclaimed": self.bytes_reclaimed,
+            }
+
+render_cache = RenderCache()
+partial_movie_cache = PartialMovieCache()
@@ -3,27 +3,50 @@
 import subprocess
 import os
 import sys
-import shutil
+import shlex
+import threading
 import time
+import uuid
 import json
 import requests
 import math
+import re
+
+from render_cache import render_cache, spec_cache_key
+from spec_log import spec_log
+from janitor import janitor
+from admission import SlotRequest, render_slots, sjf_priority
+import sandbox
+from render_workspace import RenderWorkspace
+from llm_cache import LLMCache, prompt_version, normalize_prompt
+from prompt_parser import parse_prompt
+from singleflight import SingleFlight
+from scene_spec import SceneSpec, THERE_AND_BACK_DIRECTIONS
+from cost_model import CostModel, spec_features, composition_features
+from observability import get_logger, span, Counter
+from groq_client import GroqClient, AsyncGroqClient, CircuitOpenError
+from manim_workers import render_pool, WorkerUnavailable
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
 GROQ_MODEL = "llama3-8b-8192"
 
+log = get_logger("render")
+
+CACHE_LOOKUPS = Counter("prompt2motion_cache_lookups_total", "Cache lookups by cache and result.", ["cache", "result"])
+PROMPT_PARSES = Counter("prompt2motion_prompt_parses_total", "Rule-based prompt parses by outcome.", ["outcome"])
+RENDERS = Counter("prompt2motion_renders_total", "Manim renders by backend and outcome.", ["backend", "outcome"])
+
 BACKEND_DIR = os.path.abspath(os.path.dirname(__file__))
 MANIM_SCENES_DIR = os.path.join(BACKEND_DIR, 'manim_scenes')
 
-def get_animation_params_from_llm(user_prompt):
-    if GROQ_API_KEY == "YOUR_GROQ_API_KEY" or not GROQ_API_KEY:
-        print("ERROR: GROQ_API_KEY is not set. Using fallback.")
-        return {"shape": "Circle", "color": "ORANGE", "animation_type": "Create", "error": "API Key not set. Using fallback."}
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+RENDER_CACHE_ENABLED = os.getenv("RENDER_CACHE_ENABLED", "1") == "1"
+# Prompts the rule-based parser understands at least this well skip the LLM entirely.
+PROMPT_PARSER_ENABLED = os.getenv("PROMPT_PARSER_ENABLED", "1") == "1"
+PROMPT_PARSER_MIN_CONFIDENCE = float(os.getenv("PROMPT_PARSER_MIN_CONFIDENCE", "1.0"))
 
-    headers = {"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"}
-    
-    system_prompt_content = """
+LLM_SYSTEM_PROMPT = """
 You are an expert Manim animation assistant. Your task is to interpret a user's animation request
 and extract parameters for a 2D animation. Your response MUST be a VALID JSON object.
 
@@ -74,220 +97,233 @@ and extract parameters for a 2D animation. Your response MUST be a VALID JSON ob
 
 If unclear or too complex, return {"error": "Prompt is too complex or ambiguous."}
 """
-    payload = {
+
+llm_cache = LLMCache(prompt_version(LLM_SYSTEM_PROMPT, GROQ_MODEL))
+groq_client = GroqClient(GROQ_API_URL, GROQ_API_KEY)
+async_groq_client = AsyncGroqClient(GROQ_API_URL, GROQ_API_KEY, sync_client=groq_client)
+llm_flight = SingleFlight("llm")
+render_flight = SingleFlight("render")
+
+def _no_progress(phase, **fields):
+    pass
+
+def get_animation_params_from_llm(user_prompt, info=None, progress=_no_progress, rate_limiter=None):
+    if PROMPT_PARSER_ENABLED:
+        with span("prompt_parse", log):
+            parsed_params, confidence = parse_prompt(user_prompt)
+        if parsed_params is not None and confidence >= PROMPT_PARSER_MIN_CONFIDENCE:
+            PROMPT_PARSES.inc(outcome="parsed")
+            log.info("Parsed prompt without the LLM (confidence %.2f): %r", confidence, user_prompt)
+            if info is not None: info.update(parser="rules", llm_cache="bypass")
+            progress("prompt_parsed", confidence=confidence)
+            return parsed_params
+        PROMPT_PARSES.inc(outcome="fallthrough")
+        log.debug("Rule-based parse too uncertain (confidence %.2f); asking the LLM.", confidence)
+    if info is not None: info["parser"] = "llm"
+
+    cached_params = llm_cache.get(user_prompt) if LLM_CACHE_ENABLED else None
+    if info is not None: info["llm_cache"] = "hit" if cached_params is not None else "miss"
+    if LLM_CACHE_ENABLED: CACHE_LOOKUPS.inc(cache="llm", result="hit" if cached_params is not None else "miss")
+    if cached_params is not None:
+        log.info("LLM cache hit for prompt: %r", user_prompt)
+        progress("llm_cached")
+        return cached_params
+
+    def request_and_cache(flight_progress):
+        if rate_limiter: rate_limiter.acquire()
+        flight_progress("llm_request_sent")
+        with span("llm", log):
+            llm_params = request_animation_params_from_llm(user_prompt)
+        flight_progress("llm_response_received", error=(llm_params or {}).get("error"))
+        if LLM_CACHE_ENABLED and llm_params and not llm_params.get("error"): llm_cache.put(user_prompt, llm_params)
+        return llm_params
+
+    # Concurrent identical prompts share one Groq call.
+    llm_params, flight = llm_flight.do(normalize_prompt(user_prompt), request_and_cache, progress)
+    if info is not None: info["llm_coalesced"] = flight["shared"]
+    return llm_params
+
+def _llm_fallback_params(error_message):
+    return {"shape": "Circle", "color": "ORANGE", "animation_type": "Create", "error": error_message}
+
+def _llm_payload(user_prompt):
+    return {
         "model": GROQ_MODEL,
-        "messages": [{"role": "system", "content": system_prompt_content}, {"role": "user", "content": user_prompt}],
+        "messages": [{"role": "system", "content": LLM_SYSTEM_PROMPT}, {"role": "user", "content": user_prompt}],
         "temperature": 0.1, "max_tokens": 1200, "response_format": {"type": "json_object"}
     }
-    print(f"Sending prompt to Groq LLM: '{user_prompt}'")
-    try:
-        response = requests.post(GROQ_API_URL, headers=headers, json=payload, timeout=30)
-        response.raise_for_status()
-        llm_response_json = response.json()
-        if llm_response_json.get("choices") and llm_response_json["choices"][0].get("message"):
-            content_str = llm_response_json["choices"][0]["message"].get("content")
-            if content_str:
-                try:
-                    parsed_params = json.loads(content_str)
-                    print(f"LLM JSON Response (parsed): {json.dumps(parsed_params, indent=2)}")
-                    return parsed_params
-                except json.JSONDecodeError as e:
-                    print(f"Error: LLM response not valid JSON: {content_str}\nError: {e}")
-                    return {"error": f"LLM response not valid JSON. Details: {e}"}
-            else:
-                print("Error: LLM response content is empty.")
-                return {"error": "LLM response content is empty."}
+
+def _parse_llm_response(llm_response_json):
+    if llm_response_json.get("choices") and llm_response_json["choices"][0].get("message"):
+        content_str = llm_response_json["choices"][0]["message"].get("content")
+        if content_str:
+            try:
+                parsed_params = json.loads(content_str)
+                log.debug("LLM JSON Response (parsed): %s", json.dumps(parsed_params))
+                return parsed_params
+            except json.JSONDecodeError as e:
+                log.error("LLM response not valid JSON: %s (%s)", content_str, e)
+                return {"error": f"LLM response not valid JSON. Details: {e}"}
         else:
-            error_detail = llm_response_json.get("error", {}).get("message", "Unknown LLM error.")
-            print(f"Error: Unexpected LLM response. Detail: {error_detail}. Full: {llm_response_json}")
-            return {"error": f"Unexpected LLM response: {error_detail}"}
-    except requests.exceptions.Timeout:
-        print("Error: Groq API request timed out.")
+            log.error("LLM response content is empty.")
+            return {"error": "LLM response content is empty."}
+    else:
+        error_detail = llm_response_json.get("error", {}).get("message", "Unknown LLM error.")
+        log.error("Unexpected LLM response. Detail: %s. Full: %s", error_detail, llm_response_json)
+        return {"error": f"Unexpected LLM response: {error_detail}"}
+
+def _llm_error_params(e):
+    if isinstance(e, CircuitOpenError):
+        log.warning("Groq circuit is open. Using fallback.")
+        return _llm_fallback_params("LLM temporarily unavailable. Using fallback.")
+    if isinstance(e, requests.exceptions.Timeout):
+        log.error("Groq API request timed out.")
         return {"error": "API request timed out."}
-    except requests.exceptions.RequestException as e:
-        print(f"Error calling Groq API: {e}")
+    if isinstance(e, requests.exceptions.RequestException):
+        log.error("Error calling Groq API: %s", e)
         return {"error": f"API request failed: {e}"}
-    except Exception as e:
-        print(f"An unexpected error occurred during LLM call: {e}")
-        import traceback
-        traceback.print_exc()
-        return {"error": f"Unexpected error during LLM call: {e}"}
-
-def generate_manim_script_from_prompt(prompt_text):
-    print(f"Processing prompt with LLM for advanced actions: '{prompt_text}'")
-    llm_data = get_animation_params_from_llm(prompt_text)
-
-    llm_error_message = None
-    if not llm_data or llm_data.get("error"):
-        print(f"Failed to get valid parameters from LLM. Error: {llm_data.get('error', 'Unknown LLM error')}")
-        initial_shape_type = "Circle"
-        initial_color_name = "GRAY"
-        initial_text_content = None
-        animation_steps_data = [{"type": "Create"}]
-        llm_error_message = llm_data.get('error', 'LLM processing failed')
-    else:
-        initial_shape_type = llm_data.get("shape", "Circle")
-        initial_color_name = llm_data.get("color", "WHITE").upper()
-        initial_text_content = llm_data.get("text_content")
-        animation_steps_data = llm_data.get("animations", [{"type": "Create"}])
+    log.error("An unexpected error occurred during LLM call: %s", e, exc_info=e)
+    return {"error": f"Unexpected error during LLM call: {e}"}
 
-    timestamp_ms = int(time.time() * 1000)
-    scene_class_name = f"AdvancedScene_{timestamp_ms}"
+def request_animation_params_from_llm(user_prompt):
+    if GROQ_API_KEY == "YOUR_GROQ_API_KEY" or not GROQ_API_KEY:
+        log.error("GROQ_API_KEY is not set. Using fallback.")
+        return _llm_fallback_params("API Key not set. Using fallback.")
 
-    valid_color_names = [
-    "RED", "GREEN", "BLUE", "YELLOW", "ORANGE", "PURPLE", "PINK",
-    "WHITE", "BLACK", "GRAY", "LIGHT_GRAY", "DARK_GRAY",
-    "VIOLET", 
-]
+    log.info("Sending prompt to Groq LLM: %r", user_prompt)
+    try:
+        return _parse_llm_response(groq_client.chat(_llm_payload(user_prompt)))
+    except Exception as e:
+        return _llm_error_params(e)
 
-    if initial_color_name not in valid_color_names: initial_color_name = "WHITE"
+async def request_animation_params_from_llm_async(user_prompt):
+    # Same contract as request_animation_params_from_llm, for callers running an event loop.
+    if GROQ_API_KEY == "YOUR_GROQ_API_KEY" or not GROQ_API_KEY:
+        log.error("GROQ_API_KEY is not set. Using fallback.")
+        return _llm_fallback_params("API Key not set. Using fallback.")
 
-    initial_shape_class_name = initial_shape_type.capitalize()
-    valid_shape_class_names = ["Circle", "Square", "Triangle", "Rectangle", "Line", "Dot", "Star", "Polygon"]
-    if initial_shape_class_name not in valid_shape_class_names: initial_shape_class_name = "Circle"
+    log.info("Sending prompt to Groq LLM: %r", user_prompt)
+    try:
+        return _parse_llm_response(await async_groq_client.chat(_llm_payload(user_prompt)))
+    except Exception as e:
+        return _llm_error_params(e)
+
+# Output tiers: CLI flag, Manim's output directory name, its config quality name, and how much
+# longer than a preview render the tier is allowed to take.
+QUALITY_TIERS = {
+    "preview": {"flag": "-ql", "dir": "480p15", "name": "low_quality", "timeout_factor": 1},
+    "720p30": {"flag": "-qm", "dir": "720p30", "name": "medium_quality", "timeout_factor": 3},
+    "1080p60": {"flag": "-qh", "dir": "1080p60", "name": "high_quality", "timeout_factor": 8},
+    "4k": {"flag": "-qk", "dir": "2160p60", "name": "fourk_quality", "timeout_factor": 30},
+}
+PREVIEW_TIER = "preview"
+MANIM_RENDER_TIMEOUT_SECONDS = 90
+# Debug mode: emit advancedscene_<ts>.py files and render them instead of building scenes from the spec.
+MANIM_WRITE_SCENE_FILES = os.getenv("MANIM_WRITE_SCENE_FILES", "0") == "1"
+# Explicit Manim invocation, e.g. "manim" or "/opt/venv/bin/python -m manim"; probed when unset.
+MANIM_COMMAND = os.getenv("MANIM_COMMAND")
+MANIM_STARTUP_SELF_TEST = os.getenv("MANIM_STARTUP_SELF_TEST", "0") == "1"
+# Predicted render seconds a render may cost. Above it the render drops to the best tier that
+# fits (COST_POLICY "downgrade") or is refused ("reject"); 0 leaves only the render timeouts.
+RENDER_BUDGET_SECONDS = float(os.getenv("RENDER_BUDGET_SECONDS", "300"))
+COST_POLICY = os.getenv("COST_POLICY", "downgrade")
+
+COST_POLICY_ACTIONS = Counter("prompt2motion_cost_policy_total", "Renders downgraded or refused for their predicted cost.", ["action"])
+cost_model = CostModel({tier: config["timeout_factor"] for tier, config in QUALITY_TIERS.items()})
+
+_manim_command_status = None
+_manim_command_lock = threading.Lock()
+self_test_status = {"ok": None, "video_path": None, "seconds": None, "ran_at": None}
+
+def build_scene_spec(llm_data):
+    # Validated, defaults-filled form of the LLM parameters; equal specs render identical scenes.
+    if not llm_data or llm_data.get("error"):
+        log.warning("Failed to get valid parameters from LLM. Error: %s", (llm_data or {}).get('error', 'Unknown LLM error'))
+        return SceneSpec.fallback((llm_data or {}).get('error', 'LLM processing failed'))
+    return SceneSpec.from_llm(llm_data)
 
-    if initial_text_content:
-        escaped_text = json.dumps(initial_text_content) 
-        initial_object_code = f"Text({escaped_text}, color={initial_color_name})"
+def generate_manim_script_from_prompt(prompt_text):
+    log.info("Processing prompt with LLM for advanced actions: %r", prompt_text)
+    spec = build_scene_spec(get_animation_params_from_llm(prompt_text))
+    scene_class_name = scene_class_name_for(spec_cache_key(spec, QUALITY_TIERS[PREVIEW_TIER]["dir"]))
+    return generate_manim_script_from_spec(spec, scene_class_name), scene_class_name
+
+def _group_animation_code(step, obj_var):
+    if step.type == "Rotate":
+        return f"Rotate({obj_var}, angle=math.radians({step.angle_degrees:.2f}))"
+    if step.type == "Scale":
+        return f"{obj_var}.animate.scale({step.factor:.2f})"
+    if step.type == "ChangeColor":
+        return f"{obj_var}.animate.set_color({step.target_color})"
+    return None
+
+def generate_manim_script_from_spec(spec, scene_class_name):
+    if spec.text_content:
+        escaped_text = json.dumps(spec.text_content)
+        initial_object_code = f"Text({escaped_text}, color={spec.color})"
         main_object_var_name = "main_text_obj"
     else:
-        if initial_shape_class_name == "Polygon":
-             initial_object_code = f"Polygon(*[[0,1,0], [-1,-0.5,0], [1,-0.5,0]], color={initial_color_name})"
-        elif initial_shape_class_name == "Star":
-             initial_object_code = f"Star(n=5, outer_radius=1, inner_radius=0.5, color={initial_color_name})"
+        if spec.shape == "Polygon":
+             initial_object_code = f"Polygon(*[[0,1,0], [-1,-0.5,0], [1,-0.5,0]], color={spec.color})"
+        elif spec.shape == "Star":
+             initial_object_code = f"Star(n=5, outer_radius=1, inner_radius=0.5, color={spec.color})"
         else:
-             initial_object_code = f"{initial_shape_class_name}(color={initial_color_name})"
+             initial_object_code = f"{spec.shape}(color={spec.color})"
         main_object_var_name = "main_shape_obj"
 
-    if llm_error_message is None:
-        llm_error_msg_for_script = "None"
-    else:
-        llm_error_msg_for_script = json.dumps(str(llm_error_message)) 
+    llm_error_msg_for_script = "None" if spec.llm_error is None else json.dumps(spec.llm_error)
 
     animation_plays_code_list = []
     initial_creation_done = False
-    
-    if not animation_steps_data: # Ensure there's at least a create if LLM returns empty animations
-        animation_steps_data = [{"type": "Create"}]
+    first_anim_type = spec.animations[0].type
 
-    first_anim_type = animation_steps_data[0].get("type")
-    
-    if initial_text_content and first_anim_type != "Write":
+    if spec.text_content and first_anim_type != "Write":
         # If main object is text, and first anim isn't Write, assume we need to Write it first.
         animation_plays_code_list.append(f"self.play(Write({main_object_var_name}))")
         initial_creation_done = True
-    elif not initial_text_content and first_anim_type not in ["Create", "FadeIn", "GrowFromCenter"]:
+    elif not spec.text_content and first_anim_type not in ["Create", "FadeIn", "GrowFromCenter"]:
         animation_plays_code_list.append(f"self.play(Create({main_object_var_name}))")
         initial_creation_done = True
 
-    for anim_step in animation_steps_data:
-        anim_type = anim_step.get("type")
-        details = anim_step.get("details", {}) # Ensure details is always a dict
+    for step in spec.animations:
         current_anim_code = ""
 
-        if anim_type == "Create" and not initial_creation_done:
-            current_anim_code = f"self.play(Create({main_object_var_name}))"
-            initial_creation_done = True
-        elif anim_type == "FadeIn" and not initial_creation_done:
-            current_anim_code = f"self.play(FadeIn({main_object_var_name}))"
-            initial_creation_done = True
-        elif anim_type == "GrowFromCenter" and not initial_creation_done:
-            current_anim_code = f"self.play(GrowFromCenter({main_object_var_name}))"
-            initial_creation_done = True
-        elif anim_type == "Write" and initial_text_content and not initial_creation_done:
-            current_anim_code = f"self.play(Write({main_object_var_name}))"
-            initial_creation_done = True
-        
-        elif anim_type == "Move":
-            move_details = details.get("movement_details", {})
-            direction = move_details.get("direction", "RIGHT").upper()
-            distance = float(move_details.get("distance", 1))
-            
-            if direction in ["UP_THEN_DOWN", "UP_AND_DOWN"]:
-                current_anim_code = (f"self.play({main_object_var_name}.animate.shift(UP*{distance}))\n"
-                                     f"        self.wait(0.3)\n"
-                                     f"        self.play({main_object_var_name}.animate.shift(DOWN*{distance}*2))\n"
-                                     f"        self.wait(0.3)\n"
-                                     f"        self.play({main_object_var_name}.animate.shift(UP*{distance}))")
-            elif direction in ["LEFT_THEN_RIGHT", "LEFT_AND_RIGHT"]:
-                current_anim_code = (f"self.play({main_object_var_name}.animate.shift(LEFT*{distance}))\n"
+        if step.type in ["Create", "FadeIn", "GrowFromCenter"] or (step.type == "Write" and spec.text_content):
+            if not initial_creation_done:
+                current_anim_code = f"self.play({step.type}({main_object_var_name}))"
+                initial_creation_done = True
+
+        elif step.type == "Move":
+            if step.direction in THERE_AND_BACK_DIRECTIONS:
+                there, back = ("UP", "DOWN") if step.direction.startswith("UP") else ("LEFT", "RIGHT")
+                current_anim_code = (f"self.play({main_object_var_name}.animate.shift({there}*{step.distance}))\n"
                                      f"        self.wait(0.3)\n"
-                                     f"        self.play({main_object_var_name}.animate.shift(RIGHT*{distance}*2))\n"
+                                     f"        self.play({main_object_var_name}.animate.shift({back}*{step.distance}*2))\n"
                                      f"        self.wait(0.3)\n"
-                                     f"        self.play({main_object_var_name}.animate.shift(LEFT*{distance}))")
-            elif direction in ["UP", "DOWN", "LEFT", "RIGHT", "UP_LEFT", "UP_RIGHT", "DOWN_LEFT", "DOWN_RIGHT"]:
-                 current_anim_code = f"self.play({main_object_var_name}.animate.shift({direction}*{distance}))"
+                                     f"        self.play({main_object_var_name}.animate.shift({there}*{step.distance}))")
             else:
-                print(f"Warning: Unknown movement direction '{direction}'. Skipping move.")
-
-
-        elif anim_type == "Rotate":
-            rot_details = details.get("rotation_details", {})
-            angle_deg = float(rot_details.get("angle_degrees", 90))
-            current_anim_code = f"self.play(Rotate({main_object_var_name}, angle=math.radians({angle_deg:.2f})))"
-
-        elif anim_type == "Scale":
-            scale_details = details.get("scale_details", {})
-            factor = float(scale_details.get("factor", 2))
-            current_anim_code = f"self.play({main_object_var_name}.animate.scale({factor:.2f}))"
-
-        elif anim_type == "ChangeColor":
-            cc_details = details.get("color_change_details", {})
-            target_color_name = cc_details.get("target_color", "WHITE").upper()
-            if target_color_name not in valid_color_names: target_color_name = "WHITE"
-            current_anim_code = f"self.play({main_object_var_name}.animate.set_color({target_color_name}))"
-
-        elif anim_type == "TransformShape":
-            ts_details = details.get("transform_details", {})
-            target_shape_class = ts_details.get("target_shape", "Square").capitalize()
-            if target_shape_class not in valid_shape_class_names: target_shape_class = "Square"
-            
-            target_color_name_from_details = ts_details.get("target_color")
-            if target_color_name_from_details:
-                target_color_name = target_color_name_from_details.upper()
-                if target_color_name not in valid_color_names: target_color_name = initial_color_name
-            else: # If target_color not in details, use the object's current color (conceptually) or initial
-                target_color_name = initial_color_name # Simplified: use initial color of main object
-
-            if target_shape_class == "Polygon":
-                 target_mobject_code = f"Polygon(*[[0,1,0], [-0.5,-1,0], [0.5,-1,0]], color={target_color_name})"
-            elif target_shape_class == "Star":
-                 target_mobject_code = f"Star(color={target_color_name})"
+                current_anim_code = f"self.play({main_object_var_name}.animate.shift({step.direction}*{step.distance}))"
+
+        elif step.type in ["Rotate", "Scale", "ChangeColor"]:
+            current_anim_code = f"self.play({_group_animation_code(step, main_object_var_name)})"
+
+        elif step.type == "TransformShape":
+            if step.target_shape == "Polygon":
+                 target_mobject_code = f"Polygon(*[[0,1,0], [-0.5,-1,0], [0.5,-1,0]], color={step.target_color})"
+            elif step.target_shape == "Star":
+                 target_mobject_code = f"Star(color={step.target_color})"
             else:
-                 target_mobject_code = f"{target_shape_class}(color={target_color_name})"
-            
+                 target_mobject_code = f"{step.target_shape}(color={step.target_color})"
             animation_plays_code_list.append(f"target_obj = {target_mobject_code}")
             current_anim_code = f"self.play(Transform({main_object_var_name}, target_obj))"
-            
-        elif anim_type == "Indicate":
+
+        elif step.type == "Indicate":
             current_anim_code = f"self.play(Indicate({main_object_var_name}))"
-        elif anim_type == "Flash":
-            flash_details = details.get("flash_details", {})
-            flash_color = flash_details.get("flash_color", "YELLOW").upper()
-            if flash_color not in valid_color_names: flash_color = "YELLOW"
-            current_anim_code = f"self.play(Flash({main_object_var_name}, color={flash_color}))"
-        
-        elif anim_type == "AnimationGroup":
-            grouped_anims_data = details.get("grouped_animations", [])
-            manim_group_anims_list = []
-            for group_anim_step in grouped_anims_data:
-                group_anim_type = group_anim_step.get("type")
-                group_details_data = group_anim_step.get("details", {}) # Ensure this is used
-                
-                if group_anim_type == "Rotate":
-                    rot_details = group_details_data.get("rotation_details", {})
-                    angle_deg = float(rot_details.get("angle_degrees", 90))
-                    manim_group_anims_list.append(f"Rotate({main_object_var_name}, angle=math.radians({angle_deg:.2f}))")
-                elif group_anim_type == "Scale":
-                    scale_details = group_details_data.get("scale_details", {})
-                    factor = float(scale_details.get("factor", 2))
-                    manim_group_anims_list.append(f"{main_object_var_name}.animate.scale({factor:.2f})")
-                elif group_anim_type == "ChangeColor":
-                    cc_details = group_details_data.get("color_change_details", {})
-                    target_color_name = cc_details.get("target_color", "WHITE").upper()
-                    if target_color_name not in valid_color_names: target_color_name = "WHITE"
-                    manim_group_anims_list.append(f"{main_object_var_name}.animate.set_color({target_color_name})")
-                # Add more anim types that can be grouped and use their respective 'details' sub-keys
+        elif step.type == "Flash":
+            current_anim_code = f"self.play(Flash({main_object_var_name}, color={step.flash_color}))"
+
+        elif step.type == "AnimationGroup":
+            manim_group_anims_list = [_group_animation_code(group_step, main_object_var_name) for group_step in step.animations]
             if manim_group_anims_list:
                 current_anim_code = f"self.play(AnimationGroup({', '.join(manim_group_anims_list)}, lag_ratio=0))" # lag_ratio=0 for true simultaneous
 
@@ -328,71 +364,480 @@ class {scene_class_name}(Scene):
         
         self.wait(1)
 """
-    print(f"Generated Manim script for scene: {scene_class_name}")
-    return script_content, scene_class_name
-
-def clear_scene_specific_cache_and_output(scene_file_name_without_ext, base_dir=MANIM_SCENES_DIR):
-    scene_media_output_dir = os.path.join(base_dir, "media", "videos", scene_file_name_without_ext)
-    if os.path.exists(scene_media_output_dir):
-        try: shutil.rmtree(scene_media_output_dir)
-        except Exception as e: print(f"Warning: Could not clear dir {scene_media_output_dir}: {e}")
-
-def render_scene(prompt_text="a default white circle"):
-    script_content, scene_class_name = generate_manim_script_from_prompt(prompt_text)
-    if not script_content or not scene_class_name: return None
-    dynamic_scene_file_basename = f"{scene_class_name.lower()}.py"
-    dynamic_scene_file_path = os.path.join(MANIM_SCENES_DIR, dynamic_scene_file_basename)
+    log.debug("Generated Manim script for scene: %s", scene_class_name)
+    return script_content
+
+def render_scene(prompt_text="a default white circle", tier=PREVIEW_TIER):
+    return render_scene_detailed(prompt_text, tier=tier)["video_path"]
+
+def render_scene_detailed(prompt_text="a default white circle", progress=_no_progress, tier=PREVIEW_TIER):
+    log.info("Processing prompt with LLM for advanced actions: %r", prompt_text)
+    result = {"video_path": None, "parser": "llm", "llm_cache": "miss", "llm_coalesced": False,
+              "render_cache": "bypass", "render_coalesced": False, "coalesced_waiters": 0}
+    llm_data = get_animation_params_from_llm(prompt_text, info=result, progress=progress)
+    with span("spec", log):
+        spec = build_scene_spec(llm_data)
+    progress("spec_validated", llm_error=spec.llm_error)
+    spec_log.record(spec)
+    return render_scene_from_spec(spec, progress, result, tier=tier)
+
+def scene_class_name_for(spec_key):
+    # Named after the spec hash, so a spec always renders into the same media directory.
+    return f"AdvancedScene_{spec_key[:16]}"
+
+def render_timeout(tier, parts=1):
+    return MANIM_RENDER_TIMEOUT_SECONDS * QUALITY_TIERS[tier]["timeout_factor"] * parts
+
+def render_budget(tier, parts=1):
+    # A render predicted to outlast its timeout would only be killed, whatever the budget says.
+    timeout = render_timeout(tier, parts)
+    return min(RENDER_BUDGET_SECONDS, timeout) if RENDER_BUDGET_SECONDS > 0 else timeout
+
+def affordable_tier(features, tier, parts=1):
+    # The requested tier if its predicted cost fits the budget, else (when downgrading) the best
+    # cheaper tier that does; None when nothing fits. QUALITY_TIERS is ordered cheapest first.
+    tiers = list(QUALITY_TIERS)
+    candidates = tiers[:tiers.index(tier) + 1] if COST_POLICY == "downgrade" else [tier]
+    for candidate in reversed(candidates):
+        if cost_model.predict(features, candidate) <= render_budget(candidate, parts): return candidate
+    return None
+
+def _plan_render(features, tier, result, progress, parts=1):
+    # Tier a cache miss renders at, or None (with result["over_budget"] set) when it is refused.
+    chosen = affordable_tier(features, tier, parts)
+    if chosen is None:
+        estimated, budget = cost_model.predict(features, tier), render_budget(tier, parts)
+        COST_POLICY_ACTIONS.inc(action="rejected")
+        log.warning("Refusing a render predicted at %.0fs (budget %.0fs at %s)", estimated, budget, tier)
+        result.update(over_budget=True, estimated_seconds=round(estimated, 1),
+                      over_budget_message=f"This animation is too long to render (about {estimated:.0f}s "
+                                          f"predicted, the limit is {budget:.0f}s). Try fewer steps.")
+        progress("over_budget", estimated_seconds=round(estimated, 1), budget_seconds=budget)
+        return None
+    if chosen != tier:
+        COST_POLICY_ACTIONS.inc(action="downgraded")
+        log.info("Downgrading a render from %s to %s to fit the budget", tier, chosen)
+        result.update(quality=chosen, quality_downgraded_from=tier)
+        progress("quality_downgraded", quality=chosen, requested=tier)
+    result["estimated_seconds"] = round(cost_model.predict(features, chosen), 1)
+    return chosen
+
+TYPICAL_SPEC = SceneSpec.from_dict({"shape": "Circle", "color": "WHITE", "animations": [
+    {"type": "Create"},
+    {"type": "Move", "details": {"movement_details": {"direction": "RIGHT", "distance": 1.0}}},
+    {"type": "Rotate", "details": {"rotation_details": {"angle_degrees": 90.0}}}]})
+
+def estimate_prompts_seconds(prompts, tier=PREVIEW_TIER):
+    # Submit-time cost guess for queue ordering, before any LLM call: the rule parser's spec when
+    # it understands a prompt, else a typical one.
+    specs = []
+    for prompt_text in prompts:
+        params, confidence = parse_prompt(prompt_text) if PROMPT_PARSER_ENABLED else (None, 0.0)
+        specs.append(SceneSpec.from_llm(params) if params is not None and confidence >= PROMPT_PARSER_MIN_CONFIDENCE
+                     else TYPICAL_SPEC)
+    return cost_model.predict(spec_features(specs[0]) if len(specs) == 1 else composition_features(specs), tier)
+
+def _cached_render(cache_key, what):
+    if not (cache_key and RENDER_CACHE_ENABLED): return None
+    cached_video_path = render_cache.get(cache_key)
+    CACHE_LOOKUPS.inc(cache="render", result="hit" if cached_video_path else "miss")
+    if cached_video_path: log.info("Render cache hit for %s %s: %s", what, cache_key[:12], cached_video_path)
+    return cached_video_path
+
+def render_scene_from_spec(spec, progress=_no_progress, result=None, pool=None, tier=PREVIEW_TIER, priority=None,
+                           background=False):
+    # Render-cache lookup, cost check, coalescing and rendering for an already validated spec.
+    # priority orders the wait for a render slot (default: shortest job first, see admission).
+    # A background render (cache warm-up) only starts while no other render runs or waits; a
+    # live caller that joins it promotes it to the caller's priority.
+    if result is None:
+        result = {"video_path": None, "llm_cache": "bypass", "llm_coalesced": False, "render_cache": "bypass",
+                  "render_coalesced": False, "coalesced_waiters": 0}
+    result.update(spec=spec, quality=tier)
+
+    # Fallback specs carry a possibly transient LLM error, so they are never cached.
+    spec_key = spec_cache_key(spec, QUALITY_TIERS[tier]["dir"])
+    cache_key = spec_key if spec.llm_error is None else None
+    cached_video_path = _cached_render(cache_key, "spec")
+    features = spec_features(spec)
+    if not cached_video_path:
+        # Only a render costs anything, so the budget applies to cache misses alone.
+        render_tier = _plan_render(features, tier, result, progress)
+        if render_tier is None: return result
+        if render_tier != tier:
+            tier = render_tier
+            spec_key = spec_cache_key(spec, QUALITY_TIERS[tier]["dir"])
+            cache_key = spec_key if spec.llm_error is None else None
+            cached_video_path = _cached_render(cache_key, "spec")
+    if cached_video_path:
+        result.update(video_path=cached_video_path, render_cache="hit")
+        progress("render_cached")
+        return result
+    if cache_key and RENDER_CACHE_ENABLED: result["render_cache"] = "miss"
+
+    if background: slot_priority = math.inf
+    else: slot_priority = sjf_priority(result["estimated_seconds"]) if priority is None else priority
+    slot_request = SlotRequest(slot_priority, background=background)
+
+    def render_and_cache(flight_progress):
+        scene_class_name = scene_class_name_for(spec_key)
+        with render_slots.acquire(priority=slot_request,
+                                  on_wait=lambda waiting: flight_progress("render_slot_wait", waiting=waiting)), \
+                janitor.rendering(scene_class_name), \
+                RenderWorkspace(scene_class_name, QUALITY_TIERS[tier]["dir"], MANIM_WRITE_SCENE_FILES) as workspace:
+            started = time.monotonic()
+            video_path = workspace.publish(render_validated_spec(spec, workspace, flight_progress, pool, tier))
+        if video_path: cost_model.observe(features, tier, time.monotonic() - started)
+        if video_path and cache_key and RENDER_CACHE_ENABLED: render_cache.put(cache_key, video_path)
+        return video_path
+
+    # Concurrent requests that resolved to the same spec attach to one render (they would
+    # otherwise write the same scene directory).
+    def join(leader_request):
+        if not background: render_slots.promote(leader_request, slot_request.priority)
+
+    video_path, flight = render_flight.do(spec_key, render_and_cache, _tracking_breaches(progress, result),
+                                          state=slot_request, on_join=join)
+    result.update(render_coalesced=flight["shared"], coalesced_waiters=flight["waiters"])
+    result["video_path"] = video_path
+    return result
+
+MULTIPART_MARKER_RE = re.compile(r"(?i)\b(?:scene|part|section|step)\s+\d+\s*[:.)-]\s*")
+LIST_MARKER_RE = re.compile(r"^\s*(?:\d+[.)]|[-*\u2022])\s+")
+
+def split_multipart_prompt(prompt_text):
+    # "Scene 1: ... Scene 2: ..." markers or one part per (optionally bulleted) line.
+    parts = []
+    for line in prompt_text.splitlines():
+        for part in MULTIPART_MARKER_RE.split(LIST_MARKER_RE.sub("", line)):
+            if part.strip(" \t;,."): parts.append(part.strip())
+    return parts
+
+def render_composition_detailed(prompts, progress=_no_progress, save_sections=False, pool=None, tier=PREVIEW_TIER):
+    # Several prompts become consecutive sections of one scene, rendered in a single Manim run.
+    log.info("Composing %d prompts into one scene", len(prompts))
+    result = {"video_path": None, "sections": [], "llm_cache": [], "render_cache": "bypass",
+              "render_coalesced": False, "coalesced_waiters": 0, "quality": tier}
+    specs = []
+    for index, prompt_text in enumerate(prompts):
+        info = {}
+        llm_data = get_animation_params_from_llm(prompt_text, info=info, progress=progress)
+        with span("spec", log):
+            specs.append(build_scene_spec(llm_data))
+        result["llm_cache"].append(info.get("llm_cache"))
+        progress("spec_validated", section=index, llm_error=specs[-1].llm_error)
+    result["specs"] = specs
+
+    any_error = any(spec.llm_error is not None for spec in specs)
+
+    def cache_keys(tier):
+        spec_key = spec_cache_key({"composition": specs, "sections": save_sections}, QUALITY_TIERS[tier]["dir"])
+        return spec_key, None if any_error else spec_key
+
+    spec_key, cache_key = cache_keys(tier)
+    cached_video_path = _cached_render(cache_key, "composition")
+    features = composition_features(specs)
+    if not cached_video_path:
+        render_tier = _plan_render(features, tier, result, progress, parts=len(specs))
+        if render_tier is None: return result
+        if render_tier != tier:
+            tier = render_tier
+            spec_key, cache_key = cache_keys(tier)
+            cached_video_path = _cached_render(cache_key, "composition")
+    if cached_video_path:
+        result.update(video_path=cached_video_path, render_cache="hit", sections=find_rendered_sections(cached_video_path))
+        progress("render_cached")
+        return result
+    if cache_key and RENDER_CACHE_ENABLED: result["render_cache"] = "miss"
+
+    def render_and_cache(flight_progress):
+        scene_class_name = scene_class_name_for(spec_key)
+        with render_slots.acquire(priority=sjf_priority(result["estimated_seconds"]),
+                                  on_wait=lambda waiting: flight_progress("render_slot_wait", waiting=waiting)), \
+                janitor.rendering(scene_class_name), \
+                RenderWorkspace(scene_class_name, QUALITY_TIERS[tier]["dir"], MANIM_WRITE_SCENE_FILES) as workspace:
+            started = time.monotonic()
+            video_path = workspace.publish(render_composed_specs(specs, workspace, flight_progress, save_sections,
+                                                                 pool, tier))
+        if video_path: cost_model.observe(features, tier, time.monotonic() - started)
+        if video_path and cache_key and RENDER_CACHE_ENABLED: render_cache.put(cache_key, video_path)
+        return video_path
+
+    video_path, flight = render_flight.do(spec_key, render_and_cache, _tracking_breaches(progress, result))
+    result.update(render_coalesced=flight["shared"], coalesced_waiters=flight["waiters"])
+    result["video_path"] = video_path
+    if video_path and save_sections: result["sections"] = find_rendered_sections(video_path)
+    return result
+
+def generate_composed_manim_script(specs, scene_class_name):
+    # The script path reuses scene_builder rather than concatenating one generated construct per part.
+    return f"""import sys
+import json
+sys.path.insert(0, {json.dumps(BACKEND_DIR)})
+from scene_builder import build_composed_scene_class
+
+{scene_class_name} = build_composed_scene_class(json.loads({json.dumps(json.dumps([spec.to_dict() for spec in specs]))}), {json.dumps(scene_class_name)})
+{scene_class_name}.__module__ = __name__
+"""
+
+def render_composed_specs(specs, workspace, progress=_no_progress, save_sections=False, pool=None,
+                          tier=PREVIEW_TIER):
+    pool = pool or render_pool
+    scene_class_name = workspace.scene_class_name
+    timeout = render_timeout(tier, len(specs))
+    if not MANIM_WRITE_SCENE_FILES and pool.enabled:
+        task = {
+            "specs": [spec.to_dict() for spec in specs], "scene_class_name": scene_class_name, "module_name": workspace.module_name,
+            "script_path": workspace.script_path, "media_dir": workspace.media_dir, "quality": QUALITY_TIERS[tier]["name"],
+            "manim_config": workspace.manim_config(),
+            "save_sections": save_sections, "timeout": timeout,
+        }
+        try: return render_task_on_worker_pool(task, progress, pool)
+        except WorkerUnavailable as e: log.warning("Warm Manim workers unavailable (%s). Falling back to subprocess.", e)
+
     try:
-        with open(dynamic_scene_file_path, "w", encoding="utf-8") as f: f.write(script_content)
-    except IOError as e: print(f"Error writing script: {e}"); return None
-    
-    scene_file_name_without_ext = os.path.splitext(dynamic_scene_file_basename)[0]
-    clear_scene_specific_cache_and_output(scene_file_name_without_ext, MANIM_SCENES_DIR)
+        with open(workspace.script_path, "w", encoding="utf-8") as f:
+            f.write(generate_composed_manim_script(specs, scene_class_name))
+    except IOError as e: log.error("Error writing script: %s", e); return None
+    progress("script_generated", scene_class_name=scene_class_name)
+    return render_with_subprocess(workspace, progress, extra_args=["--save_sections"] if save_sections else [],
+                                  timeout=timeout, tier=tier)
+
+def find_rendered_sections(video_path):
+    # Manim's save_sections writes <quality dir>/sections/<Scene>.json listing one video per section.
+    sections_dir = os.path.join(os.path.dirname(video_path), "sections")
+    index_path = os.path.join(sections_dir, f"{os.path.splitext(os.path.basename(video_path))[0]}.json")
+    try:
+        with open(index_path, "r", encoding="utf-8") as f: entries = json.load(f)
+    except (IOError, ValueError): return []
+    return [{"name": entry.get("name"), "video_path": os.path.join(sections_dir, entry["video"]),
+             "duration": entry.get("duration")} for entry in entries if entry.get("video")]
+
+def render_validated_spec(spec, workspace, progress=_no_progress, pool=None, tier=PREVIEW_TIER):
+    # Renders into the workspace; the caller publishes the returned video.
+    pool = pool or render_pool
+    if not MANIM_WRITE_SCENE_FILES and pool.enabled:
+        try: return render_spec(spec, workspace, progress, pool, tier)
+        except WorkerUnavailable as e: log.warning("Warm Manim workers unavailable (%s). Falling back to scene script.", e)
+    with span("codegen", log):
+        script_content = generate_manim_script_from_spec(spec, workspace.scene_class_name)
+    progress("script_generated", scene_class_name=workspace.scene_class_name)
+    return render_script(script_content, workspace, progress, pool, tier)
+
+def render_spec(spec, workspace, progress=_no_progress, pool=None, tier=PREVIEW_TIER):
+    # In-memory path: the worker builds the Scene from the spec, no script is written.
+    task = {
+        "spec": spec.to_dict(), "scene_class_name": workspace.scene_class_name, "module_name": workspace.module_name,
+        "script_path": workspace.script_path, "media_dir": workspace.media_dir, "quality": QUALITY_TIERS[tier]["name"],
+        "manim_config": workspace.manim_config(), "timeout": render_timeout(tier),
+    }
+    return render_task_on_worker_pool(task, progress, pool)
 
-    manim_executable_cmd = "manim"
+def render_script(script_content, workspace, progress=_no_progress, pool=None, tier=PREVIEW_TIER):
+    pool = pool or render_pool
+    if not script_content: return None
+    try:
+        with open(workspace.script_path, "w", encoding="utf-8") as f: f.write(script_content)
+    except IOError as e: log.error("Error writing script: %s", e); return None
+
+    if pool.enabled:
+        try: return render_with_worker_pool(script_content, workspace, progress, pool, tier)
+        except WorkerUnavailable as e: log.warning("Warm Manim workers unavailable (%s). Falling back to subprocess.", e)
+    return render_with_subprocess(workspace, progress, timeout=render_timeout(tier), tier=tier)
+
+def render_with_worker_pool(script_content, workspace, progress=_no_progress, pool=None, tier=PREVIEW_TIER):
+    task = {
+        "script": script_content, "script_path": workspace.script_path, "scene_class_name": workspace.scene_class_name,
+        "module_name": workspace.module_name, "media_dir": workspace.media_dir, "quality": QUALITY_TIERS[tier]["name"],
+        "manim_config": workspace.manim_config(), "timeout": render_timeout(tier),
+    }
+    return render_task_on_worker_pool(task, progress, pool)
+
+def render_task_on_worker_pool(task, progress=_no_progress, pool=None):
+    log.info("Rendering %s on a warm Manim worker", task['scene_class_name'])
+    progress("manim_started", scene_class_name=task["scene_class_name"], backend="worker")
+    with span("manim", log):
+        reply = (pool or render_pool).render(task, timeout=task.get("timeout", MANIM_RENDER_TIMEOUT_SECONDS),
+                                   on_event=lambda event: progress(event.pop("phase"), **event))
+    RENDERS.inc(backend="worker", outcome="ok" if reply.get("ok") else ("timeout" if reply.get("timed_out") else "error"))
+    if not reply.get("ok"):
+        log.error("Error during Manim rendering (warm worker): %s\n%s", reply.get('error'), reply.get("traceback", ""))
+        if reply.get("breach"): report_breach(reply["breach"], progress)
+        return None
+    log.info("Manim rendering successful in %.2fs", reply['seconds'])
+    progress("manim_finished")
+    if os.path.exists(reply["video_path"]):
+        log.info("Video file created at: %s", reply['video_path'])
+        progress("video_located")
+        return reply["video_path"]
+    log.error("Video file NOT found at reported path: %s", reply['video_path'])
+    return None
+
+RENDER_BREACHES = Counter("prompt2motion_render_resource_breaches_total", "Renders stopped by a sandbox limit.", ["limit"])
+
+def report_breach(breach, progress):
+    # Surfaces as result["resource_limit"] (see _tracking_breaches) and from there in the job result.
+    RENDER_BREACHES.inc(limit=breach)
+    log.warning("Render stopped: %s", sandbox.BREACH_MESSAGES.get(breach, breach))
+    progress("resource_limit", limit=breach, message=sandbox.BREACH_MESSAGES.get(breach, breach))
+
+def _tracking_breaches(progress, result):
+    def tracked(phase, **fields):
+        if phase == "resource_limit": result.update(resource_limit=fields["limit"], resource_limit_message=fields["message"])
+        progress(phase, **fields)
+    return tracked
+
+def _probe_manim_command(command):
+    try:
+        process = subprocess.run([*command, "--version"], check=True, capture_output=True, text=True, timeout=15)
+        return (process.stdout or process.stderr).strip(), None
+    except Exception as e:
+        return None, f"{' '.join(command)}: {e}"
+
+def resolve_manim_command(force=False):
+    # Probed once per process (and again only after a failure) instead of before every render.
+    global _manim_command_status
+    with _manim_command_lock:
+        if _manim_command_status is not None and not force: return _manim_command_status
+        candidates = [shlex.split(MANIM_COMMAND)] if MANIM_COMMAND else [["manim"], [sys.executable, "-m", "manim"]]
+        errors = []
+        status = {"command": None, "version": None, "error": None, "resolved_at": time.time(), "override": bool(MANIM_COMMAND)}
+        for command in candidates:
+            version, error = _probe_manim_command(command)
+            if error is None:
+                status.update(command=command, version=version)
+                break
+            errors.append(error)
+        else:
+            # Keep the last candidate so a render still reports a clear "not found" error.
+            status.update(command=candidates[-1], error="; ".join(errors))
+            log.warning("Could not validate a Manim command: %s", status['error'])
+        _manim_command_status = status
+        return status
+
+def run_startup_self_test():
+    log.info("Running Manim startup self-test render...")
+    spec = build_scene_spec({"shape": "Circle", "color": "WHITE", "animations": [{"type": "Create"}]})
+    started = time.time()
+    scene_class_name = f"SelfTestScene_{uuid.uuid4().hex[:16]}"
+    with render_slots.acquire(), janitor.rendering(scene_class_name), \
+            RenderWorkspace(scene_class_name, QUALITY_TIERS[PREVIEW_TIER]["dir"], MANIM_WRITE_SCENE_FILES) as workspace:
+        video_path = workspace.publish(render_validated_spec(spec, workspace))
+    self_test_status.update(ok=bool(video_path), video_path=video_path, seconds=time.time() - started, ran_at=started)
+    return self_test_status
+
+def startup_checks():
+    resolve_manim_command()
+    render_pool.warm()
+    if MANIM_STARTUP_SELF_TEST: run_startup_self_test()
+    return health_status()
+
+def health_status():
+    return {"manim": dict(resolve_manim_command()), "self_test": dict(self_test_status),
+            "render_pool": render_pool.stats(), "llm_circuit": groq_client.breaker.stats()}
+
+MANIM_ANIMATION_PROGRESS_RE = re.compile(r"Animation (\d+)\s*:\s*(.*?):\s*(\d+)%")
+MANIM_FILE_READY_RE = re.compile(r"File ready at\s+'([^']+)'")
+
+def _report_manim_output_line(line, progress, last_reported):
+    match = MANIM_ANIMATION_PROGRESS_RE.search(line)
+    if match:
+        index, description, percent = int(match.group(1)), match.group(2).strip(), int(match.group(3))
+        # tqdm redraws the same bar many times per second; only forward changes.
+        if last_reported.get("animation") != (index, percent):
+            last_reported["animation"] = (index, percent)
+            progress("animation", index=index, description=description, percent=percent)
+    elif "Combining to Movie file" in line:
+        progress("encoding")
+
+def render_with_subprocess(workspace, progress=_no_progress, reprobe_on_missing=True,
+                           extra_args=(), timeout=MANIM_RENDER_TIMEOUT_SECONDS, tier=PREVIEW_TIER):
+    scene_class_name = workspace.scene_class_name
+    manim_executable_cmd = resolve_manim_command()["command"]
     current_env = os.environ.copy()
-    try: subprocess.run([manim_executable_cmd, "--version"], check=True, capture_output=True, env=current_env, timeout=5)
-    except: manim_executable_cmd = [sys.executable, "-m", "manim"]
-    command = [*([manim_executable_cmd] if isinstance(manim_executable_cmd, str) else manim_executable_cmd), "-ql", dynamic_scene_file_basename, scene_class_name]
+    # Wide enough that Manim's rich logger never wraps the "File ready at" path.
+    current_env["COLUMNS"] = "4096"
+    command = [*manim_executable_cmd, QUALITY_TIERS[tier]["flag"], "--config_file", workspace.manim_config_file(),
+               *extra_args, workspace.script_basename, scene_class_name]
     
-    print(f"Running Manim: {' '.join(command)} (CWD: {MANIM_SCENES_DIR})")
+    log.info("Running Manim: %s (CWD: %s)", ' '.join(command), workspace.root)
     try:
-        process = subprocess.run(command, capture_output=True, text=True, check=True, cwd=MANIM_SCENES_DIR, env=current_env, timeout=90)
-        print("\nManim STDOUT:", process.stdout, "\nManim rendering successful!")
-        expected_video_path = os.path.join(MANIM_SCENES_DIR, "media", "videos", scene_file_name_without_ext, "480p15", f"{scene_class_name}.mp4")
-        if os.path.exists(expected_video_path):
-            print(f"Video file created at: {expected_video_path}")
-            return expected_video_path
-        else: 
-            print(f"Video file NOT found at expected path: {expected_video_path}. Searching...")
-            media_dir = os.path.join(MANIM_SCENES_DIR, "media", "videos", scene_file_name_without_ext)
-            if os.path.isdir(media_dir):
-                for root, _, files_in_walk in os.walk(media_dir): 
-                    for f_name_walk in files_in_walk:  
-                        if f_name_walk.endswith(f"{scene_class_name}.mp4"): 
-                            found_path = os.path.join(root, f_name_walk) 
-                            print(f"Found video file at: {found_path}")
-                            return found_path
-            print(f"Could not automatically locate the output video file in {media_dir}.")
-            return None
-    except subprocess.CalledProcessError as e:
-        print("\nError during Manim rendering (subprocess.CalledProcessError):")
-        print("Command:", ' '.join(e.cmd)); print("Return code:", e.returncode)
-        print("STDOUT:", e.stdout); print("STDERR:", e.stderr)
-        return None
-    except subprocess.TimeoutExpired as e:
-        print("\nManim rendering timed out.")
-        cmd_str = ' '.join(e.cmd) if hasattr(e, 'cmd') and e.cmd else ' '.join(command)
-        stdout_str = e.stdout.decode(errors='ignore') if hasattr(e, 'stdout') and e.stdout else ""
-        stderr_str = e.stderr.decode(errors='ignore') if hasattr(e, 'stderr') and e.stderr else ""
-        print(f"Command: {cmd_str}"); print(f"STDOUT: {stdout_str}"); print(f"STDERR: {stderr_str}")
-        return None
+        # Text mode turns tqdm's carriage returns into line breaks, so progress arrives line by line.
+        process = subprocess.Popen(sandbox.wrap_command(command), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   text=True, errors="replace", cwd=workspace.root, env=current_env,
+                                   **sandbox.popen_kwargs())
     except FileNotFoundError:
-        executable_str = manim_executable_cmd if isinstance(manim_executable_cmd, str) else ' '.join(manim_executable_cmd)
-        print(f"Error: Manim command ('{executable_str}') not found.")
+        executable_str = ' '.join(manim_executable_cmd)
+        log.error("Manim command (%r) not found.", executable_str)
+        if reprobe_on_missing and resolve_manim_command(force=True)["error"] is None:
+            return render_with_subprocess(workspace, progress, reprobe_on_missing=False,
+                                          extra_args=extra_args, timeout=timeout, tier=tier)
+        return None
+    progress("manim_started", scene_class_name=scene_class_name, backend="subprocess")
+
+    output_lines = []
+    last_reported = {}
+    def read_output():
+        for line in process.stdout:
+            output_lines.append(line)
+            _report_manim_output_line(line, progress, last_reported)
+    reader = threading.Thread(target=read_output, daemon=True)
+    reader.start()
+
+    try:
+        with span("manim", log):
+            returncode = process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        sandbox.kill_process_group(process)
+        process.wait()
+        reader.join(5)
+        RENDERS.inc(backend="subprocess", outcome="timeout")
+        log.error("Manim rendering timed out.\nCommand: %s\nOUTPUT: %s", ' '.join(command), ''.join(output_lines))
+        report_breach("timeout", progress)
         return None
     finally:
-        pass
+        # Anything Manim left running in its session (e.g. an ffmpeg it spawned) goes with it.
+        if process.returncode is not None: sandbox.kill_process_group(process)
+    reader.join()
+    manim_output = "".join(output_lines)
+
+    RENDERS.inc(backend="subprocess", outcome="ok" if returncode == 0 else "error")
+    if returncode != 0:
+        log.error("Error during Manim rendering.\nCommand: %s\nReturn code: %s\nOUTPUT: %s",
+                  ' '.join(command), returncode, manim_output)
+        breach = sandbox.breach_from_returncode(returncode, manim_output)
+        if breach: report_breach(breach, progress)
+        return None
+
+    log.debug("Manim OUTPUT: %s", manim_output)
+    log.info("Manim rendering successful!")
+    progress("manim_finished")
+    with span("video_lookup", log):
+        # Manim reports the exact output path; searching the media tree is only a fallback.
+        match = MANIM_FILE_READY_RE.search(manim_output)
+        ready_path = os.path.join(workspace.root, match.group(1)) if match else None
+        if ready_path and os.path.exists(ready_path): video_path = ready_path
+        else: video_path = find_rendered_video(workspace, tier)
+    if video_path: progress("video_located")
+    return video_path
+
+def find_rendered_video(workspace, tier=PREVIEW_TIER):
+    scene_class_name = workspace.scene_class_name
+    expected_video_path = os.path.join(workspace.media_dir, "videos", workspace.module_name, QUALITY_TIERS[tier]["dir"], f"{scene_class_name}.mp4")
+    if os.path.exists(expected_video_path):
+        log.info("Video file created at: %s", expected_video_path)
+        return expected_video_path
+    log.warning("Video file NOT found at expected path: %s. Searching...", expected_video_path)
+    media_dir = os.path.join(workspace.media_dir, "videos", workspace.module_name)
+    if os.path.isdir(media_dir):
+        for root, _, files_in_walk in os.walk(media_dir): 
+            for f_name_walk in files_in_walk:  
+                if f_name_walk.endswith(f"{scene_class_name}.mp4"): 
+                    found_path = os.path.join(root, f_name_walk) 
+                    log.info("Found video file at: %s", found_path)
+                    return found_path
+    log.error("Could not automatically locate the output video file in %s.", media_dir)
+    return None
 
 if __name__ == '__main__':
     test_prompt = input("Enter a test prompt for LLM (e.g., 'red square appears, then moves up and down, then turns blue and rotates 90 degrees'): ")
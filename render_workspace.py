@@ -0,0 +1,128 @@
+# render_workspace.py
+#
+# Every render runs in a directory of its own, manim_scenes/work/<scene module>-<render id>/,
+# holding its script, its Manim config and the media Manim writes. Only a finished render is
+# published: its media directories are renamed into manim_scenes/media/ in one step each, so the
+# served tree never holds a half-written video, and concurrent renders (threads, worker processes
+# or separate servers sharing the directory) never write into or delete each other's output.
+# Manim's content-addressed Tex and texts caches stay shared; partial movie files go to a
+# directory of the render's own, checked out from and back into the shared segment store.
+#
+# A live render holds flocks that the janitor of any process respects: an exclusive one on its
+# workspace's WORKSPACE_LOCK, and a shared one on RENDERS_LOCK_PATH, which the janitor must take
+# exclusively before it may touch the shared Manim caches. A crashed process drops its locks, so
+# only its leftovers become removable.
+
+import os
+import uuid
+import errno
+import shutil
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from observability import get_logger
+from render_cache import MANIM_SCENES_DIR, partial_movie_cache
+
+log = get_logger("render_workspace")
+
+WORK_DIR = os.path.join(MANIM_SCENES_DIR, "work")
+MEDIA_DIR = os.path.join(MANIM_SCENES_DIR, "media")
+# Per-scene media directories moved into MEDIA_DIR on publish (media/<kind>/<module>/...).
+PUBLISHED_MEDIA_KINDS = ["videos", "images"]
+WORKSPACE_LOCK = ".lock"
+# In WORK_DIR; a dotfile, so it is not mistaken for a workspace.
+RENDERS_LOCK = ".renders.lock"
+RENDERS_LOCK_PATH = os.path.join(WORK_DIR, RENDERS_LOCK)
+
+def shared_manim_config():
+    # Settings every render shares regardless of where its own media goes.
+    return {**partial_movie_cache.manim_config(),
+            "tex_dir": os.path.join(MEDIA_DIR, "Tex"), "text_dir": os.path.join(MEDIA_DIR, "texts")}
+
+class RenderWorkspace:
+    # quality: the Manim quality directory (e.g. "480p15") whose stored segments the render may
+    # reuse; None renders without the segment store. publish_script also moves the scene script
+    # into manim_scenes/ for debugging (MANIM_WRITE_SCENE_FILES); otherwise it goes with the workspace.
+    def __init__(self, scene_class_name, quality=None, publish_script=False):
+        self.scene_class_name = scene_class_name
+        self.quality = quality
+        self.publish_script = publish_script
+        self.module_name = scene_class_name.lower()
+        self.render_id = uuid.uuid4().hex
+        self.root = os.path.join(WORK_DIR, f"{self.module_name}-{self.render_id[:12]}")
+        self.media_dir = os.path.join(self.root, "media")
+        # Outside media_dir, so it is never published.
+        self.partial_movie_dir = os.path.join(self.root, "partial_movie_files")
+        self.script_basename = f"{self.module_name}.py"
+        self.script_path = os.path.join(self.root, self.script_basename)
+        self.config_path = os.path.join(self.root, "manim.cfg")
+        self._locks = []
+
+    def _lock(self, path, operation):
+        lock_file = open(path, "a")
+        self._locks.append(lock_file)
+        if fcntl is not None: fcntl.flock(lock_file, operation)
+
+    def __enter__(self):
+        os.makedirs(self.media_dir)
+        try:
+            self._lock(os.path.join(self.root, WORKSPACE_LOCK), fcntl and fcntl.LOCK_EX)
+            # Waits only while a janitor clears the shared caches.
+            self._lock(RENDERS_LOCK_PATH, fcntl and fcntl.LOCK_SH)
+            if self.quality: partial_movie_cache.check_out(self.quality, self.partial_movie_dir)
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Whatever was not published (a failed or timed-out render) goes with the workspace.
+        shutil.rmtree(self.root, ignore_errors=True)
+        # Closing the files releases the locks.
+        while self._locks: self._locks.pop().close()
+
+    def manim_config(self):
+        return {**shared_manim_config(), "media_dir": self.media_dir, "partial_movie_dir": self.partial_movie_dir}
+
+    def manim_config_file(self):
+        # The same settings for the manim CLI (--config_file).
+        with open(self.config_path, "w", encoding="utf-8") as f:
+            f.write("[CLI]\n" + "".join(f"{k} = {v}\n" for k, v in self.manim_config().items()))
+        return self.config_path
+
+    def _publish_dir(self, src, dst, published_video):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        try:
+            os.rename(src, dst)
+            return
+        except OSError as e:
+            if e.errno not in (errno.EEXIST, errno.ENOTEMPTY): raise
+        # Another render of the same scene published first. Scene names are spec hashes, so a
+        # complete copy is equivalent to ours; only an incomplete one is swapped out.
+        if published_video is None or os.path.exists(published_video): return
+        stale = os.path.join(self.root, f"stale-{os.path.basename(os.path.dirname(dst))}")
+        os.rename(dst, stale)
+        os.rename(src, dst)
+        log.warning("Replaced incomplete published media %s", dst)
+
+    def publish(self, video_path):
+        # Moves the rendered media (and, with publish_script, the script) into manim_scenes/ and
+        # returns where video_path now lives; None when there is nothing to publish.
+        if not video_path: return None
+        rel_path = os.path.relpath(video_path, self.media_dir)
+        if rel_path.startswith(os.pardir):
+            log.error("Rendered video %s is outside its workspace %s", video_path, self.root)
+            return None
+        published_video = os.path.join(MEDIA_DIR, rel_path)
+        if self.quality: partial_movie_cache.check_in(self.quality, self.partial_movie_dir)
+        for kind in PUBLISHED_MEDIA_KINDS:
+            src = os.path.join(self.media_dir, kind, self.module_name)
+            if os.path.isdir(src):
+                self._publish_dir(src, os.path.join(MEDIA_DIR, kind, self.module_name),
+                                  published_video if kind == "videos" else None)
+        if self.publish_script and os.path.exists(self.script_path):
+            os.replace(self.script_path, os.path.join(MANIM_SCENES_DIR, self.script_basename))
+        return published_video if os.path.exists(published_video) else None
@@ -1,7 +1,58 @@
-from render_manim import render_scene
+import sys
+import json
+import argparse
 
 # 💬 Your natural language prompt here
 prompt = "Create a red circle on the left, move it to the right, then rotate it 90 degrees."
 
-# 🚀 Run the full pipeline
-render_scene(prompt)
+def load_prompts(path):
+    # .jsonl with a "prompt" field per line, a JSON list of strings, or plain text, one prompt per line.
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"): return [json.loads(line)["prompt"] for line in f if line.strip()]
+        if path.endswith(".json"): return json.load(f)
+        return [line.strip() for line in f if line.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Render one prompt, or a batch of prompts into a manifest.")
+    parser.add_argument("prompts", nargs="*", help="Prompts to render (default: the example prompt above).")
+    parser.add_argument("--batch", help="File of prompts to render as one batch.")
+    parser.add_argument("--manifest", default="batch_manifest.json", help="Where to write the batch manifest.")
+    parser.add_argument("--llm-concurrency", type=int)
+    parser.add_argument("--llm-rps", type=float, help="Maximum Groq requests per second.")
+    parser.add_argument("--render-processes", type=int, help="Renders at once, at most MAX_CONCURRENT_RENDERS.")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="Pre-render the most requested specs into the render cache (run before starting the server).")
+    args = parser.parse_args()
+
+    if args.warm_cache:
+        from warmup import warmer
+        report = warmer.warm(wait_for_idle=False)
+        print(f"{report['rendered']} rendered, {report['cached']} already cached, {report['failed']} failed "
+              f"in {report['seconds']:.1f}s")
+        return 0 if report["failed"] == 0 else 1
+
+    prompts = list(args.prompts)
+    if args.batch: prompts.extend(load_prompts(args.batch))
+
+    # 🚀 Run the full pipeline
+    if len(prompts) <= 1 and not args.batch:
+        from render_manim import render_scene
+        video_path = render_scene(prompts[0] if prompts else prompt)
+        print(video_path or "Rendering failed.")
+        return 0 if video_path else 1
+
+    import batch
+    options = {"llm_concurrency": args.llm_concurrency, "llm_requests_per_second": args.llm_rps,
+               "render_processes": args.render_processes}
+
+    def report(phase, **fields):
+        if phase == "item_finished": print(f"[{fields['completed']}/{fields['total']}] {fields['status']}")
+
+    manifest = batch.run_batch(prompts, progress=report,
+                               **{name: value for name, value in options.items() if value is not None})
+    with open(args.manifest, "w", encoding="utf-8") as f: json.dump(manifest, f, indent=2)
+    print(f"{manifest['succeeded']}/{manifest['total']} succeeded in {manifest['seconds']:.1f}s; manifest: {args.manifest}")
+    return 0 if manifest["failed"] == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
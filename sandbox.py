@@ -0,0 +1,144 @@
+# sandbox.py
+#
+# Resource caps for Manim. CLI renders and warm workers start in their own session (so a
+# breach or timeout kills Manim together with anything it spawned, e.g. ffmpeg), at a lower
+# priority, with an address-space and output-file-size limit. CPU time is capped per render: a
+# CLI render gets RLIMIT_CPU, a warm worker gets a hard limit for its whole lifetime and moves
+# its soft limit forward before every task. A render that hits a cap fails with a breach reason
+# ("cpu_limit", "memory_limit", "file_size_limit", "timeout") that ends up in the job result. A
+# value of 0 disables that cap; on platforms without the resource module only the wall-clock
+# timeout applies.
+#
+# The caps are set by running the command through this file (wrap_command), which applies them
+# and execs the real command: a preexec_fn would run Python between fork and exec, which is not
+# safe in the threaded server.
+
+import os
+import sys
+import errno
+import shutil
+import signal
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+RENDER_CPU_SECONDS = int(os.getenv("RENDER_CPU_SECONDS", "180"))
+RENDER_MEMORY_MB = int(os.getenv("RENDER_MEMORY_MB", "4096"))
+RENDER_MAX_FILE_MB = int(os.getenv("RENDER_MAX_FILE_MB", "1024"))
+RENDER_NICE = int(os.getenv("RENDER_NICE", "10"))
+# Warm worker CPU on top of its renders' budgets: the Manim import and the time between tasks.
+WORKER_STARTUP_CPU_SECONDS = int(os.getenv("WORKER_STARTUP_CPU_SECONDS", "60"))
+# Between SIGXCPU at the soft limit and SIGKILL at the hard limit, so Manim can stop cleanly.
+CPU_GRACE_SECONDS = 5
+MB = 1024 * 1024
+
+BREACH_MESSAGES = {
+    "cpu_limit": f"Render exceeded its CPU time limit ({RENDER_CPU_SECONDS}s).",
+    "memory_limit": f"Render exceeded its memory limit ({RENDER_MEMORY_MB} MB).",
+    "file_size_limit": f"Render exceeded the output file size limit ({RENDER_MAX_FILE_MB} MB).",
+    "timeout": "Render exceeded its time limit.",
+}
+
+class ResourceLimitExceeded(Exception):
+    def __init__(self, breach):
+        super().__init__(BREACH_MESSAGES.get(breach, breach))
+        self.breach = breach
+
+def _set_limit(kind, soft, hard=None):
+    hard = soft if hard is None else hard
+    _, current_hard = resource.getrlimit(kind)
+    if current_hard != resource.RLIM_INFINITY: soft, hard = min(soft, current_hard), min(hard, current_hard)
+    resource.setrlimit(kind, (soft, hard))
+
+def _limit_and_exec(argv):
+    # python sandbox.py NICE MEMORY_MB FILE_MB CPU_SECONDS CPU_HARD_SECONDS -- COMMAND...
+    nice, memory_mb, file_mb, cpu_seconds, cpu_hard_seconds = map(int, argv[:5])
+    command = argv[6:]
+    if resource is not None:
+        if nice > 0: os.nice(nice)
+        if memory_mb > 0: _set_limit(resource.RLIMIT_AS, memory_mb * MB)
+        if file_mb > 0: _set_limit(resource.RLIMIT_FSIZE, file_mb * MB)
+        if cpu_seconds > 0: _set_limit(resource.RLIMIT_CPU, cpu_seconds, cpu_hard_seconds)
+    try:
+        os.execv(command[0], command)
+    except OSError as e:
+        sys.stderr.write(f"sandbox: cannot run {command[0]}: {e}\n")
+        os._exit(127)
+
+def worker_cpu_limit(max_renders):
+    # A hard limit can only be lowered, so a warm worker's covers every render it takes before
+    # the pool recycles it; a runaway scene that raises its soft limit stops there.
+    if RENDER_CPU_SECONDS <= 0: return 0
+    return WORKER_STARTUP_CPU_SECONDS + max_renders * (RENDER_CPU_SECONDS + CPU_GRACE_SECONDS)
+
+def wrap_command(command, cpu_seconds=RENDER_CPU_SECONDS, cpu_hard_seconds=None):
+    # `command` run through this file with the caps applied; pass it to Popen with popen_kwargs().
+    if os.name != "posix" or resource is None: return list(command)
+    # Resolved here so a missing executable still raises FileNotFoundError from Popen's caller.
+    executable = shutil.which(command[0])
+    if executable is None: raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), command[0])
+    if cpu_hard_seconds is None: cpu_hard_seconds = cpu_seconds + CPU_GRACE_SECONDS if cpu_seconds > 0 else 0
+    limits = [RENDER_NICE, RENDER_MEMORY_MB, RENDER_MAX_FILE_MB, cpu_seconds, cpu_hard_seconds]
+    return [sys.executable, os.path.abspath(__file__), *map(str, limits), "--", executable, *command[1:]]
+
+def popen_kwargs():
+    # Extra subprocess.Popen arguments for a sandboxed Manim process.
+    if os.name != "posix": return {}
+    return {"start_new_session": True}
+
+def kill_process_group(process):
+    # The process leads its own session (popen_kwargs), so its pid is the group id.
+    if os.name != "posix":
+        if process.poll() is None: process.kill()
+        return
+    try: os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError): pass
+
+def breach_from_returncode(returncode, output=""):
+    # Breach reason for a finished CLI render, or None when it failed for another reason.
+    if returncode is None or returncode >= 0:
+        # Python ignores SIGXFSZ, so a Manim process reports the file size cap as EFBIG instead.
+        if returncode and "MemoryError" in (output or ""): return "memory_limit"
+        if returncode and os.strerror(errno.EFBIG) in (output or ""): return "file_size_limit"
+        return None
+    signum = -returncode
+    if signum == getattr(signal, "SIGXCPU", None): return "cpu_limit"
+    if signum == getattr(signal, "SIGXFSZ", None): return "file_size_limit"
+    # SIGKILL we did not send: the CPU hard limit, or the kernel's OOM killer.
+    if signum == signal.SIGKILL: return "cpu_limit" if RENDER_CPU_SECONDS > 0 else "memory_limit"
+    return None
+
+def breach_from_exception(exc):
+    if isinstance(exc, ResourceLimitExceeded): return exc.breach
+    if isinstance(exc, MemoryError): return "memory_limit"
+    if isinstance(exc, OSError) and exc.errno == errno.EFBIG: return "file_size_limit"
+    return None
+
+# Inside a warm worker (manim_workers.worker_main).
+
+def _on_cpu_limit(signum, frame):
+    raise ResourceLimitExceeded("cpu_limit")
+
+def install_worker_handlers():
+    if resource is None: return
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    # Over-long writes then fail with EFBIG instead of killing the worker.
+    signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+
+def start_cpu_budget():
+    # RLIMIT_CPU counts the whole process lifetime, so each task gets RENDER_CPU_SECONDS more, up
+    # to the worker's hard limit.
+    if resource is None or RENDER_CPU_SECONDS <= 0: return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft, hard = int(usage.ru_utime + usage.ru_stime) + RENDER_CPU_SECONDS, resource.getrlimit(resource.RLIMIT_CPU)[1]
+    resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+
+def end_cpu_budget():
+    if resource is None or RENDER_CPU_SECONDS <= 0: return
+    hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+    resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+if __name__ == "__main__":
+    _limit_and_exec(sys.argv[1:])
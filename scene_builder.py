@@ -0,0 +1,131 @@
+# scene_builder.py
+#
+# Interprets a validated SceneSpec (see scene_spec.py) directly into a Manim Scene
+# class, mirroring generate_manim_script_from_spec without generating or importing any code.
+
+import math
+
+from observability import get_logger
+from scene_spec import as_scene_spec, THERE_AND_BACK_DIRECTIONS
+
+log = get_logger("scene_builder")
+
+APPEARANCE_ANIMATIONS = ["Create", "FadeIn", "GrowFromCenter"]
+# The prompt vocabulary allows diagonal names that Manim spells UL/UR/DL/DR.
+DIRECTION_NAMES = {"UP_LEFT": "UL", "UP_RIGHT": "UR", "DOWN_LEFT": "DL", "DOWN_RIGHT": "DR"}
+
+def _color(manim, color_name):
+    return getattr(manim, color_name)
+
+def _direction(manim, direction_name):
+    return getattr(manim, DIRECTION_NAMES.get(direction_name, direction_name))
+
+def _initial_mobject(manim, spec):
+    color = _color(manim, spec.color)
+    if spec.text_content:
+        return manim.Text(spec.text_content, color=color)
+    if spec.shape == "Polygon":
+        return manim.Polygon(*[[0, 1, 0], [-1, -0.5, 0], [1, -0.5, 0]], color=color)
+    if spec.shape == "Star":
+        return manim.Star(n=5, outer_radius=1, inner_radius=0.5, color=color)
+    return getattr(manim, spec.shape)(color=color)
+
+def _target_mobject(manim, shape_name, color_name):
+    color = _color(manim, color_name)
+    if shape_name == "Polygon":
+        return manim.Polygon(*[[0, 1, 0], [-0.5, -1, 0], [0.5, -1, 0]], color=color)
+    if shape_name == "Star":
+        return manim.Star(color=color)
+    return getattr(manim, shape_name)(color=color)
+
+def _group_animation(manim, obj, step):
+    if step.type == "Rotate":
+        return manim.Rotate(obj, angle=math.radians(step.angle_degrees))
+    if step.type == "Scale":
+        return obj.animate.scale(step.factor)
+    if step.type == "ChangeColor":
+        return obj.animate.set_color(_color(manim, step.target_color))
+    return None
+
+def _play_step(scene, manim, obj, step):
+    if step.type == "Move":
+        if step.direction in THERE_AND_BACK_DIRECTIONS:
+            there, back = (manim.UP, manim.DOWN) if step.direction.startswith("UP") else (manim.LEFT, manim.RIGHT)
+            scene.play(obj.animate.shift(there * step.distance))
+            scene.wait(0.3)
+            scene.play(obj.animate.shift(back * step.distance * 2))
+            scene.wait(0.3)
+            scene.play(obj.animate.shift(there * step.distance))
+        else:
+            scene.play(obj.animate.shift(_direction(manim, step.direction) * step.distance))
+    elif step.type in ["Rotate", "Scale", "ChangeColor"]:
+        scene.play(_group_animation(manim, obj, step))
+    elif step.type == "TransformShape":
+        scene.play(manim.Transform(obj, _target_mobject(manim, step.target_shape, step.target_color)))
+    elif step.type == "Indicate":
+        scene.play(manim.Indicate(obj))
+    elif step.type == "Flash":
+        scene.play(manim.Flash(obj, color=_color(manim, step.flash_color)))
+    elif step.type == "AnimationGroup":
+        group_anims = [_group_animation(manim, obj, group_step) for group_step in step.animations]
+        group_anims = [group_anim for group_anim in group_anims if group_anim is not None]
+        if group_anims: scene.play(manim.AnimationGroup(*group_anims, lag_ratio=0))
+
+def play_spec(scene, manim, spec):
+    if spec.llm_error is not None:
+        scene.play(manim.Write(manim.Text(f"LLM Error: {spec.llm_error}", font_size=24, color=manim.RED)))
+        scene.wait(3)
+        return
+
+    try:
+        main_obj = _initial_mobject(manim, spec)
+    except Exception as e_obj_create:
+        error_text = manim.Text(f"Object Creation Error: {e_obj_create}", font_size=24, color=manim.RED)
+        scene.play(manim.Write(error_text))
+        scene.wait(2)
+        return
+
+    is_text = bool(spec.text_content)
+    initial_creation_done = False
+    first_anim_type = spec.animations[0].type
+    if is_text and first_anim_type != "Write":
+        scene.play(manim.Write(main_obj))
+        initial_creation_done = True
+    elif not is_text and first_anim_type not in APPEARANCE_ANIMATIONS:
+        scene.play(manim.Create(main_obj))
+        initial_creation_done = True
+
+    for step in spec.animations:
+        if step.type in APPEARANCE_ANIMATIONS or (step.type == "Write" and is_text):
+            if not initial_creation_done:
+                scene.play(getattr(manim, step.type)(main_obj))
+                initial_creation_done = True
+            continue
+        _play_step(scene, manim, main_obj, step)
+
+    scene.wait(1)
+
+def build_scene_class(spec, scene_class_name):
+    import manim
+    spec = as_scene_spec(spec)
+
+    def construct(self):
+        play_spec(self, manim, spec)
+
+    return type(scene_class_name, (manim.Scene,), {"construct": construct})
+
+def section_name(index):
+    return f"part_{index + 1:02d}"
+
+def build_composed_scene_class(specs, scene_class_name):
+    # One scene playing each spec in turn as its own Manim section, starting from an empty frame.
+    import manim
+    specs = [as_scene_spec(spec) for spec in specs]
+
+    def construct(self):
+        for index, spec in enumerate(specs):
+            self.next_section(name=section_name(index))
+            self.clear()
+            play_spec(self, manim, spec)
+
+    return type(scene_class_name, (manim.Scene,), {"construct": construct})
@@ -0,0 +1,251 @@
+# scene_spec.py
+#
+# Typed model of a validated scene spec. SceneSpec.from_llm is the single lenient pass over
+# untrusted LLM (or prompt parser) parameters: unknown values fall back to defaults and are
+# reported in one log line. SceneSpec.from_dict is the strict inverse of to_dict for specs that
+# were validated before (worker tasks, queued jobs) and raises SpecError naming the bad field.
+# to_dict is the canonical form: it is what gets hashed for the render cache.
+
+import json
+import math
+from dataclasses import dataclass, replace
+from typing import Optional, Tuple, Union
+
+from observability import get_logger
+
+log = get_logger("scene_spec")
+
+SHAPES = frozenset(["Circle", "Square", "Triangle", "Rectangle", "Line", "Dot", "Star", "Polygon"])
+COLORS = frozenset([
+    "RED", "GREEN", "BLUE", "YELLOW", "ORANGE", "PURPLE", "PINK",
+    "WHITE", "BLACK", "GRAY", "LIGHT_GRAY", "DARK_GRAY", "VIOLET",
+])
+APPEARANCE_TYPES = frozenset(["Create", "FadeIn", "GrowFromCenter", "Write"])
+GROUPABLE_TYPES = frozenset(["Rotate", "Scale", "ChangeColor"])
+MOVE_DIRECTIONS = frozenset(["UP", "DOWN", "LEFT", "RIGHT", "UP_LEFT", "UP_RIGHT", "DOWN_LEFT", "DOWN_RIGHT"])
+# Moves that go there, twice as far back, and return to the start.
+THERE_AND_BACK_DIRECTIONS = frozenset(["UP_THEN_DOWN", "UP_AND_DOWN", "LEFT_THEN_RIGHT", "LEFT_AND_RIGHT"])
+# Playable magnitudes. Manim's frame is about 14 x 8 units: a longer move leaves the picture, a
+# factor of 0 collapses the object (and breaks any later step), a huge one fills the frame. Each
+# step plays for a fixed run time, so within these limits its cost does not depend on them.
+MOVE_DISTANCE_LIMITS = (-7.0, 7.0)
+SCALE_FACTOR_LIMITS = (0.1, 10.0)
+
+class SpecError(ValueError):
+    def __init__(self, path, message):
+        super().__init__(f"{path}: {message}")
+        self.path = path
+        self.message = message
+
+@dataclass(frozen=True, slots=True)
+class Appear:
+    type: str
+
+    def to_dict(self):
+        return {"type": self.type}
+
+@dataclass(frozen=True, slots=True)
+class Move:
+    direction: str
+    distance: float
+    type = "Move"
+
+    def to_dict(self):
+        return {"type": "Move", "details": {"movement_details": {"direction": self.direction, "distance": self.distance}}}
+
+@dataclass(frozen=True, slots=True)
+class Rotate:
+    angle_degrees: float
+    type = "Rotate"
+
+    def to_dict(self):
+        return {"type": "Rotate", "details": {"rotation_details": {"angle_degrees": self.angle_degrees}}}
+
+@dataclass(frozen=True, slots=True)
+class Scale:
+    factor: float
+    type = "Scale"
+
+    def to_dict(self):
+        return {"type": "Scale", "details": {"scale_details": {"factor": self.factor}}}
+
+@dataclass(frozen=True, slots=True)
+class ChangeColor:
+    target_color: str
+    type = "ChangeColor"
+
+    def to_dict(self):
+        return {"type": "ChangeColor", "details": {"color_change_details": {"target_color": self.target_color}}}
+
+@dataclass(frozen=True, slots=True)
+class TransformShape:
+    target_shape: str
+    target_color: str
+    type = "TransformShape"
+
+    def to_dict(self):
+        return {"type": "TransformShape", "details": {"transform_details": {
+            "target_shape": self.target_shape, "target_color": self.target_color}}}
+
+@dataclass(frozen=True, slots=True)
+class Indicate:
+    type = "Indicate"
+
+    def to_dict(self):
+        return {"type": "Indicate"}
+
+@dataclass(frozen=True, slots=True)
+class Flash:
+    flash_color: str
+    type = "Flash"
+
+    def to_dict(self):
+        return {"type": "Flash", "details": {"flash_details": {"flash_color": self.flash_color}}}
+
+@dataclass(frozen=True, slots=True)
+class AnimationGroup:
+    animations: Tuple[Union[Rotate, Scale, ChangeColor], ...]
+    type = "AnimationGroup"
+
+    def to_dict(self):
+        return {"type": "AnimationGroup", "details": {"grouped_animations": [step.to_dict() for step in self.animations]}}
+
+Step = Union[Appear, Move, Rotate, Scale, ChangeColor, TransformShape, Indicate, Flash, AnimationGroup]
+
+# Problems are handed to a reporter: the lenient pass collects them and uses the default, the
+# strict pass raises. `missing` problems are expected in LLM output and not worth reporting.
+def _strict(path, message, missing=False):
+    raise SpecError(path, message)
+
+class _Issues(list):
+    def __call__(self, path, message, missing=False):
+        if not missing: self.append(f"{path}: {message}")
+
+def _mapping(value, path, report):
+    if value is None: report(path, "missing", missing=True); return {}
+    if not isinstance(value, dict): report(path, f"expected an object, got {type(value).__name__}"); return {}
+    return value
+
+def _number(value, default, path, report, digits=None, limits=None):
+    if value is None: report(path, "missing", missing=True); return float(default)
+    try: number = float(value)
+    except (TypeError, ValueError): report(path, f"not a number: {value!r}"); return float(default)
+    if not math.isfinite(number): report(path, f"not a finite number: {value!r}"); return float(default)
+    if digits is not None: number = round(number, digits)
+    if limits and not limits[0] <= number <= limits[1]:
+        report(path, f"outside {list(limits)}: {value!r}")
+        number = min(max(number, limits[0]), limits[1])
+    return number
+
+def _color(value, default, path, report):
+    if not value: report(path, "missing", missing=True); return default
+    name = str(value).upper()
+    if name not in COLORS: report(path, f"unknown color {value!r}"); return default
+    return name
+
+def _shape(value, default, path, report):
+    if not value: report(path, "missing", missing=True); return default
+    name = str(value).capitalize()
+    if name not in SHAPES: report(path, f"unknown shape {value!r}"); return default
+    return name
+
+def _step(data, initial_color, path, report):
+    # Returns the typed step, or None when the step cannot be played at all.
+    anim_type = data.get("type")
+    if anim_type in APPEARANCE_TYPES or anim_type == "Indicate":
+        return Indicate() if anim_type == "Indicate" else Appear(anim_type)
+    details = _mapping(data.get("details"), f"{path}.details", report)
+    if anim_type == "Move":
+        move = _mapping(details.get("movement_details"), f"{path}.details.movement_details", report)
+        direction = move.get("direction")
+        if direction is None: report(f"{path}.details.movement_details.direction", "missing", missing=True)
+        direction = str(direction or "RIGHT").upper()
+        if direction not in MOVE_DIRECTIONS and direction not in THERE_AND_BACK_DIRECTIONS:
+            report(f"{path}.details.movement_details.direction", f"unknown direction {move.get('direction')!r}")
+            return None
+        return Move(direction, _number(move.get("distance"), 1, f"{path}.details.movement_details.distance", report,
+                                       limits=MOVE_DISTANCE_LIMITS))
+    if anim_type == "Rotate":
+        rotation = _mapping(details.get("rotation_details"), f"{path}.details.rotation_details", report)
+        return Rotate(_number(rotation.get("angle_degrees"), 90, f"{path}.details.rotation_details.angle_degrees",
+                              report, digits=2))
+    if anim_type == "Scale":
+        scale = _mapping(details.get("scale_details"), f"{path}.details.scale_details", report)
+        return Scale(_number(scale.get("factor"), 2, f"{path}.details.scale_details.factor", report, digits=2,
+                             limits=SCALE_FACTOR_LIMITS))
+    if anim_type == "ChangeColor":
+        change = _mapping(details.get("color_change_details"), f"{path}.details.color_change_details", report)
+        return ChangeColor(_color(change.get("target_color"), "WHITE",
+                                  f"{path}.details.color_change_details.target_color", report))
+    if anim_type == "TransformShape":
+        transform = _mapping(details.get("transform_details"), f"{path}.details.transform_details", report)
+        # Without an explicit target color the shape keeps the main object's initial color.
+        return TransformShape(
+            _shape(transform.get("target_shape"), "Square", f"{path}.details.transform_details.target_shape", report),
+            _color(transform.get("target_color"), initial_color, f"{path}.details.transform_details.target_color", report))
+    if anim_type == "Flash":
+        flash = _mapping(details.get("flash_details"), f"{path}.details.flash_details", report)
+        return Flash(_color(flash.get("flash_color"), "YELLOW", f"{path}.details.flash_details.flash_color", report))
+    if anim_type == "AnimationGroup":
+        grouped = details.get("grouped_animations") or []
+        steps = []
+        for index, group_step in enumerate(grouped if isinstance(grouped, list) else []):
+            group_path = f"{path}.details.grouped_animations[{index}]"
+            if not isinstance(group_step, dict) or group_step.get("type") not in GROUPABLE_TYPES:
+                report(group_path, "only Rotate, Scale and ChangeColor can be grouped")
+                continue
+            steps.append(_step(group_step, initial_color, group_path, report))
+        return AnimationGroup(tuple(steps))
+    report(f"{path}.type", f"unknown animation type {anim_type!r}")
+    return None
+
+def _scene_spec(data, report):
+    color = _color(data.get("color"), "WHITE", "color", report)
+    shape = _shape(data.get("shape"), "Circle", "shape", report)
+    animations = []
+    for index, step_data in enumerate(data.get("animations") or []):
+        if not isinstance(step_data, dict): report(f"animations[{index}]", "expected an object"); continue
+        step = _step(step_data, color, f"animations[{index}]", report)
+        if step is not None: animations.append(step)
+    text_content = data.get("text_content")
+    return SceneSpec(shape, color, str(text_content) if text_content else None,
+                     tuple(animations) or (Appear("Create"),), None)
+
+@dataclass(frozen=True, slots=True)
+class SceneSpec:
+    shape: str
+    color: str
+    text_content: Optional[str]
+    animations: Tuple[Step, ...]
+    llm_error: Optional[str] = None
+
+    @classmethod
+    def from_llm(cls, llm_data):
+        issues = _Issues()
+        spec = _scene_spec(llm_data, issues)
+        if issues: log.warning("Corrected %d invalid spec value(s): %s", len(issues), "; ".join(issues))
+        return spec
+
+    @classmethod
+    def fallback(cls, error_message):
+        # Shown instead of the requested scene when no usable parameters could be obtained.
+        return cls("Circle", "GRAY", None, (Appear("Create"),), str(error_message))
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict): raise SpecError("spec", f"expected an object, got {type(data).__name__}")
+        if not data.get("animations"): raise SpecError("animations", "at least one animation is required")
+        llm_error = data.get("llm_error")
+        return replace(_scene_spec(data, _strict), llm_error=str(llm_error) if llm_error is not None else None)
+
+    def to_dict(self):
+        return {"shape": self.shape, "color": self.color, "text_content": self.text_content,
+                "animations": [step.to_dict() for step in self.animations], "llm_error": self.llm_error}
+
+    def canonical_json(self):
+        # Sorted keys and fixed separators so equal specs serialize (and hash) identically.
+        return json.dumps(self.to_dict(), sort_keys=True, separators=(",", ":"))
+
+def as_scene_spec(spec):
+    # Specs cross process and queue boundaries as to_dict() output.
+    return spec if isinstance(spec, SceneSpec) else SceneSpec.from_dict(spec)
@@ -0,0 +1,222 @@
+# server.py
+#
+# Production entry point: `python server.py` (or `python app.py`). Runs the WSGI app from wsgi.py
+# under gunicorn when it is installed (gthread workers, so SSE streams do not pin a whole worker),
+# otherwise under Werkzeug's threaded server. Either way SIGTERM/SIGINT drain in-flight renders
+# before the process exits (see app.drain).
+#
+# Job state lives in the process that accepted the job, so with WEB_WORKERS > 1 the status and
+# event URLs only work behind a load balancer with sticky sessions.
+
+import io
+import os
+import signal
+import threading
+import time
+
+from observability import get_logger, Counter
+
+log = get_logger("server")
+
+WEB_SERVER = os.getenv("WEB_SERVER", "auto").lower()  # "auto", "gunicorn" or "werkzeug"
+WEB_HOST = os.getenv("WEB_HOST", "127.0.0.1")
+WEB_PORT = int(os.getenv("WEB_PORT", "5000"))
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+WEB_THREADS = int(os.getenv("WEB_THREADS", "16"))
+# Longest a request may take from when the app sees it: reading its body and sending its response,
+# enforced by RequestDeadline. Renders run as jobs, so no view blocks; SSE streams end on their own
+# (SSE_MAX_STREAM_SECONDS) and files are bounded by the idle timeout, since clients resume them with Range.
+REQUEST_TIMEOUT_SECONDS = int(os.getenv("REQUEST_TIMEOUT_SECONDS", "60"))
+# Request bodies are JSON; RequestDeadline buffers them and answers 413 past this.
+MAX_REQUEST_BODY_BYTES = int(os.getenv("MAX_REQUEST_BODY_BYTES", str(1 << 20)))
+# How long one socket read or write may block under the werkzeug server (gunicorn's gthread workers
+# have no such timeout; put a proxy with client timeouts in front).
+IDLE_TIMEOUT_SECONDS = int(os.getenv("IDLE_TIMEOUT_SECONDS", "30"))
+# gunicorn's worker heartbeat: the arbiter kills a worker process that stops checking in this long.
+# It catches a hung process, not a slow request (gthread workers check in while requests run).
+WORKER_TIMEOUT_SECONDS = int(os.getenv("WORKER_TIMEOUT_SECONDS", "30"))
+KEEPALIVE_SECONDS = int(os.getenv("KEEPALIVE_SECONDS", "5"))
+DRAIN_TIMEOUT_SECONDS = int(os.getenv("DRAIN_TIMEOUT_SECONDS", "120"))
+# Headroom on top of the drain for open requests to finish before the worker is killed.
+SHUTDOWN_GRACE_SECONDS = 15
+
+BODY_READ_BYTES = 64 * 1024
+
+HTTP_DEADLINE_EXCEEDED = Counter("prompt2motion_http_deadline_exceeded_total",
+                                 "Requests cut off at REQUEST_TIMEOUT_SECONDS, by stage.", ["stage"])
+
+class RequestDeadline:
+    # WSGI middleware giving each request `seconds` to arrive and be answered. The body is read up
+    # front (408 past the deadline, 413 past max_body_bytes), so a slow upload never reaches a view
+    # thread; a response body still being sent at the deadline is cut off and the connection dropped.
+    # SSE streams and files are exempt (see REQUEST_TIMEOUT_SECONDS). A view cannot be interrupted;
+    # one that finishes late is logged and counted.
+    def __init__(self, app, seconds=REQUEST_TIMEOUT_SECONDS, max_body_bytes=MAX_REQUEST_BODY_BYTES,
+                 clock=time.monotonic):
+        self.app = app
+        self.seconds = seconds
+        self.max_body_bytes = max_body_bytes
+        self.clock = clock
+
+    def __call__(self, environ, start_response):
+        if self.seconds <= 0: return self.app(environ, start_response)
+        deadline = self.clock() + self.seconds
+        body, error = self._read_body(environ, deadline)
+        if error is not None:
+            if error.code == 408: HTTP_DEADLINE_EXCEEDED.inc(stage="body")
+            log.warning("%s %s: %s", environ.get("REQUEST_METHOD"), environ.get("PATH_INFO"), error.description)
+            return error(environ, start_response)
+        environ["wsgi.input"] = io.BytesIO(body)
+        environ["CONTENT_LENGTH"] = str(len(body))
+        environ["wsgi.input_terminated"] = True
+
+        exempt = []
+
+        def start(status, headers, exc_info=None):
+            content_type = next((value for name, value in headers if name.lower() == "content-type"), "")
+            exempt.append(content_type.startswith("text/event-stream"))
+            return start_response(status, headers, exc_info)
+
+        response = self.app(environ, start)
+        if self.clock() >= deadline:
+            HTTP_DEADLINE_EXCEEDED.inc(stage="view")
+            log.warning("%s %s took longer than %ds.", environ.get("REQUEST_METHOD"), environ.get("PATH_INFO"), self.seconds)
+        if any(exempt) or _is_file(response, environ): return response
+        return self._bounded(response, deadline, environ)
+
+    def _read_body(self, environ, deadline):
+        from werkzeug.exceptions import RequestEntityTooLarge, RequestTimeout
+        stream = environ.get("wsgi.input")
+        try: remaining = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError: remaining = 0
+        # Without a length the body runs to EOF only when the server says the input is terminated.
+        until_eof = not remaining and environ.get("wsgi.input_terminated", False)
+        if stream is None or not (remaining or until_eof): return b"", None
+        if remaining > self.max_body_bytes: return None, RequestEntityTooLarge()
+        chunks, size = [], 0
+        while until_eof or size < remaining:
+            if self.clock() >= deadline: return None, RequestTimeout(f"Request body not received within {self.seconds}s.")
+            chunk = stream.read(BODY_READ_BYTES if until_eof else min(BODY_READ_BYTES, remaining - size))
+            if not chunk: break
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > self.max_body_bytes: return None, RequestEntityTooLarge()
+        return b"".join(chunks), None
+
+    def _bounded(self, response, deadline, environ):
+        # The first chunk always goes: a view that finished late has done its work (a job is queued).
+        try:
+            for index, chunk in enumerate(response):
+                if index and self.clock() >= deadline:
+                    HTTP_DEADLINE_EXCEEDED.inc(stage="response")
+                    log.warning("%s %s: response not sent within %ds; dropping the connection.",
+                                environ.get("REQUEST_METHOD"), environ.get("PATH_INFO"), self.seconds)
+                    # Raising after the headers went out makes the server close the connection.
+                    raise TimeoutError("request deadline exceeded")
+                yield chunk
+        finally:
+            if hasattr(response, "close"): response.close()
+
+def _is_file(response, environ):
+    from werkzeug.wsgi import FileWrapper
+    file_wrapper = environ.get("wsgi.file_wrapper")
+    return isinstance(response, FileWrapper) or (isinstance(file_wrapper, type) and isinstance(response, file_wrapper))
+
+def _post_worker_init(worker):
+    # gunicorn stops accepting on SIGTERM; also stop taking jobs and end SSE streams right away.
+    import app
+    handle_exit = signal.getsignal(signal.SIGTERM)
+
+    def begin_drain(signum, frame):
+        app.begin_drain()
+        handle_exit(signum, frame)
+
+    signal.signal(signal.SIGTERM, begin_drain)
+
+def _worker_exit(server, worker):
+    import app
+    app.drain(DRAIN_TIMEOUT_SECONDS)
+
+def gunicorn_options():
+    # Also read by gunicorn.conf.py, so `gunicorn -c gunicorn.conf.py wsgi:app` behaves the same.
+    return {
+        "bind": f"{WEB_HOST}:{WEB_PORT}",
+        "workers": WEB_WORKERS,
+        "threads": WEB_THREADS,
+        "worker_class": "gthread",
+        "timeout": WORKER_TIMEOUT_SECONDS,
+        "graceful_timeout": DRAIN_TIMEOUT_SECONDS + SHUTDOWN_GRACE_SECONDS,
+        "keepalive": KEEPALIVE_SECONDS,
+        # Job queues start threads at import, and threads do not survive a fork.
+        "preload_app": False,
+        "post_worker_init": _post_worker_init,
+        "worker_exit": _worker_exit,
+    }
+
+def _serve_gunicorn():
+    from gunicorn.app.base import BaseApplication
+
+    class Prompt2MotionApplication(BaseApplication):
+        def load_config(self):
+            for key, value in gunicorn_options().items(): self.cfg.set(key, value)
+
+        def load(self):
+            from wsgi import app
+            return app
+
+    log.info("Serving on %s:%d with gunicorn (%d workers x %d threads)", WEB_HOST, WEB_PORT, WEB_WORKERS, WEB_THREADS)
+    Prompt2MotionApplication().run()
+
+def _serve_werkzeug():
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    import app
+    from wsgi import app as wsgi_app
+
+    if WEB_WORKERS > 1: log.warning("WEB_WORKERS=%d needs gunicorn; serving from one process.", WEB_WORKERS)
+
+    class RequestHandler(WSGIRequestHandler):
+        timeout = IDLE_TIMEOUT_SECONDS
+
+    http_server = make_server(WEB_HOST, WEB_PORT, wsgi_app, threaded=True, request_handler=RequestHandler)
+    # One thread per connection, at most WEB_THREADS at once; further connections wait in the backlog.
+    slots = threading.BoundedSemaphore(WEB_THREADS)
+    accept, handle = http_server.process_request, http_server.process_request_thread
+
+    def process_request(request, client_address):
+        slots.acquire()
+        accept(request, client_address)
+
+    def process_request_thread(request, client_address):
+        try: handle(request, client_address)
+        finally: slots.release()
+
+    http_server.process_request = process_request
+    http_server.process_request_thread = process_request_thread
+
+    def shutdown():
+        # Keep answering status and readiness requests while the jobs drain.
+        app.drain(DRAIN_TIMEOUT_SECONDS)
+        http_server.shutdown()
+
+    def on_signal(signum, frame):
+        if app.draining.is_set(): return
+        threading.Thread(target=shutdown, name="drain", daemon=True).start()
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    log.info("Serving on %s:%d with werkzeug (%d threads)", WEB_HOST, WEB_PORT, WEB_THREADS)
+    http_server.serve_forever()
+
+def serve():
+    if WEB_SERVER != "werkzeug":
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            if WEB_SERVER == "gunicorn": raise
+            log.warning("gunicorn is not installed; falling back to the werkzeug server.")
+        else:
+            return _serve_gunicorn()
+    _serve_werkzeug()
+
+if __name__ == "__main__":
+    serve()
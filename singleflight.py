@@ -0,0 +1,69 @@
+# singleflight.py
+#
+# Coalesces concurrent calls that share a key: the first caller runs the work, later callers
+# wait for it and receive the same result (and its progress events) instead of repeating it.
+
+import copy
+import threading
+
+from observability import get_logger
+
+log = get_logger("singleflight")
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        self.progress_listeners = []
+        self.state = None
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self.leaders = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, progress=None, state=None, on_join=None):
+        # fn receives a progress callback that fans out to every attached caller.
+        # Returns (result, info) where info reports whether the result was shared.
+        # A joining caller's on_join(state) runs with the leader's state, e.g. to raise the
+        # urgency of work the leader has not started yet.
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+                call.state = state
+                self.leaders += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+            if progress: call.progress_listeners.append(progress)
+
+        if not is_leader:
+            if on_join: on_join(call.state)
+            call.done.wait()
+            if call.error is not None: raise call.error
+            return copy.deepcopy(call.result), {"shared": True, "waiters": call.waiters}
+
+        def fan_out(phase, **fields):
+            for listener in list(call.progress_listeners): listener(phase, **fields)
+
+        try:
+            call.result = fn(fan_out)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock: del self._calls[key]
+            call.done.set()
+        if call.waiters: log.info("Single-flight %r: %d waiter(s) shared one result.", self.name, call.waiters)
+        return call.result, {"shared": False, "waiters": call.waiters}
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._calls), "leaders": self.leaders, "coalesced": self.coalesced}
@@ -0,0 +1,88 @@
+# spec_log.py
+#
+# Which specs users ask for, so cache warm-up (warmup.py) knows what to pre-render. Every live
+# preview request that resolved to a valid spec counts once, and scores decay with a half-life
+# so the ranking follows current traffic. The log keeps the SPEC_LOG_MAX_ENTRIES best scoring
+# specs and is saved next to the render cache at most every SPEC_LOG_SAVE_INTERVAL_SECONDS.
+
+import os
+import json
+import time
+import threading
+
+from observability import get_logger
+from render_cache import MANIM_SCENES_DIR, spec_cache_key
+
+log = get_logger("spec_log")
+
+SPEC_LOG_PATH = os.getenv("SPEC_LOG_PATH", os.path.join(MANIM_SCENES_DIR, "media", "spec_log.json"))
+SPEC_LOG_MAX_ENTRIES = int(os.getenv("SPEC_LOG_MAX_ENTRIES", "2000"))
+SPEC_LOG_HALF_LIFE_SECONDS = int(os.getenv("SPEC_LOG_HALF_LIFE_SECONDS", str(7 * 24 * 3600)))
+SPEC_LOG_SAVE_INTERVAL_SECONDS = int(os.getenv("SPEC_LOG_SAVE_INTERVAL_SECONDS", "60"))
+
+class SpecLog:
+    def __init__(self, path=SPEC_LOG_PATH, max_entries=SPEC_LOG_MAX_ENTRIES, half_life_seconds=SPEC_LOG_HALF_LIFE_SECONDS,
+                 save_interval_seconds=SPEC_LOG_SAVE_INTERVAL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.half_life_seconds = half_life_seconds
+        self.save_interval_seconds = save_interval_seconds
+        self.recorded = 0
+        self._saved = time.time()
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f: return json.load(f)
+        except (IOError, ValueError): return {}
+
+    def _save_locked(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f: json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
+        self._saved = time.time()
+        self._dirty = False
+
+    def _score(self, entry, now):
+        return entry["score"] * 0.5 ** ((now - entry["updated"]) / self.half_life_seconds)
+
+    def record(self, spec):
+        # Fallback specs stand for an LLM failure, not for something anyone asked to see.
+        if spec.llm_error is not None: return
+        key = spec_cache_key(spec, None)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {"spec": spec.to_dict(), "score": 0.0, "updated": now, "requests": 0}
+            entry.update(score=self._score(entry, now) + 1, updated=now, requests=entry["requests"] + 1)
+            self.recorded += 1
+            self._dirty = True
+            if len(self._entries) > self.max_entries:
+                del self._entries[min(self._entries, key=lambda k: self._score(self._entries[k], now))]
+            if now - self._saved >= self.save_interval_seconds:
+                try: self._save_locked()
+                except OSError as e: log.warning("Could not save the spec log: %s", e)
+
+    def top(self, n, min_score=0.0):
+        # [(spec dict, decayed score)] for the n most requested specs, best first.
+        now = time.time()
+        with self._lock:
+            scored = [(entry["spec"], self._score(entry, now)) for entry in self._entries.values()]
+        return sorted((item for item in scored if item[1] >= min_score), key=lambda item: -item[1])[:n]
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty: return
+            try: self._save_locked()
+            except OSError as e: log.warning("Could not save the spec log: %s", e)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "recorded": self.recorded,
+                    "half_life_seconds": self.half_life_seconds}
+
+spec_log = SpecLog()
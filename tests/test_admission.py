@@ -0,0 +1,212 @@
+# tests/test_admission.py
+
+import math
+import threading
+
+import pytest
+
+from admission import RenderSlots, SlotRequest, TokenBucketLimiter, retry_after_seconds
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+# Token buckets
+
+def test_burst_then_limited(clock):
+    limiter = TokenBucketLimiter(60, 3, clock=clock)
+    assert [limiter.acquire("a") for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("a") == pytest.approx(1.0)
+    assert limiter.stats()["allowed"] == 3
+    assert limiter.stats()["limited"] == 1
+
+def test_retry_after_counts_down(clock):
+    limiter = TokenBucketLimiter(30, 1, clock=clock)  # one token every 2 seconds
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") == pytest.approx(2.0)
+    clock.advance(0.5)
+    assert limiter.acquire("a") == pytest.approx(1.5)
+    clock.advance(1.5)
+    assert limiter.acquire("a") == 0
+
+def test_refill_rate(clock):
+    limiter = TokenBucketLimiter(120, 2, clock=clock)  # two tokens a second
+    limiter.acquire("a"); limiter.acquire("a")
+    clock.advance(0.5)
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") == pytest.approx(0.5)
+
+def test_refill_is_capped_at_burst(clock):
+    limiter = TokenBucketLimiter(60, 2, clock=clock)
+    limiter.acquire("a"); limiter.acquire("a")
+    clock.advance(3600)
+    assert [limiter.acquire("a") for _ in range(3)] == [0, 0, pytest.approx(1.0)]
+
+def test_limited_requests_do_not_spend_tokens(clock):
+    limiter = TokenBucketLimiter(60, 1, clock=clock)
+    limiter.acquire("a")
+    for _ in range(5): limiter.acquire("a")
+    clock.advance(1.0)
+    assert limiter.acquire("a") == 0
+
+def test_clients_have_separate_buckets(clock):
+    limiter = TokenBucketLimiter(60, 1, clock=clock)
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") > 0
+    assert limiter.acquire("b") == 0
+
+def test_least_recently_seen_clients_are_dropped(clock):
+    limiter = TokenBucketLimiter(60, 1, max_clients=2, clock=clock)
+    limiter.acquire("a"); limiter.acquire("b"); limiter.acquire("c")
+    assert limiter.stats()["clients"] == 2
+    assert limiter.acquire("c") > 0
+    assert limiter.acquire("a") == 0  # forgotten, so a full bucket again
+
+def test_zero_rate_disables_the_limit(clock):
+    limiter = TokenBucketLimiter(0, 1, clock=clock)
+    assert all(limiter.acquire("a") == 0 for _ in range(100))
+
+@pytest.mark.parametrize("seconds, header", [(0.01, 1), (1.0, 1), (1.2, 2), (59.9, 60)])
+def test_retry_after_header_rounds_up(seconds, header):
+    assert retry_after_seconds(seconds) == header
+
+# Render slots
+
+def test_slots_cap_and_release(clock):
+    slots = RenderSlots(2, clock=clock)
+    with slots.acquire(), slots.acquire():
+        assert slots.stats()["in_use"] == 2
+        assert slots.stats()["saturation"] == 1.0
+    assert slots.stats()["in_use"] == 0
+    assert slots.stats()["peak"] == 2
+
+def wait_for_waiters(slots, count):
+    with slots._changed:
+        assert slots._changed.wait_for(lambda: slots.waiting == count, timeout=5)
+
+def run_waiters(slots, priorities, clock=None):
+    # Starts one waiter per priority (None: the default priority) while every slot is taken,
+    # one at a time so arrival order is known, then frees the slots and returns the grant order.
+    granted, threads = [], []
+
+    def waiter(name, priority):
+        with slots.acquire(priority=priority):
+            granted.append(name)
+
+    with slots.acquire():
+        for name, priority in priorities:
+            thread = threading.Thread(target=waiter, args=(name, priority))
+            thread.start()
+            threads.append(thread)
+            wait_for_waiters(slots, len(threads))
+            if clock: clock.advance(1)
+    for thread in threads: thread.join(5)
+    return granted
+
+def test_slots_go_to_the_lowest_priority_value(clock):
+    slots = RenderSlots(1, clock=clock)
+    granted = run_waiters(slots, [("long", 30.0), ("short", 10.0), ("medium", 20.0), ("shortest", 5.0)])
+    assert granted == ["shortest", "short", "medium", "long"]
+    assert slots.stats()["waiting"] == 0
+
+def test_equal_priorities_are_served_in_arrival_order(clock):
+    slots = RenderSlots(1, clock=clock)
+    assert run_waiters(slots, [("first", 1.0), ("second", 1.0), ("third", 1.0)]) == ["first", "second", "third"]
+
+def test_default_priority_is_arrival_time(clock):
+    slots = RenderSlots(1, clock=clock)
+    # Arrivals at 1000, 1001 and 1002; an explicit priority below that goes first.
+    granted = run_waiters(slots, [("first", None), ("second", None), ("urgent", 0.0)], clock)
+    assert granted == ["urgent", "first", "second"]
+
+def test_on_wait_sees_the_queue_length(clock):
+    slots = RenderSlots(1, clock=clock)
+    seen = []
+
+    def waiter():
+        with slots.acquire(on_wait=seen.append): pass
+
+    with slots.acquire():
+        threads = [threading.Thread(target=waiter) for _ in range(2)]
+        for count, thread in enumerate(threads, 1):
+            thread.start()
+            wait_for_waiters(slots, count)
+    for thread in threads: thread.join(5)
+    assert seen == [1, 2]
+
+def test_free_slot_is_not_taken_past_waiters(clock):
+    # A newcomer must queue while anyone waits, even if a slot looks free, or it would jump the order.
+    slots = RenderSlots(1, clock=clock)
+    seen, granted = [], []
+
+    def waiter():
+        with slots.acquire(priority=5.0, on_wait=seen.append): granted.append(True)
+
+    with slots._changed: slots._waiters.append((0.0, -1))  # a waiter that has not woken up yet
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    wait_for_waiters(slots, 2)
+    assert seen == [2]
+    assert slots.stats()["in_use"] == 0
+    with slots._changed:
+        slots._waiters.remove((0.0, -1))
+        slots._changed.notify_all()
+    thread.join(5)
+    assert granted == [True]
+
+def test_background_request_waits_for_idle_slots(clock):
+    slots = RenderSlots(2, clock=clock)
+    granted = []
+
+    def background():
+        with slots.acquire(priority=SlotRequest(math.inf, background=True)): granted.append(slots.stats()["in_use"])
+
+    with slots.acquire():
+        thread = threading.Thread(target=background)
+        thread.start()
+        wait_for_waiters(slots, 1)
+        assert granted == []  # a slot is free, but another render runs
+    thread.join(5)
+    assert granted == [1]
+
+def test_background_request_is_granted_at_once_when_idle(clock):
+    slots = RenderSlots(2, clock=clock)
+    with slots.acquire(priority=SlotRequest(math.inf, background=True)):
+        assert slots.stats()["in_use"] == 1
+
+def test_promote_moves_a_waiter_ahead(clock):
+    slots = RenderSlots(1, clock=clock)
+    warmup = SlotRequest(math.inf, background=True)
+    granted, threads = [], []
+
+    def waiter(name, priority):
+        with slots.acquire(priority=priority): granted.append(name)
+
+    with slots.acquire():
+        for name, priority in [("warmup", warmup), ("live", 10.0)]:
+            threads.append(threading.Thread(target=waiter, args=(name, priority)))
+            threads[-1].start()
+            wait_for_waiters(slots, len(threads))
+        # A live request with priority 5 joined the warm-up render.
+        slots.promote(warmup, 5.0)
+        assert (warmup.priority, warmup.background) == (5.0, False)
+    for thread in threads: thread.join(5)
+    assert granted == ["warmup", "live"]
+
+def test_promote_never_demotes(clock):
+    slots = RenderSlots(1, clock=clock)
+    request = SlotRequest(3.0)
+    slots.promote(request, 7.0)
+    assert request.priority == 3.0
+    slots.promote(request, 1.0)
+    assert request.priority == 1.0
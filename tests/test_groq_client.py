@@ -0,0 +1,156 @@
+# tests/test_groq_client.py
+#
+# GroqClient against a local http.server stub that answers from a script of (status, headers, body).
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import groq_client
+from groq_client import CircuitBreaker, CircuitOpenError, GroqClient
+
+OK = (200, {}, {"choices": [{"message": {"content": "{}"}}]})
+
+class StubGroq(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.script = []
+        self.requests = []
+        self.url = f"http://127.0.0.1:{self.server_address[1]}/openai/v1/chat/completions"
+
+    def answer(self, *responses):
+        self.script.extend(responses)
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.server.requests.append((self.headers.get("Authorization"), json.loads(body)))
+        status, headers, payload = self.server.script.pop(0) if self.server.script else OK
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in {"Content-Type": "application/json", **headers}.items(): self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def stub():
+    server = StubGroq()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def jitter(monkeypatch):
+    # Records the backoff windows and always picks their upper end.
+    windows = []
+
+    def uniform(low, high):
+        windows.append((low, high))
+        return high
+
+    monkeypatch.setattr(groq_client.random, "uniform", uniform)
+    return windows
+
+def client(stub, clock, sleeps, max_retries=2, failure_threshold=3):
+    breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_seconds=30, clock=clock)
+    return GroqClient(stub.url, "test-key", max_retries=max_retries, breaker=breaker, sleep=sleeps.append)
+
+def test_retries_transient_errors_with_jittered_backoff(stub, clock, jitter):
+    sleeps = []
+    stub.answer((429, {}, {}), (503, {}, {}), OK)
+    groq = client(stub, clock, sleeps)
+    assert groq.chat({"model": "m"}) == OK[2]
+    assert len(stub.requests) == 3
+    assert stub.requests[0] == ("Bearer test-key", {"model": "m"})
+    # Full jitter over a window that doubles per attempt.
+    base = groq_client.GROQ_BACKOFF_BASE_SECONDS
+    assert jitter == [(0, base), (0, base * 2)]
+    assert sleeps == [base, base * 2]
+    assert groq.breaker.stats()["state"] == "closed"
+
+def test_retry_after_header_sets_the_delay(stub, clock, jitter):
+    sleeps = []
+    stub.answer((429, {"Retry-After": "3"}, {}), OK)
+    client(stub, clock, sleeps).chat({})
+    assert sleeps == [3.0]
+    assert jitter == []
+
+def test_gives_up_after_max_retries(stub, clock, jitter):
+    sleeps = []
+    stub.answer(*[(500, {}, {})] * 3)
+    groq = client(stub, clock, sleeps)
+    with pytest.raises(requests.exceptions.HTTPError):
+        groq.chat({})
+    assert len(stub.requests) == 3
+    assert len(sleeps) == 2
+    assert groq.breaker.stats()["consecutive_failures"] == 1
+
+def test_client_errors_are_not_retried(stub, clock, jitter):
+    sleeps = []
+    stub.answer((400, {}, {"error": "bad request"}))
+    groq = client(stub, clock, sleeps)
+    with pytest.raises(requests.exceptions.HTTPError):
+        groq.chat({})
+    assert len(stub.requests) == 1
+    assert sleeps == []
+    # Groq answered, so the breaker counts it as up.
+    assert groq.breaker.stats()["consecutive_failures"] == 0
+
+def test_breaker_opens_after_the_threshold_and_rejects_calls(stub, clock, jitter):
+    groq = client(stub, clock, [], max_retries=0, failure_threshold=2)
+    stub.answer((503, {}, {}), (502, {}, {}))
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError): groq.chat({})
+    assert groq.breaker.stats()["state"] == "open"
+    with pytest.raises(CircuitOpenError):
+        groq.chat({})
+    assert len(stub.requests) == 2  # rejected without touching the network
+    assert groq.breaker.stats()["rejected"] == 1
+
+def test_half_open_probe_closes_the_breaker(stub, clock, jitter):
+    groq = client(stub, clock, [], max_retries=0, failure_threshold=1)
+    stub.answer((500, {}, {}))
+    with pytest.raises(requests.exceptions.HTTPError): groq.chat({})
+    clock.now += 29
+    with pytest.raises(CircuitOpenError): groq.chat({})
+    clock.now += 1
+    assert groq.chat({}) == OK[2]
+    assert groq.breaker.stats()["state"] == "closed"
+    assert groq.chat({}) == OK[2]
+    assert len(stub.requests) == 3
+
+def test_failed_probe_reopens_the_breaker(stub, clock, jitter):
+    groq = client(stub, clock, [], max_retries=2, failure_threshold=1)
+    stub.answer(*[(500, {}, {})] * 6)
+    with pytest.raises(requests.exceptions.HTTPError): groq.chat({})
+    stub.requests.clear()
+    clock.now += 30
+    # The probe gets its retries; running out of them re-opens the circuit.
+    with pytest.raises(requests.exceptions.HTTPError): groq.chat({})
+    assert groq.breaker.stats()["state"] == "open"
+    with pytest.raises(CircuitOpenError): groq.chat({})
+    assert len(stub.requests) == 3
@@ -0,0 +1,66 @@
+# tests/test_janitor.py
+
+import os
+import time
+
+import pytest
+
+import render_cache
+from janitor import Janitor
+from render_workspace import RENDERS_LOCK, WORKSPACE_LOCK
+
+pytestmark = pytest.mark.skipif(not render_cache.HAVE_FLOCK, reason="cross-process protection needs flock")
+
+OLD = time.time() - 10 * 24 * 3600
+
+def make(path, old=True):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f: f.write("x")
+    if old: os.utime(path, (OLD, OLD))
+    return path
+
+@pytest.fixture
+def janitor(tmp_path):
+    return Janitor(root=str(tmp_path), max_age_seconds=3600, grace_seconds=60)
+
+def hold_lock(path):
+    # Another open file locking `path` stands in for a render in another process.
+    lock_file = open(path, "a")
+    render_cache.fcntl.flock(lock_file, render_cache.fcntl.LOCK_SH)
+    return lock_file
+
+def test_expired_workspace_of_a_dead_render_is_removed(janitor):
+    workspace = os.path.join(janitor.work_dir, "scene-dead")
+    make(os.path.join(workspace, "media", "videos", "a.mp4"))
+    janitor.sweep()
+    assert not os.path.exists(workspace)
+
+def test_locked_workspace_survives_past_the_grace_period(janitor):
+    workspace = os.path.join(janitor.work_dir, "scene-live")
+    make(os.path.join(workspace, "media", "videos", "a.mp4"))
+    with hold_lock(make(os.path.join(workspace, WORKSPACE_LOCK))):
+        janitor.sweep()
+        assert os.path.exists(workspace)
+    janitor.sweep()
+    assert not os.path.exists(workspace)
+
+def test_shared_caches_wait_for_renders_in_other_processes(janitor):
+    tex = make(os.path.join(janitor.media_dir, "Tex", "abc.svg"))
+    os.makedirs(janitor.work_dir, exist_ok=True)
+    with hold_lock(os.path.join(janitor.work_dir, RENDERS_LOCK)):
+        janitor.sweep()
+        assert os.path.exists(tex)
+    janitor.sweep()
+    assert not os.path.exists(tex)
+
+def test_lock_files_are_not_workspaces(janitor):
+    lock_path = make(os.path.join(janitor.work_dir, RENDERS_LOCK))
+    janitor.sweep()
+    assert os.path.exists(lock_path)
+
+def test_recent_artifacts_are_kept(janitor):
+    workspace = os.path.join(janitor.work_dir, "scene-new")
+    make(os.path.join(workspace, "media", "videos", "a.mp4"), old=False)
+    janitor.max_age_seconds = 0
+    janitor.sweep()
+    assert os.path.exists(workspace)
@@ -0,0 +1,86 @@
+# tests/test_manim_workers.py
+#
+# WarmRenderPool's worker bookkeeping, with FakeWorker standing in for the Manim processes.
+
+import pytest
+
+import manim_workers
+from manim_workers import WarmRenderPool, WorkerUnavailable
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class FakeWorker:
+    spawned = []
+    fail_next = 0
+
+    def __init__(self, max_renders):
+        if FakeWorker.fail_next:
+            FakeWorker.fail_next -= 1
+            raise WorkerUnavailable("No module named 'manim'")
+        self.renders = 0
+        self.dead = self.killed = False
+        FakeWorker.spawned.append(self)
+
+    def alive(self):
+        return not self.dead
+
+    def kill(self):
+        self.killed = True
+
+    def render(self, task, timeout, on_event=None):
+        self.renders += 1
+        return {"ok": True}
+
+    def close(self):
+        pass
+
+@pytest.fixture(autouse=True)
+def fake_workers(monkeypatch):
+    FakeWorker.spawned, FakeWorker.fail_next = [], 0
+    monkeypatch.setattr(manim_workers, "WarmWorker", FakeWorker)
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+def test_dead_idle_worker_is_reaped_and_replaced(clock):
+    pool = WarmRenderPool(size=1, clock=clock)
+    pool.render({}, timeout=5)
+    first = FakeWorker.spawned[0]
+    first.dead = True
+    pool.render({}, timeout=5)
+    assert first.killed
+    assert len(FakeWorker.spawned) == 2
+    assert pool.stats()["recycled"] == 1
+
+def test_spawn_failure_backs_off_then_retries(clock):
+    pool = WarmRenderPool(size=1, retry_seconds=30, retry_max_seconds=100, clock=clock)
+    FakeWorker.fail_next = 1
+    with pytest.raises(WorkerUnavailable): pool.render({}, timeout=5)
+    assert not pool.enabled
+    assert pool.stats()["unavailable_reason"] == "No module named 'manim'"
+    clock.now += 30
+    assert pool.enabled
+    assert pool.render({}, timeout=5) == {"ok": True}
+    assert pool.stats()["spawn_failures"] == 0
+    assert pool.stats()["unavailable_reason"] is None
+
+def test_backoff_doubles_up_to_the_maximum(clock):
+    pool = WarmRenderPool(size=1, retry_seconds=30, retry_max_seconds=100, clock=clock)
+    delays = []
+    for _ in range(4):
+        FakeWorker.fail_next = 1
+        with pytest.raises(WorkerUnavailable): pool.render({}, timeout=5)
+        delays.append(pool.stats()["retry_in_seconds"])
+        clock.now = pool.retry_at
+    assert delays == [30, 60, 100, 100]
+
+def test_disabled_pool_stays_disabled(clock):
+    pool = WarmRenderPool(size=0, clock=clock)
+    assert not pool.enabled
+    with pytest.raises(WorkerUnavailable): pool.render({}, timeout=5)
@@ -0,0 +1,99 @@
+# tests/test_partial_movie_cache.py
+
+import os
+import shutil
+
+import pytest
+
+import render_cache
+from render_cache import PARTIAL_MOVIE_LIST, PartialMovieCache
+
+QUALITY = "480p15"
+
+def encode(partial_dir, *hashes):
+    # What Manim does in a render's partial_movie_dir: encode missing segments, write the concat list.
+    for segment_hash in hashes:
+        path = os.path.join(partial_dir, f"{segment_hash}.mp4")
+        if not os.path.exists(path):
+            with open(path, "w") as f: f.write(segment_hash)
+    with open(os.path.join(partial_dir, PARTIAL_MOVIE_LIST), "w") as f:
+        f.write("".join(f"file 'file:{os.path.join(partial_dir, h)}.mp4'\n" for h in hashes))
+
+@pytest.fixture
+def cache(tmp_path):
+    return PartialMovieCache(root=str(tmp_path / "store"), max_bytes=10 ** 6, gc_interval_seconds=3600)
+
+def store_names(cache):
+    return sorted(os.listdir(os.path.join(cache.root, QUALITY)))
+
+def test_segments_are_shared_between_renders(cache, tmp_path):
+    first, second = str(tmp_path / "first"), str(tmp_path / "second")
+    cache.check_out(QUALITY, first)
+    encode(first, "a", "b")
+    cache.check_in(QUALITY, first)
+    assert store_names(cache) == ["a.mp4", "b.mp4"]
+
+    cache.check_out(QUALITY, second)
+    assert sorted(os.listdir(second)) == ["a.mp4", "b.mp4"]
+    encode(second, "b", "c")
+    cache.check_in(QUALITY, second)
+    assert store_names(cache) == ["a.mp4", "b.mp4", "c.mp4"]
+    assert cache.stats()["stored"] == 3
+    assert cache.stats()["reused"] == 1
+
+def test_concurrent_renders_keep_their_own_lists(cache, tmp_path):
+    first, second = str(tmp_path / "first"), str(tmp_path / "second")
+    cache.check_out(QUALITY, first)
+    cache.check_out(QUALITY, second)
+    encode(first, "a")
+    encode(second, "a", "b")
+    with open(os.path.join(first, PARTIAL_MOVIE_LIST)) as f: assert "b.mp4" not in f.read()
+    # Both encoded "a"; whichever checks in second keeps the stored copy.
+    cache.check_in(QUALITY, first)
+    cache.check_in(QUALITY, second)
+    assert store_names(cache) == ["a.mp4", "b.mp4"]
+
+def test_uncached_segments_and_lists_stay_out_of_the_store(cache, tmp_path):
+    partial_dir = str(tmp_path / "render")
+    cache.check_out(QUALITY, partial_dir)
+    encode(partial_dir, "uncached_00000")
+    cache.check_in(QUALITY, partial_dir)
+    assert store_names(cache) == []
+
+def test_collection_does_not_break_a_checked_out_render(cache, tmp_path):
+    first, second = str(tmp_path / "first"), str(tmp_path / "second")
+    cache.check_out(QUALITY, first)
+    encode(first, "a", "b")
+    cache.check_in(QUALITY, first)
+    shutil.rmtree(first)  # its workspace is gone
+    cache.check_out(QUALITY, second)
+    cache.max_bytes = 0
+    assert cache.collect() == 2
+    assert store_names(cache) == []
+    # The running render still holds its links and can concatenate them.
+    with open(os.path.join(second, "a.mp4")) as f: assert f.read() == "a"
+    cache.check_in(QUALITY, second)
+    assert store_names(cache) == ["a.mp4", "b.mp4"]
+
+def test_collection_drops_least_recently_used_first(cache, tmp_path):
+    partial_dir = str(tmp_path / "render")
+    cache.check_out(QUALITY, partial_dir)
+    encode(partial_dir, "old", "new")
+    cache.check_in(QUALITY, partial_dir)
+    os.utime(os.path.join(cache.root, QUALITY, "old.mp4"), (1, 1))
+    cache.max_bytes = 3
+    cache.collect()
+    assert store_names(cache) == ["new.mp4"]
+
+@pytest.mark.skipif(render_cache.fcntl is None, reason="needs flock")
+def test_only_one_process_collects_at_a_time(cache, tmp_path):
+    partial_dir = str(tmp_path / "render")
+    cache.check_out(QUALITY, partial_dir)
+    encode(partial_dir, "a")
+    cache.check_in(QUALITY, partial_dir)
+    cache.max_bytes = 0
+    # flock locks belong to the open file, so a second open behaves like another process.
+    with render_cache.try_lock(os.path.join(cache.root, ".gc.lock")) as owner:
+        assert owner
+        assert cache.collect() == 0
+    assert cache.collect() == 1
@@ -0,0 +1,110 @@
+# tests/test_prompt_parser.py
+
+import pytest
+
+from prompt_parser import parse_prompt
+from scene_spec import Move, Scale, SceneSpec
+
+# render_manim.PROMPT_PARSER_MIN_CONFIDENCE's default: below it the prompt goes to the LLM.
+MIN_CONFIDENCE = 1.0
+
+def assert_parses_or_defers(prompt_text, expected):
+    # A confident parse must mean the same scene as `expected` (compared as validated specs, so
+    # defaults the LLM spells out do not matter); anything else must fall through to the LLM.
+    params, confidence = parse_prompt(prompt_text)
+    if confidence >= MIN_CONFIDENCE:
+        assert SceneSpec.from_llm(params) == SceneSpec.from_llm(expected)
+
+def move(direction, distance=1):
+    return {"type": "Move", "details": {"movement_details": {"direction": direction, "distance": distance}}}
+
+def rotate(angle):
+    return {"type": "Rotate", "details": {"rotation_details": {"angle_degrees": angle}}}
+
+# The examples from the LLM system prompt.
+SYSTEM_PROMPT_EXAMPLES = [
+    ("A red square appears, then moves up by 2, then turns blue.",
+     {"shape": "Square", "color": "RED", "animations": [
+         {"type": "Create"}, move("UP", 2),
+         {"type": "ChangeColor", "details": {"color_change_details": {"target_color": "BLUE"}}}]}),
+    ("A yellow circle. Rotate it 180 degrees and make it twice as big at the same time.",
+     {"shape": "Circle", "color": "YELLOW", "animations": [
+         {"type": "Create"}, {"type": "AnimationGroup", "details": {"grouped_animations": [
+             rotate(180), {"type": "Scale", "details": {"scale_details": {"factor": 2}}}]}}]}),
+    # The example's flash_color is the LLM's pick; the prompt names none, so the spec default applies.
+    ("Write 'Hello Manim' in green, then make it flash.",
+     {"text_content": "Hello Manim", "color": "GREEN", "animations": [{"type": "Write"}, {"type": "Flash"}]}),
+    ("Transform a blue triangle into a red square.",
+     {"shape": "Triangle", "color": "BLUE", "animations": [
+         {"type": "Create"},
+         {"type": "TransformShape", "details": {"transform_details": {"target_shape": "Square", "target_color": "RED"}}}]}),
+    ("a purple circle moving up and down",
+     {"shape": "Circle", "color": "PURPLE", "animations": [{"type": "Create"}, move("UP_AND_DOWN")]}),
+    ("a line that moves left then right",
+     {"shape": "Line", "color": "WHITE", "animations": [{"type": "Create"}, move("LEFT_THEN_RIGHT")]}),
+]
+
+@pytest.mark.parametrize("prompt_text,expected", SYSTEM_PROMPT_EXAMPLES)
+def test_system_prompt_examples(prompt_text, expected):
+    assert_parses_or_defers(prompt_text, expected)
+
+@pytest.mark.parametrize("prompt_text", [
+    "A red square appears, then moves up by 2, then turns blue.",
+    "Transform a blue triangle into a red square.",
+    "a purple circle moving up and down",
+])
+def test_simple_examples_skip_the_llm(prompt_text):
+    assert parse_prompt(prompt_text)[1] >= MIN_CONFIDENCE
+
+def test_simultaneous_actions_defer_to_the_llm():
+    _, confidence = parse_prompt("A yellow circle. Rotate it 180 degrees and make it twice as big at the same time.")
+    assert confidence < MIN_CONFIDENCE
+
+@pytest.mark.parametrize("prompt_text", [
+    "a red circle, don't rotate it",
+    "a blue square that does not move",
+    "a green triangle that never changes color",
+    "a star without flashing",
+])
+def test_negations_defer_to_the_llm(prompt_text):
+    assert parse_prompt(prompt_text)[1] < MIN_CONFIDENCE
+
+def test_negation_inside_quoted_text_is_just_text():
+    params, confidence = parse_prompt('Write "don\'t panic" in red')
+    assert confidence >= MIN_CONFIDENCE
+    assert params["text_content"] == "don't panic"
+
+@pytest.mark.parametrize("prompt_text,angle", [
+    ("a square rotating -90 degrees", -90),
+    ("a square rotating +45 degrees", 45),
+    ("a square rotating 45 degrees clockwise", -45),
+    ("a square rotating 45 degrees counterclockwise", 45),
+    ("a square rotating", 90),
+])
+def test_rotation_angles(prompt_text, angle):
+    assert_parses_or_defers(prompt_text, {"shape": "Square", "animations": [{"type": "Create"}, rotate(angle)]})
+    assert parse_prompt(prompt_text)[1] >= MIN_CONFIDENCE
+
+@pytest.mark.parametrize("prompt_text,direction,distance", [
+    ("a circle moves up 2 units", "UP", 2),
+    ("a circle moves up by 2", "UP", 2),
+    ("a circle moves up two", "UP", 2),
+    ("a circle moves 3 units left", "LEFT", 3),
+    ("a circle moves up and down 2 units", "UP_AND_DOWN", 2),
+    ("a circle moves right", "RIGHT", 1),
+])
+def test_move_distances(prompt_text, direction, distance):
+    assert_parses_or_defers(prompt_text, {"shape": "Circle", "animations": [{"type": "Create"}, move(direction, distance)]})
+    assert parse_prompt(prompt_text)[1] >= MIN_CONFIDENCE
+
+@pytest.mark.parametrize("prompt_text,step", [
+    ("a circle scales by 0", Scale(0.1)),
+    ("a circle gets 100 times bigger", Scale(10.0)),
+    ("a circle moves up 1000000 units", Move("UP", 7.0)),
+])
+def test_extreme_magnitudes_are_clamped(prompt_text, step):
+    params, confidence = parse_prompt(prompt_text)
+    if confidence >= MIN_CONFIDENCE: assert SceneSpec.from_llm(params).animations[-1] == step
+
+def test_prompt_without_subject_is_not_parsed():
+    assert parse_prompt("make something cool happen") == (None, 0.0)
@@ -0,0 +1,60 @@
+# tests/test_render_cache.py
+
+import os
+
+import pytest
+
+from render_cache import RenderCache
+
+@pytest.fixture
+def videos_dir(tmp_path):
+    return str(tmp_path / "media" / "videos")
+
+def render(videos_dir, module_name):
+    # What a published render leaves: media/videos/<module>/<quality>/<Scene>.mp4
+    path = os.path.join(videos_dir, module_name, "480p15", "Scene.mp4")
+    os.makedirs(os.path.dirname(path))
+    with open(path, "w") as f: f.write("video")
+    return path
+
+def cache(tmp_path, videos_dir, **limits):
+    return RenderCache(index_path=str(tmp_path / "index.sqlite3"), videos_dir=videos_dir, **limits)
+
+def test_least_recently_used_entry_is_evicted(tmp_path, videos_dir):
+    renders = cache(tmp_path, videos_dir, max_entries=1)
+    old, new = render(videos_dir, "old"), render(videos_dir, "new")
+    renders.put("old", old)
+    renders.put("new", new)
+    assert renders.get("old") is None
+    assert renders.get("new") == new
+    assert not os.path.exists(os.path.dirname(os.path.dirname(old)))
+
+def test_eviction_keeps_media_a_protector_hands_out(tmp_path, videos_dir):
+    renders = cache(tmp_path, videos_dir, max_entries=1)
+    old, new = render(videos_dir, "old"), render(videos_dir, "new")
+    renders.add_protector(lambda: [old])
+    renders.put("old", old)
+    renders.put("new", new)
+    # Out of the cache, but the file a finished job points at is still there.
+    assert renders.get("old") is None
+    assert os.path.exists(old)
+    assert renders.stats()["deferred"] == 1
+
+def test_failing_protector_keeps_all_media(tmp_path, videos_dir):
+    renders = cache(tmp_path, videos_dir, max_entries=1)
+    old, new = render(videos_dir, "old"), render(videos_dir, "new")
+
+    def broken():
+        raise RuntimeError("job table unavailable")
+
+    renders.add_protector(broken)
+    renders.put("old", old)
+    renders.put("new", new)
+    assert os.path.exists(old)
+
+def test_expired_entry_is_dropped_on_lookup(tmp_path, videos_dir):
+    renders = cache(tmp_path, videos_dir, max_age_seconds=-1)
+    path = render(videos_dir, "scene")
+    renders.put("scene", path)
+    assert renders.get("scene") is None
+    assert renders.stats()["entries"] == 0
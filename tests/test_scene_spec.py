@@ -0,0 +1,164 @@
+# tests/test_scene_spec.py
+
+import json
+
+import pytest
+
+from scene_spec import (Appear, AnimationGroup, ChangeColor, Flash, Indicate, Move, Rotate, Scale, SceneSpec,
+                        SpecError, TransformShape, as_scene_spec)
+
+def details(anim_type, key, **values):
+    return {"type": anim_type, "details": {key: values}}
+
+EVERY_STEP = {
+    "shape": "Star", "color": "PURPLE", "text_content": None,
+    "animations": [
+        {"type": "GrowFromCenter"},
+        details("Move", "movement_details", direction="UP_LEFT", distance=2.5),
+        details("Move", "movement_details", direction="LEFT_AND_RIGHT", distance=1.0),
+        details("Rotate", "rotation_details", angle_degrees=-45.0),
+        details("Scale", "scale_details", factor=0.5),
+        details("ChangeColor", "color_change_details", target_color="ORANGE"),
+        details("TransformShape", "transform_details", target_shape="Square", target_color="BLUE"),
+        {"type": "Indicate"},
+        details("Flash", "flash_details", flash_color="WHITE"),
+        {"type": "AnimationGroup", "details": {"grouped_animations": [
+            details("Rotate", "rotation_details", angle_degrees=180.0),
+            details("Scale", "scale_details", factor=2.0)]}},
+    ],
+    "llm_error": None,
+}
+
+# from_dict(to_dict()) is the identity: queued jobs, worker tasks and the render cache key rely on it.
+
+def test_round_trip_every_step_type():
+    spec = SceneSpec.from_dict(EVERY_STEP)
+    assert spec.to_dict() == EVERY_STEP
+    assert SceneSpec.from_dict(spec.to_dict()) == spec
+    assert [type(step) for step in spec.animations] == [
+        Appear, Move, Move, Rotate, Scale, ChangeColor, TransformShape, Indicate, Flash, AnimationGroup]
+
+def test_round_trip_through_json():
+    spec = SceneSpec.from_dict(EVERY_STEP)
+    assert SceneSpec.from_dict(json.loads(spec.canonical_json())) == spec
+
+def test_round_trip_text_and_llm_error():
+    spec = SceneSpec.fallback("LLM unavailable")
+    assert spec.llm_error == "LLM unavailable"
+    assert SceneSpec.from_dict(spec.to_dict()) == spec
+    text = SceneSpec.from_llm({"text_content": "Hello", "color": "green", "animations": [{"type": "Write"}]})
+    assert SceneSpec.from_dict(text.to_dict()) == text
+
+def test_as_scene_spec_accepts_both_forms():
+    spec = SceneSpec.from_dict(EVERY_STEP)
+    assert as_scene_spec(spec) is spec
+    assert as_scene_spec(spec.to_dict()) == spec
+
+def test_canonical_json_ignores_key_order():
+    reordered = dict(reversed(list(EVERY_STEP.items())))
+    assert SceneSpec.from_dict(reordered).canonical_json() == SceneSpec.from_dict(EVERY_STEP).canonical_json()
+
+# Strict: from_dict raises SpecError naming the bad field.
+
+def with_animation(step, **fields):
+    return {"shape": "Circle", "color": "RED", "animations": [step], **fields}
+
+@pytest.mark.parametrize("data, path", [
+    ([], "spec"),
+    ("Circle", "spec"),
+    ({"shape": "Circle", "color": "RED"}, "animations"),
+    ({"shape": "Circle", "color": "RED", "animations": []}, "animations"),
+    (with_animation({"type": "Create"}, color="TEAL"), "color"),
+    (with_animation({"type": "Create"}, shape="Hexagon"), "shape"),
+    (with_animation({"type": "Explode", "details": {}}), "animations[0].type"),
+    (with_animation("Create"), "animations[0]"),
+    (with_animation({"type": "Move", "details": "up"}), "animations[0].details"),
+    (with_animation(details("Move", "movement_details", direction="SIDEWAYS", distance=1)),
+     "animations[0].details.movement_details.direction"),
+    (with_animation(details("Move", "movement_details", direction="UP", distance="far")),
+     "animations[0].details.movement_details.distance"),
+    (with_animation(details("Rotate", "rotation_details", angle_degrees=float("nan"))),
+     "animations[0].details.rotation_details.angle_degrees"),
+    (with_animation(details("Scale", "scale_details", factor=float("inf"))),
+     "animations[0].details.scale_details.factor"),
+    (with_animation(details("Scale", "scale_details", factor=0)), "animations[0].details.scale_details.factor"),
+    (with_animation(details("Move", "movement_details", direction="UP", distance=1e6)),
+     "animations[0].details.movement_details.distance"),
+    (with_animation(details("ChangeColor", "color_change_details", target_color="MAUVE")),
+     "animations[0].details.color_change_details.target_color"),
+    (with_animation(details("TransformShape", "transform_details", target_shape="Blob", target_color="RED")),
+     "animations[0].details.transform_details.target_shape"),
+    (with_animation(details("Flash", "flash_details")), "animations[0].details.flash_details.flash_color"),
+    (with_animation({"type": "AnimationGroup", "details": {"grouped_animations": [{"type": "Create"}]}}),
+     "animations[0].details.grouped_animations[0]"),
+])
+def test_from_dict_rejects(data, path):
+    with pytest.raises(SpecError) as raised:
+        SceneSpec.from_dict(data)
+    assert raised.value.path == path
+
+def test_spec_error_is_a_value_error():
+    with pytest.raises(ValueError, match="^animations: "):
+        SceneSpec.from_dict({"shape": "Circle"})
+
+# Lenient: from_llm repairs what it can with defaults and drops steps that cannot be played.
+
+def test_from_llm_fills_defaults():
+    assert SceneSpec.from_llm({}) == SceneSpec("Circle", "WHITE", None, (Appear("Create"),))
+
+def test_from_llm_normalizes_case():
+    spec = SceneSpec.from_llm({"shape": "square", "color": "red", "animations": [
+        details("ChangeColor", "color_change_details", target_color="blue"),
+        details("Move", "movement_details", direction="up")]})
+    assert spec == SceneSpec("Square", "RED", None, (ChangeColor("BLUE"), Move("UP", 1.0)))
+
+def test_from_llm_replaces_invalid_values():
+    spec = SceneSpec.from_llm({"shape": "Hexagon", "color": "TEAL", "animations": [
+        details("Rotate", "rotation_details", angle_degrees="a lot"),
+        details("Scale", "scale_details", factor=float("nan")),
+        details("ChangeColor", "color_change_details", target_color="MAUVE"),
+        details("Flash", "flash_details", flash_color="SPARKLY"),
+        {"type": "Move", "details": "up"}]})
+    assert spec == SceneSpec("Circle", "WHITE", None, (
+        Rotate(90.0), Scale(2.0), ChangeColor("WHITE"), Flash("YELLOW"), Move("RIGHT", 1.0)))
+
+def test_from_llm_rounds_angles_and_factors():
+    spec = SceneSpec.from_llm({"animations": [
+        details("Rotate", "rotation_details", angle_degrees="33.3333"),
+        details("Scale", "scale_details", factor=1.23456)]})
+    assert spec.animations == (Rotate(33.33), Scale(1.23))
+
+def test_from_llm_clamps_magnitudes():
+    spec = SceneSpec.from_llm({"animations": [
+        details("Scale", "scale_details", factor=0),
+        details("Scale", "scale_details", factor=100),
+        details("Move", "movement_details", direction="UP", distance=1000000),
+        details("Move", "movement_details", direction="DOWN", distance=-20)]})
+    assert spec.animations == (Scale(0.1), Scale(10.0), Move("UP", 7.0), Move("DOWN", -7.0))
+    assert SceneSpec.from_dict(spec.to_dict()) == spec
+
+def test_from_llm_transform_keeps_initial_color():
+    spec = SceneSpec.from_llm({"shape": "Triangle", "color": "BLUE", "animations": [
+        details("TransformShape", "transform_details", target_shape="star")]})
+    assert spec.animations == (TransformShape("Star", "BLUE"),)
+
+def test_from_llm_drops_unplayable_steps():
+    spec = SceneSpec.from_llm({"color": "RED", "animations": [
+        "Create", {"type": "Explode"}, details("Move", "movement_details", direction="SIDEWAYS"),
+        {"type": "AnimationGroup", "details": {"grouped_animations": [
+            {"type": "Create"}, details("Scale", "scale_details", factor=3)]}},
+        {"type": "FadeIn"}]})
+    assert spec.animations == (AnimationGroup((Scale(3.0),)), Appear("FadeIn"))
+
+def test_from_llm_without_playable_steps_appears():
+    spec = SceneSpec.from_llm({"shape": "Dot", "animations": [{"type": "Explode"}]})
+    assert spec.animations == (Appear("Create"),)
+
+def test_from_llm_output_passes_from_dict():
+    # Whatever the lenient pass produces must survive the strict pass unchanged.
+    spec = SceneSpec.from_llm({"shape": "blob", "color": None, "text_content": 42, "animations": [
+        {"type": "Explode"}, details("Scale", "scale_details", factor="x")]})
+    assert SceneSpec.from_dict(spec.to_dict()) == spec
+
+def test_from_llm_ignores_llm_error():
+    assert SceneSpec.from_llm({"llm_error": "boom"}).llm_error is None
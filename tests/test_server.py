@@ -0,0 +1,86 @@
+# tests/test_server.py
+
+import io
+
+import pytest
+from werkzeug.test import Client
+from werkzeug.wrappers import Request, Response
+
+from server import RequestDeadline
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class SlowInput(io.BytesIO):
+    # A client trickling its body: every read takes `seconds`.
+    def __init__(self, data, clock, seconds):
+        super().__init__(data)
+        self.clock, self.seconds = clock, seconds
+
+    def read(self, size=-1):
+        self.clock.now += self.seconds
+        return super().read(min(size, 4) if size and size > 0 else 4)
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+def echo(environ, start_response):
+    return Response(Request(environ).get_data())(environ, start_response)
+
+def post(app, data, **environ):
+    return Client(app).post("/", data=data, environ_overrides=environ)
+
+def test_body_is_passed_on(clock):
+    response = post(RequestDeadline(echo, seconds=10, clock=clock), b'{"prompt": "a red circle"}')
+    assert response.status_code == 200
+    assert response.data == b'{"prompt": "a red circle"}'
+
+def test_slow_body_is_answered_408(clock):
+    seen = []
+
+    def app(environ, start_response):
+        seen.append(True)
+        return echo(environ, start_response)
+
+    body = b"x" * 60  # 15 reads of a second each
+    response = post(RequestDeadline(app, seconds=10, clock=clock), body, **{"wsgi.input": SlowInput(body, clock, 1)})
+    assert response.status_code == 408
+    assert seen == []
+
+def test_large_body_is_answered_413(clock):
+    response = post(RequestDeadline(echo, seconds=10, max_body_bytes=8, clock=clock), b"x" * 9)
+    assert response.status_code == 413
+
+def streaming(mimetype, clock, step):
+    def app(environ, start_response):
+        def chunks():
+            for chunk in (b"a", b"b", b"c"):
+                yield chunk
+                clock.now += step
+        return Response(chunks(), mimetype=mimetype)(environ, start_response)
+    return app
+
+def test_response_is_cut_off_at_the_deadline(clock):
+    app = RequestDeadline(streaming("text/plain", clock, 6), seconds=10, clock=clock)
+    with pytest.raises(TimeoutError):
+        Client(app).get("/").data
+
+def test_event_streams_are_exempt(clock):
+    app = RequestDeadline(streaming("text/event-stream", clock, 6), seconds=10, clock=clock)
+    assert Client(app).get("/").data == b"abc"
+
+def test_late_view_still_answers(clock):
+    def slow(environ, start_response):
+        clock.now += 30
+        return Response(b"queued")(environ, start_response)
+
+    assert Client(RequestDeadline(slow, seconds=10, clock=clock)).get("/").data == b"queued"
+
+def test_zero_disables_the_deadline(clock):
+    app = RequestDeadline(streaming("text/plain", clock, 60), seconds=0, clock=clock)
+    assert Client(app).get("/").data == b"abc"
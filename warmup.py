@@ -0,0 +1,164 @@
+# warmup.py
+#
+# Pre-renders the most requested specs into the render cache, so a popular prompt is a cache
+# lookup even right after a deploy. The ranking comes from the spec log (spec_log.py); until it
+# holds WARMUP_TOP_N specs requested at least WARMUP_MIN_REQUESTS times, the rest of the list is
+# filled with the combinations the LLM system prompt steers towards (example shapes x colors x
+# appearances). A pass runs WARMUP_START_DELAY_SECONDS after startup and then every
+# WARMUP_INTERVAL_SECONDS; `python run_pipeline.py --warm-cache` runs one at deploy time,
+# before the server starts.
+#
+# Warm-up only uses idle capacity: it renders one spec at a time, starts a render only while no
+# render holds or waits for a render slot and every registered idle check (e.g. the job queues)
+# agrees, and takes its render slot as a background request: granted only while the slots are
+# idle, behind any live render. A live request for the same spec joins the warm-up render and
+# promotes it to its own priority instead of waiting behind live traffic.
+
+import os
+import time
+import itertools
+import threading
+
+from observability import get_logger, Counter
+from admission import render_slots
+from render_cache import render_cache, spec_cache_key
+from scene_spec import SceneSpec, SpecError
+from spec_log import spec_log
+import render_manim
+
+log = get_logger("warmup")
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "20"))
+WARMUP_MIN_REQUESTS = float(os.getenv("WARMUP_MIN_REQUESTS", "2"))
+# Seconds between passes; 0 runs only the pass after startup.
+WARMUP_INTERVAL_SECONDS = int(os.getenv("WARMUP_INTERVAL_SECONDS", "3600"))
+WARMUP_START_DELAY_SECONDS = int(os.getenv("WARMUP_START_DELAY_SECONDS", "30"))
+WARMUP_IDLE_POLL_SECONDS = 5
+
+# From the LLM system prompt examples, most common first.
+SEED_APPEARANCES = ["Create", "FadeIn", "GrowFromCenter"]
+SEED_SHAPES = ["Circle", "Square", "Triangle", "Rectangle", "Line", "Dot", "Star", "Polygon"]
+SEED_COLORS = ["WHITE", "RED", "BLUE", "GREEN", "YELLOW", "PURPLE"]
+
+WARMUP_RENDERS = Counter("prompt2motion_warmup_renders_total", "Cache warm-up specs by outcome.", ["outcome"])
+
+def seed_specs():
+    for appearance, shape, color in itertools.product(SEED_APPEARANCES, SEED_SHAPES, SEED_COLORS):
+        yield {"shape": shape, "color": color, "animations": [{"type": appearance}]}
+
+class CacheWarmer:
+    def __init__(self, top_n=WARMUP_TOP_N, min_requests=WARMUP_MIN_REQUESTS, interval_seconds=WARMUP_INTERVAL_SECONDS,
+                 start_delay_seconds=WARMUP_START_DELAY_SECONDS, tier=render_manim.PREVIEW_TIER):
+        self.top_n = top_n
+        self.min_requests = min_requests
+        self.interval_seconds = interval_seconds
+        self.start_delay_seconds = start_delay_seconds
+        self.tier = tier
+        self.runs = 0
+        self.rendered = 0
+        self.last_run = None
+        self.last_report = None
+        self.state = "idle"
+        self._idle_checks = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_idle_check(self, check):
+        # check() returns True while the service has no live work; warm-up waits until all agree.
+        self._idle_checks.append(check)
+
+    def idle(self):
+        stats = render_slots.stats()
+        return not stats["in_use"] and not stats["waiting"] and all(check() for check in self._idle_checks)
+
+    def candidates(self):
+        # SceneSpecs to keep warm, most requested first.
+        specs, seen = [], set()
+        popular = (spec for spec, _ in spec_log.top(self.top_n, self.min_requests))
+        for data in itertools.chain(popular, seed_specs()):
+            if len(specs) >= self.top_n: break
+            try: spec = SceneSpec.from_dict(data)
+            except SpecError as e:
+                log.warning("Skipping an invalid warm-up spec: %s", e)
+                continue
+            key = spec_cache_key(spec, None)
+            if key not in seen:
+                seen.add(key)
+                specs.append(spec)
+        return specs
+
+    def _wait_until_idle(self, wait_for_idle):
+        if not wait_for_idle: return True
+        while not self.idle():
+            if self._stop.wait(WARMUP_IDLE_POLL_SECONDS): return False
+        return True
+
+    def warm(self, wait_for_idle=True):
+        # One pass over the candidates; returns a report of what happened to each.
+        started = time.time()
+        report = {"cached": 0, "rendered": 0, "failed": 0, "stopped": False}
+        for spec in self.candidates():
+            if render_cache.contains(spec_cache_key(spec, render_manim.QUALITY_TIERS[self.tier]["dir"])):
+                report["cached"] += 1
+                continue
+            with self._lock: self.state = "waiting_for_idle"
+            if self._stop.is_set() or not self._wait_until_idle(wait_for_idle):
+                report["stopped"] = True
+                break
+            with self._lock: self.state = "rendering"
+            try:
+                # Starts only on idle render slots, checked atomically with the grant.
+                result = render_manim.render_scene_from_spec(spec, tier=self.tier, background=True)
+                outcome = "rendered" if result["video_path"] else "failed"
+            except Exception as e:
+                log.exception("Warm-up render failed: %s", e)
+                outcome = "failed"
+            report[outcome] += 1
+            WARMUP_RENDERS.inc(outcome=outcome)
+        WARMUP_RENDERS.inc(report["cached"], outcome="cached")
+        report["seconds"] = time.time() - started
+        spec_log.flush()
+        with self._lock:
+            self.state = "idle"
+            self.runs += 1
+            self.rendered += report["rendered"]
+            self.last_run = started
+            self.last_report = report
+        log.info("Cache warm-up: %d rendered, %d already cached, %d failed", report["rendered"], report["cached"], report["failed"])
+        return report
+
+    def _run(self):
+        delay = self.start_delay_seconds
+        while not self._stop.wait(delay):
+            try: self.warm()
+            except Exception as e: log.exception("Cache warm-up failed: %s", e)
+            if self.interval_seconds <= 0: return
+            delay = self.interval_seconds
+
+    def start(self):
+        if self._thread is not None: return
+        self._thread = threading.Thread(target=self._run, name="cache-warmup", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": WARMUP_ENABLED,
+                "running": self._thread is not None and not self._stop.is_set(),
+                "state": self.state,
+                "top_n": self.top_n,
+                "min_requests": self.min_requests,
+                "interval_seconds": self.interval_seconds,
+                "runs": self.runs,
+                "rendered": self.rendered,
+                "last_run": self.last_run,
+                "last_report": self.last_report,
+                "spec_log": spec_log.stats(),
+            }
+
+warmer = CacheWarmer()
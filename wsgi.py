@@ -0,0 +1,8 @@
+# wsgi.py
+#
+# WSGI entry point, one application per process:
+#   gunicorn -c gunicorn.conf.py wsgi:app    (or `python server.py`, which picks a server itself)
+
+from app import create_app
+
+app = create_app()